@@ -0,0 +1,3 @@
+## Off-chain tooling for the objkt swap contracts: Michelson parsing and
+## interpretation of the compiled `michelson/*.tz` artifacts, indexing,
+## snapshots and benchmarks.
@@ -0,0 +1,510 @@
+## Gas and storage benchmarks of the marketplace contracts
+##
+## Deploys the contract set with `Deployment` and measures the hot entry
+## points of every version (FA2 mint/transfer, v1 mint/swap/collect/cancel/
+## curate, v2 and v2.1 swap/collect/cancel) for several batch sizes. Batched
+## entry points (`collect_batch`, `swap_batch`, ...) are measured when the
+## artifacts provide them, next to the same work done with single calls.
+##
+## Each measurement records the estimated gas of the whole operation group,
+## the number of internal operations, the packed size of the parameters
+## sent and the storage growth in bytes (packed storage plus big_map
+## entries); the binary size of every artifact is reported with them.
+## Reports are JSON; `check` compares a report with a baseline.
+##
+## `REQUIRES` lists the entry points each scenario measures beyond those of
+## the deployed contracts. If the artifacts lack any of them the run fails,
+## so new code is never silently left unmeasured. Pass `--allow-missing`
+## to measure older artifacts (e.g. the checked-in ones, as a baseline).
+## The report then lists what was not measured under `missing`.
+##
+##     python -m objkt_tools.build --out build/
+##     python -m objkt_tools.bench --artifacts build/ --out report.json
+##     python -m objkt_tools.bench --allow-missing --out baseline.json
+##     python -m objkt_tools.bench --artifacts build/ --baseline baseline.json --threshold 5
+import argparse
+import json
+import sys
+from pathlib import Path
+
+from .deployment import Deployment, ARTIFACTS, storage_field
+from .michelson import account, pack, from_fields, entrypoints, entrypoint_wrapper, parse_file
+from .michelson.pack import script_size
+from .michelson.values import BigMap
+
+BATCH_SIZES = (1, 10, 50)
+METRICS = ("gas", "operations", "operation_bytes", "storage_bytes")
+
+
+## ## Measuring
+
+def storage_bytes(deployment):
+    total = 0
+    for instance in deployment.chain.contracts.values():
+        total += len(pack(instance.storage))
+        for big_map in _big_maps(instance.storage):
+            for key, value in deployment.chain.store.maps[big_map.id].items():
+                total += len(pack(key)) + len(pack(value))
+    return total
+
+
+def _big_maps(value):
+    if type(value) is BigMap:
+        yield value
+    elif type(value) is tuple:
+        yield from _big_maps(value[0])
+        yield from _big_maps(value[1])
+
+
+class Measure:
+    """Accumulates the cost of the calls made inside a `with` block."""
+
+    def __init__(self, deployment):
+        self.deployment = deployment
+        self.gas = 0
+        self.operations = 0
+        self.operation_bytes = 0
+        self.storage_bytes = 0
+
+    def __enter__(self):
+        self.before = storage_bytes(self.deployment)
+        return self
+
+    def __exit__(self, *exc):
+        self.storage_bytes = storage_bytes(self.deployment) - self.before
+
+    def call(self, instance, entrypoint, parameter, sender, amount=0):
+        receipt = self.deployment.call(instance, entrypoint, parameter, sender, amount)
+        ty, _ = entrypoint_wrapper(instance.script.parameter, entrypoint)
+        self.operation_bytes += len(pack(from_fields(ty, parameter)))
+        for _, _, result in receipt.calls:
+            self.operation_bytes += sum(len(pack(op.parameter)) for op in result.operations)
+        self.gas += receipt.gas
+        self.operations += 1 + receipt.operations
+        return receipt
+
+    def result(self, contract, entrypoint, batch, mode):
+        return {
+            "contract": contract, "entrypoint": entrypoint, "batch": batch, "mode": mode,
+            "gas": self.gas, "operations": self.operations,
+            "operation_bytes": self.operation_bytes, "storage_bytes": self.storage_bytes,
+        }
+
+
+def _entrypoints(instance):
+    return entrypoints(instance.script.parameter)
+
+
+def param(instance, entrypoint, fields, key):
+    """Record parameter by field name, or the `key` field alone for entry
+    points that take a single value (e.g. `collect` before multi-edition)."""
+    ty, _ = entrypoint_wrapper(instance.script.parameter, entrypoint)
+    return fields if ty.name == "pair" else fields[key]
+
+
+## ## Scenarios
+##
+## A scenario sets a fresh deployment up, then measures `n` units of work
+## and returns a list of results.
+
+def _artist_with_objkt(d, editions, seed="artist"):
+    artist = account(seed)
+    objkt_id = d.mint(artist, editions, 100)
+    return artist, objkt_id
+
+
+def fa2_transfer(d, n):
+    owner, objkt_id = _artist_with_objkt(d, n)
+    receivers = [account("receiver-%d" % i) for i in range(n)]
+    results = []
+    with Measure(d) as m:
+        for to_ in receivers:
+            m.call(d.objkts, "transfer", [{"from_": owner, "txs": [{"to_": to_, "token_id": objkt_id, "amount": 1}]}], owner)
+    results.append(m.result("fa2", "transfer", n, "single"))
+    owner, objkt_id = _artist_with_objkt(d, n, "artist-2")
+    with Measure(d) as m:
+        m.call(d.objkts, "transfer", [{"from_": owner, "txs": [{"to_": to_, "token_id": objkt_id, "amount": 1} for to_ in receivers]}], owner)
+    results.append(m.result("fa2", "transfer", n, "batch"))
+    return results
+
+
+def fa2_churn(d, n):
+    """An edition passed along `n` wallets: every wallet but the last ends
+    with a zero balance, so storage growth shows dead ledger entries."""
+    owner, objkt_id = _artist_with_objkt(d, 1)
+    with Measure(d) as m:
+        for i in range(n):
+            to_ = account("wallet-%d" % i)
+            m.call(d.objkts, "transfer", [{"from_": owner, "txs": [{"to_": to_, "token_id": objkt_id, "amount": 1}]}], owner)
+            owner = to_
+    return [m.result("fa2", "transfer", n, "churn")]
+
+
+def v1_mint(d, n):
+    artist = account("artist")
+    with Measure(d) as m:
+        for _ in range(n):
+            m.call(d.minter, "mint_OBJKT", {"address": artist, "amount": 10, "metadata": b"ipfs://", "royalties": 100}, artist)
+    results = [m.result("v1", "mint_OBJKT", n, "single")]
+    if "mint_batch" in _entrypoints(d.minter):
+        with Measure(d) as m:
+            m.call(d.minter, "mint_batch", [{"address": artist, "amount": 10, "metadata": b"ipfs://", "royalties": 100}] * n, artist)
+        results.append(m.result("v1", "mint_OBJKT", n, "batch"))
+    return results
+
+
+def _v1_swaps(d, artist, objkt_id, n):
+    d.add_operator(d.objkts, artist, d.minter.address, objkt_id)
+    first = storage_field(d.minter, "swap_id")
+    for _ in range(n):
+        d.call(d.minter, "swap", {"kt": d.objkts.address, "objkt_amount": 1, "objkt_id": objkt_id, "xtz_per_objkt": 1000000}, artist)
+    return list(range(first, first + n))
+
+
+def v1_market(d, n):
+    artist, objkt_id = _artist_with_objkt(d, 3 * n)
+    d.add_operator(d.objkts, artist, d.minter.address, objkt_id)
+    buyer = account("buyer")
+    results = []
+    with Measure(d) as m:
+        for _ in range(n):
+            m.call(d.minter, "swap", {"kt": d.objkts.address, "objkt_amount": 1, "objkt_id": objkt_id, "xtz_per_objkt": 1000000}, artist)
+    results.append(m.result("v1", "swap", n, "single"))
+    swaps = _v1_swaps(d, artist, objkt_id, n)
+    with Measure(d) as m:
+        for swap_id in swaps:
+            m.call(d.minter, "collect", {"objkt_amount": 1, "swap_id": swap_id}, buyer, 1000000)
+    results.append(m.result("v1", "collect", n, "single"))
+    swaps = _v1_swaps(d, artist, objkt_id, n)
+    with Measure(d) as m:
+        for swap_id in swaps:
+            m.call(d.minter, "cancel_swap", swap_id, artist)
+    results.append(m.result("v1", "cancel_swap", n, "single"))
+    return results
+
+
+def v1_curate(d, n):
+    _, objkt_id = _artist_with_objkt(d, 1)
+    curator = account("curator")
+    d.give_hdao(curator, 1000 * n)
+    with Measure(d) as m:
+        for _ in range(n):
+            m.call(d.minter, "curate", {"hDAO_amount": 10, "objkt_id": objkt_id}, curator)
+    results = [m.result("v1", "curate", n, "single")]
+    if "curate_batch" in _entrypoints(d.curation):
+        d.add_operator(d.hdao, curator, d.curation.address, 0)
+        with Measure(d) as m:
+            m.call(d.curation, "curate_batch", [{"hDAO_amount": 10, "objkt_id": objkt_id}] * n, curator)
+        results.append(m.result("v1", "curate", n, "batch"))
+    return results
+
+
+def curation_claim(d, n):
+    """An issuer claiming the hDAO curated on `n` of their objkts."""
+    artist = account("artist")
+    objkt_ids = [d.mint(artist, 1, 100) for _ in range(2 * n)]
+    curator = account("curator")
+    d.give_hdao(curator, 10 * len(objkt_ids))
+    for objkt_id in objkt_ids:
+        d.call(d.minter, "curate", {"hDAO_amount": 10, "objkt_id": objkt_id}, curator)
+    with Measure(d) as m:
+        for objkt_id in objkt_ids[:n]:
+            m.call(d.curation, "claim_hDAO", {"hDAO_amount": 10, "objkt_id": objkt_id}, artist)
+    results = [m.result("curation", "claim_hDAO", n, "single")]
+    if "claim_hDAO_batch" in _entrypoints(d.curation):
+        with Measure(d) as m:
+            m.call(d.curation, "claim_hDAO_batch", [{"hDAO_amount": 10, "objkt_id": objkt_id} for objkt_id in objkt_ids[n:]], artist)
+        results.append(m.result("curation", "claim_hDAO", n, "batch"))
+    return results
+
+
+def _v2_swap_fields(artist, objkt_id):
+    return {"creator": artist, "objkt_amount": 1, "objkt_id": objkt_id, "royalties": 100, "xtz_per_objkt": 1000000}
+
+
+def _v2_swaps(d, artist, objkt_id, n):
+    first = storage_field(d.marketplace, "counter")
+    for _ in range(n):
+        d.call(d.marketplace, "swap", _v2_swap_fields(artist, objkt_id), artist)
+    return list(range(first, first + n))
+
+
+def v2_market(d, n):
+    artist, objkt_id = _artist_with_objkt(d, 6 * n)
+    d.add_operator(d.objkts, artist, d.marketplace.address, objkt_id)
+    buyer = account("buyer")
+    market = d.marketplace
+    batched = _entrypoints(market)
+    results = []
+
+    with Measure(d) as m:
+        for _ in range(n):
+            m.call(market, "swap", _v2_swap_fields(artist, objkt_id), artist)
+    results.append(m.result("v2", "swap", n, "single"))
+    if "swap_batch" in batched:
+        with Measure(d) as m:
+            m.call(market, "swap_batch", [_v2_swap_fields(artist, objkt_id)] * n, artist)
+        results.append(m.result("v2", "swap", n, "batch"))
+
+    swaps = _v2_swaps(d, artist, objkt_id, n)
+    with Measure(d) as m:
+        for swap_id in swaps:
+            m.call(market, "collect", param(market, "collect", {"objkt_amount": 1, "swap_id": swap_id}, "swap_id"), buyer, 1000000)
+    results.append(m.result("v2", "collect", n, "single"))
+    if "collect_batch" in batched:
+        swaps = _v2_swaps(d, artist, objkt_id, n)
+        with Measure(d) as m:
+            m.call(market, "collect_batch", [{"objkt_amount": 1, "swap_id": swap_id} for swap_id in swaps], buyer, 1000000 * n)
+        results.append(m.result("v2", "collect", n, "batch"))
+
+    swaps = _v2_swaps(d, artist, objkt_id, n)
+    with Measure(d) as m:
+        for swap_id in swaps:
+            m.call(market, "cancel_swap", swap_id, artist)
+    results.append(m.result("v2", "cancel_swap", n, "single"))
+    if "cancel_swap_batch" in batched:
+        swaps = _v2_swaps(d, artist, objkt_id, n)
+        with Measure(d) as m:
+            m.call(market, "cancel_swap_batch", swaps, artist)
+        results.append(m.result("v2", "cancel_swap", n, "batch"))
+    return results
+
+
+def v2_offers(d, n):
+    """`n` offers on one objkt, accepted best first by a holder, and `n`
+    cancelled (when the artifact has offers)."""
+    market = d.marketplace
+    if "make_offer" not in _entrypoints(market):
+        return []
+    artist, objkt_id = _artist_with_objkt(d, n)
+    d.add_operator(d.objkts, artist, market.address, objkt_id)
+    buyer = account("buyer")
+
+    def make_offers(call):
+        first = storage_field(market, "offer_counter")
+        for i in range(n):
+            price = 1000000 + 1000 * i
+            call(market, "make_offer", {"objkt_amount": 1, "objkt_id": objkt_id, "xtz_per_objkt": price}, buyer, price)
+        return list(range(first, first + n))
+
+    results = []
+    with Measure(d) as m:
+        make_offers(m.call)
+    results.append(m.result("v2", "make_offer", n, "single"))
+    with Measure(d) as m:
+        for _ in range(n):
+            m.call(market, "accept_offer", {"creator": artist, "min_payout": 0, "objkt_amount": 1, "objkt_id": objkt_id, "royalties": 100}, artist)
+    results.append(m.result("v2", "accept_offer", n, "single"))
+    ids = make_offers(d.call)
+    with Measure(d) as m:
+        for offer_id in ids:
+            m.call(market, "cancel_offer", offer_id, buyer)
+    results.append(m.result("v2", "cancel_offer", n, "single"))
+    return results
+
+
+def v2_1_market(d, n):
+    artist, objkt_id = _artist_with_objkt(d, 3 * n)
+    market = d.marketplace_v2_1
+    d.add_operator(d.objkts, artist, market.address, objkt_id)
+    buyer = account("buyer")
+    d.give_hdao(buyer, 1000 * n)
+    d.add_operator(d.hdao, buyer, market.address, 0)
+    fields = {"contract": d.hdao.address, "creator": artist, "objkt_amount": 1, "objkt_id": objkt_id,
+              "royalties": 100, "token_id": 0, "token_per_objkt": 1000}
+    results = []
+
+    def swaps():
+        first = storage_field(market, "counter")
+        for _ in range(n):
+            d.call(market, "swap", fields, artist)
+        return list(range(first, first + n))
+
+    with Measure(d) as m:
+        for _ in range(n):
+            m.call(market, "swap", fields, artist)
+    results.append(m.result("v2.1", "swap", n, "single"))
+    ids = swaps()
+    with Measure(d) as m:
+        for swap_id in ids:
+            m.call(market, "collect", param(market, "collect", {"objkt_amount": 1, "swap_id": swap_id}, "swap_id"), buyer)
+    results.append(m.result("v2.1", "collect", n, "single"))
+    ids = swaps()
+    with Measure(d) as m:
+        for swap_id in ids:
+            m.call(market, "cancel_swap", param(market, "cancel_swap", {"swap_id": swap_id}, "swap_id"), artist)
+    results.append(m.result("v2.1", "cancel_swap", n, "single"))
+    return results
+
+
+def v2_1_best(d, n):
+    """`collect_best` against a book `n` price levels deep (when the artifact
+    has it): the best edition, then `n` editions filled across swaps of two
+    editions each, the last one partially."""
+    market = d.marketplace_v2_1
+    if "collect_best" not in _entrypoints(market):
+        return []
+    artist, objkt_id = _artist_with_objkt(d, 4 * n + 2)
+    d.add_operator(d.objkts, artist, market.address, objkt_id)
+    buyer = account("buyer")
+    d.give_hdao(buyer, 10 ** 9)
+    d.add_operator(d.hdao, buyer, market.address, 0)
+    for i in range(n):
+        d.call(market, "swap", {"contract": d.hdao.address, "creator": artist, "objkt_amount": 2, "objkt_id": objkt_id,
+                                "royalties": 100, "token_id": 0, "token_per_objkt": 1000 + i}, artist)
+    order = {"objkt_id": objkt_id, "contract": d.hdao.address, "token_id": 0, "max_token_per_objkt": 1000 + n}
+    results = []
+    with Measure(d) as m:
+        m.call(market, "collect_best", dict(order, objkt_amount=1), buyer)
+    results.append(m.result("v2.1", "collect_best", n, "best"))
+    with Measure(d) as m:
+        m.call(market, "collect_best", dict(order, objkt_amount=n), buyer)
+    results.append(m.result("v2.1", "collect_best", n, "depth"))
+    return results
+
+
+SCENARIOS = {
+    "fa2_transfer": fa2_transfer,
+    "fa2_churn": fa2_churn,
+    "v1_mint": v1_mint,
+    "v1_market": v1_market,
+    "v1_curate": v1_curate,
+    "curation_claim": curation_claim,
+    "v2_market": v2_market,
+    "v2_offers": v2_offers,
+    "v2_1_market": v2_1_market,
+    "v2_1_best": v2_1_best,
+}
+
+
+## Entry points measured by each scenario that the deployed artifacts lack,
+## by `Deployment` attribute
+REQUIRES = {
+    "v1_mint": (("minter", "mint_batch"),),
+    "v1_curate": (("curation", "curate_batch"),),
+    "curation_claim": (("curation", "claim_hDAO_batch"),),
+    "v2_market": (("marketplace", "swap_batch"), ("marketplace", "collect_batch"), ("marketplace", "cancel_swap_batch")),
+    "v2_offers": (("marketplace", "make_offer"), ("marketplace", "accept_offer"), ("marketplace", "cancel_offer")),
+    "v2_1_best": (("marketplace_v2_1", "collect_best"),),
+}
+
+
+class MissingEntrypoints(Exception):
+    """The artifacts lack entry points that the requested scenarios measure."""
+
+    def __init__(self, missing):
+        Exception.__init__(self, ", ".join("%s: %s.%s" % m for m in missing))
+        self.missing = missing
+
+
+def missing_entrypoints(artifacts=ARTIFACTS, scenarios=None):
+    """`(scenario, contract, entrypoint)` for every required entry point that
+    the artifacts do not have."""
+    d = Deployment(artifacts)
+    missing = []
+    for name in scenarios or SCENARIOS:
+        for role, entrypoint in REQUIRES.get(name, ()):
+            if entrypoint not in _entrypoints(getattr(d, role)):
+                missing.append((name, role, entrypoint))
+    return missing
+
+
+def code_sizes(artifacts=ARTIFACTS):
+    """Binary size (what every call loads) and line count of each artifact."""
+    sizes = {}
+    for path in sorted(Path(artifacts).glob("*.tz")):
+        with open(path) as f:
+            lines = sum(1 for _ in f)
+        sizes[path.stem] = {"code_bytes": script_size(parse_file(path)), "lines": lines}
+    return sizes
+
+
+def run(artifacts=ARTIFACTS, batch_sizes=BATCH_SIZES, scenarios=None, allow_missing=False):
+    missing = missing_entrypoints(artifacts, scenarios)
+    if missing and not allow_missing:
+        raise MissingEntrypoints(missing)
+    results = []
+    for name in scenarios or SCENARIOS:
+        for n in batch_sizes:
+            for result in SCENARIOS[name](Deployment(artifacts), n):
+                result["scenario"] = name
+                results.append(result)
+    return {"artifacts": str(artifacts), "batch_sizes": list(batch_sizes),
+            "sizes": code_sizes(artifacts), "results": results,
+            "missing": [{"scenario": s, "contract": c, "entrypoint": e} for s, c, e in missing]}
+
+
+## ## Regression check
+
+def _key(result):
+    return (result["contract"], result["entrypoint"], result["batch"], result["mode"])
+
+
+def check(report, baseline, threshold=5.0, metrics=METRICS):
+    """Return the measurements that got worse than `baseline` by more than
+    `threshold` percent, as `(key, metric, baseline, current)` tuples."""
+    previous = {_key(r): r for r in baseline["results"]}
+    regressions = []
+    for result in report["results"]:
+        old = previous.get(_key(result))
+        if old is None:
+            continue
+        for metric in metrics:
+            # storage_bytes may be negative (a call freeing storage)
+            if result[metric] - old[metric] > abs(old[metric]) * threshold / 100.0:
+                regressions.append((_key(result), metric, old[metric], result[metric]))
+    for name, size in report.get("sizes", {}).items():
+        old = baseline.get("sizes", {}).get(name)
+        if old is not None and size["code_bytes"] - old["code_bytes"] > old["code_bytes"] * threshold / 100.0:
+            regressions.append(((name,), "code_bytes", old["code_bytes"], size["code_bytes"]))
+    return regressions
+
+
+def format_report(report):
+    lines = ["%-20s %10s %6s" % ("", "code_bytes", "lines")]
+    for name, size in report.get("sizes", {}).items():
+        lines.append("%-20s %10d %6d" % (name, size["code_bytes"], size["lines"]))
+    lines += ["","%-8s %-16s %5s %-6s %10s %5s %8s %8s" % ("", "entrypoint", "batch", "mode", "gas", "ops", "op_bytes", "storage")]
+    for r in report["results"]:
+        lines.append("%-8s %-16s %5d %-6s %10d %5d %8d %8d" % (
+            r["contract"], r["entrypoint"], r["batch"], r["mode"], r["gas"], r["operations"],
+            r["operation_bytes"], r["storage_bytes"]))
+    missing = report.get("missing")
+    if missing:
+        lines += ["", "not measured, missing from the artifacts:"]
+        lines += ["  %s: %s.%s" % (m["scenario"], m["contract"], m["entrypoint"]) for m in missing]
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m objkt_tools.bench")
+    parser.add_argument("--artifacts", default=str(ARTIFACTS), help="directory of compiled .tz files")
+    parser.add_argument("--batch", default=",".join(map(str, BATCH_SIZES)), help="comma separated batch sizes")
+    parser.add_argument("--scenario", action="append", choices=sorted(SCENARIOS), help="scenarios to run (default: all)")
+    parser.add_argument("--out", help="write the JSON report to this file")
+    parser.add_argument("--baseline", help="JSON report to compare with")
+    parser.add_argument("--threshold", type=float, default=5.0, help="allowed regression in percent")
+    parser.add_argument("--allow-missing", action="store_true",
+                        help="measure artifacts that lack entry points of the scenarios")
+    args = parser.parse_args(argv)
+
+    try:
+        report = run(args.artifacts, [int(n) for n in args.batch.split(",")], args.scenario, args.allow_missing)
+    except MissingEntrypoints as e:
+        print("missing entry points (rebuild the artifacts or pass --allow-missing): %s" % e, file=sys.stderr)
+        return 2
+    print(format_report(report))
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=1)
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = check(report, json.load(f), args.threshold)
+        for key, metric, old, new in regressions:
+            print("REGRESSION %s %s: %d -> %d" % ("/".join(map(str, key)), metric, old, new))
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
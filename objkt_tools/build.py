@@ -0,0 +1,226 @@
+## Incremental build of the `michelson/*.tz` artifacts
+##
+## `TARGETS` maps each artifact to the SmartPy sources it is compiled from
+## (in the order they are loaded) and the expression that instantiates its
+## contract. A target is keyed by the content hash of its sources, of the
+## generated driver and of the SmartPy version, and compiled outputs are
+## cached by that key: only targets whose inputs changed are recompiled,
+## and targets with the same inputs (`fa2_objkts` and `fa2_hdao`, both
+## `fa2.py`) are compiled once. Misses are compiled in a process pool.
+##
+## Each artifact is written with its initial storage, `storage/<name>.tz`,
+## which `Deployment` needs for the code of lazy entry points.
+##
+## `--check` compares every output byte for byte with the checked-in
+## artifact; `--rebuild` ignores the cache and also reports outputs that
+## differ from a previous compilation of the same inputs (a compiler that
+## is not reproducible).
+##
+##     python -m objkt_tools.build                    # build/ from the cache and changed sources
+##     python -m objkt_tools.build --check            # and compare with michelson/
+##     python -m objkt_tools.build --out michelson    # update the checked-in artifacts
+##
+## The SmartPy CLI is looked up in `$SMARTPY_CLI`, then
+## `~/smartpy-cli/SmartPy.sh`. `commons_v1`, `subjkts` and `unregistry`
+## have no source in this repository and are not built.
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from .deployment import ARTIFACTS, HDAO, CURATION, MINTER, OBJKTS
+
+SOURCES = Path(__file__).resolve().parents[1] / "smart-py"
+OUT = Path(__file__).resolve().parents[1] / "build"
+CACHE = Path(os.environ.get("XDG_CACHE_HOME", Path.home() / ".cache")) / "objkt_tools" / "build"
+
+Target = namedtuple("Target", "sources contract")
+
+_META = 'sp.big_map({"": sp.utils.bytes_of_string("ipfs://")})'
+_FA2 = Target(("fa2.py",), 'FA2(FA2_config(), admin = sp.address("%s"), meta = %s)' % (MINTER, _META))
+
+TARGETS = {
+    "fa2_objkts": _FA2,
+    "fa2_hdao": _FA2,
+    "curation": Target(("curation.py",), 'Curation(manager = sp.address("%s"), metadata = %s, fa2 = sp.address("%s"), protocol = sp.address("%s"))'
+                       % (MINTER, _META, HDAO, MINTER)),
+    "objkt_swap_v1": Target(("objkt_swap_v1.py",),
+        'OBJKTSwap(objkt = sp.address("%s"), hdao = sp.address("%s"), manager = sp.address("%s"), metadata = %s, curate = sp.address("%s"))'
+        % (OBJKTS, HDAO, MINTER, _META, CURATION)),
+    "objkt_swap_v2": Target(("objkt_swap_v2.py",),
+        'Marketplace(objkt = sp.address("%s"), metadata = %s, manager = sp.address("%s"), fee = sp.nat(25))'
+        % (OBJKTS, _META, MINTER)),
+    "objkt_swap_v2_1": Target(("objkt_swap_v2_1.py",),
+        'OBJKTSWAPV21(manager = sp.address("%s"), metadata = %s, objkts = sp.address("%s"))'
+        % (MINTER, _META, OBJKTS)),
+}
+
+
+def smartpy_cli():
+    cli = os.environ.get("SMARTPY_CLI") or str(Path.home() / "smartpy-cli" / "SmartPy.sh")
+    return cli if Path(cli).exists() else None
+
+
+def cli_version(cli):
+    if cli is None:
+        return None
+    try:
+        out = subprocess.run([cli, "--version"], capture_output=True, text=True, timeout=60)
+        return (out.stdout or out.stderr).strip()
+    except (OSError, subprocess.SubprocessError):
+        return "unknown"
+
+
+def compile_driver(cli, driver, out):
+    """Compile a SmartPy driver script; copy its single compilation target to
+    `out/contract.tz` and `out/storage.tz`."""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "driver.py"
+        path.write_text(driver)
+        done = subprocess.run([cli, "compile", str(path), tmp + "/out"], capture_output=True, text=True)
+        if done.returncode != 0:
+            raise RuntimeError((done.stderr or done.stdout).strip()[-2000:])
+        contract = next(Path(tmp, "out").rglob("*contract.tz"))
+        storage = next(Path(tmp, "out").rglob("*storage.tz"))
+        out.mkdir(parents=True, exist_ok=True)
+        shutil.copy(contract, out / "contract.tz")
+        shutil.copy(storage, out / "storage.tz")
+
+
+def driver(target, sources=SOURCES):
+    lines = ["import smartpy as sp"]
+    for source in target.sources:
+        lines.append("exec(open(%r).read())" % str(Path(sources) / source))
+    lines.append('sp.add_compilation_target("contract", %s)' % target.contract)
+    return "\n".join(lines) + "\n"
+
+
+def target_key(target, version, sources=SOURCES):
+    # the driver names the sources by path: hash it with a fixed directory
+    h = hashlib.sha256()
+    h.update(driver(target, "smart-py").encode())
+    for source in target.sources:
+        h.update((Path(sources) / source).read_bytes())
+    h.update(str(version).encode())
+    return h.hexdigest()[:32]
+
+
+def _compile(args):
+    cli, text, out = args
+    try:
+        compile_driver(cli, text, Path(out))
+        return None
+    except Exception as e:
+        return "%s: %s" % (type(e).__name__, e)
+
+
+def build(names=None, out=OUT, cache=CACHE, reference=None, rebuild=False, jobs=None, cli=None, sources=SOURCES):
+    """Build `names` (all targets by default) into `out`; return one result
+    per target with its status: `cached`, `compiled`, `skipped` (no CLI),
+    `failed` or, against `reference`, `differs`."""
+    cli = cli or smartpy_cli()
+    version = cli_version(cli)
+    names = list(TARGETS) if names is None else list(names)
+    cache, out = Path(cache), Path(out)
+    keys = {name: target_key(TARGETS[name], version, sources) for name in names}
+
+    # one compilation per distinct key
+    work, previous = {}, {}
+    for name in names:
+        key = keys[name]
+        cached = cache / key / "contract.tz"
+        if key in work or cached.exists() and not rebuild:
+            continue
+        if cached.exists():
+            previous[key] = cached.read_bytes()
+        work[key] = driver(TARGETS[name], sources)
+    errors = {}
+    if work and cli is not None:
+        with tempfile.TemporaryDirectory() as tmp, ProcessPoolExecutor(max_workers=jobs) as pool:
+            batch = [(cli, text, str(Path(tmp) / key)) for key, text in work.items()]
+            for (_, _, fresh), error in zip(batch, pool.map(_compile, batch)):
+                key = Path(fresh).name
+                if error is not None:
+                    errors[key] = error
+                    continue
+                (cache / key).mkdir(parents=True, exist_ok=True)
+                for file in ("contract.tz", "storage.tz"):
+                    shutil.copy(Path(fresh) / file, cache / key / file)
+
+    results = []
+    out.mkdir(parents=True, exist_ok=True)
+    for name in names:
+        key = keys[name]
+        result = {"name": name, "key": key, "sources": list(TARGETS[name].sources)}
+        cached = cache / key / "contract.tz"
+        if key in errors:
+            results.append(dict(result, status="failed", error=errors[key]))
+            continue
+        if not cached.exists():
+            results.append(dict(result, status="skipped", error="SmartPy CLI not found"))
+            continue
+        code = cached.read_bytes()
+        result["status"] = "compiled" if key in work else "cached"
+        if key in previous and previous[key] != code:
+            result.update(status="differs", error="not reproducible: differs from the previous compilation")
+        elif reference is not None:
+            checked_in = Path(reference) / ("%s.tz" % name)
+            if not checked_in.exists() or checked_in.read_bytes() != code:
+                result.update(status="differs", error=_difference(checked_in, code))
+        (out / ("%s.tz" % name)).write_bytes(code)
+        # the initial storage holds the code of lazy entry points
+        (out / "storage").mkdir(exist_ok=True)
+        shutil.copy(cache / key / "storage.tz", out / "storage" / ("%s.tz" % name))
+        results.append(result)
+    return results
+
+
+def _difference(path, code):
+    if not path.exists():
+        return "%s does not exist" % path
+    old, new = path.read_bytes().splitlines(), code.splitlines()
+    for i, (a, b) in enumerate(zip(old, new)):
+        if a != b:
+            return "differs from %s at line %d" % (path, i + 1)
+    return "differs from %s in length (%d lines, built %d)" % (path, len(old), len(new))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m objkt_tools.build")
+    parser.add_argument("targets", nargs="*", help="targets to build (default: all)")
+    parser.add_argument("--out", default=str(OUT), help="directory the .tz files are written to")
+    parser.add_argument("--cache", default=str(CACHE))
+    parser.add_argument("--check", action="store_true", help="compare the outputs with the checked-in artifacts")
+    parser.add_argument("--reference", default=str(ARTIFACTS), help="checked-in artifacts for --check")
+    parser.add_argument("--rebuild", action="store_true", help="recompile everything, ignoring the cache")
+    parser.add_argument("--jobs", type=int, default=os.cpu_count())
+    parser.add_argument("--json", action="store_true", help="print the results as JSON")
+    args = parser.parse_args(argv)
+
+    unknown = set(args.targets) - set(TARGETS)
+    if unknown:
+        parser.error("unknown targets %s" % ", ".join(sorted(unknown)))
+    reference = Path(args.reference) if args.check else None
+    if reference is not None and reference.resolve() == Path(args.out).resolve():
+        parser.error("--check needs an output directory other than the reference")
+    results = build(args.targets or None, args.out, args.cache, reference, args.rebuild, args.jobs)
+    if args.json:
+        print(json.dumps(results, indent=1))
+    else:
+        for r in results:
+            print("%-9s %-16s %s%s" % (r["status"], r["name"], r["key"][:12],
+                                       "  " + r["error"] if "error" in r else ""))
+    # a check that could not compile has not checked anything
+    failing = ("failed", "differs", "skipped") if args.check else ("failed", "differs")
+    return 1 if any(r["status"] in failing for r in results) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
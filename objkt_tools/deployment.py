@@ -0,0 +1,121 @@
+## Local deployment of the hic et nunc contracts
+##
+## Originates the contract set of `README.md` (hDAO, OBJKTs, curation, the
+## v1 minter and the v2 / v2.1 marketplaces) on a local `Chain`, from a
+## directory of compiled `.tz` artifacts. Storages are built by field name,
+## so artifacts compiled with other record layouts deploy the same way.
+## Fields that are not given, like the unannotated big_map SmartPy keeps
+## lazy entry points in, come from `storage/<name>.tz`, the initial storage
+## `objkt_tools.build` writes next to the artifacts.
+from pathlib import Path
+
+from .michelson import Chain, Left, Prim, account, encode, from_fields, parse_file
+
+ARTIFACTS = Path(__file__).resolve().parents[1] / "michelson"
+
+## Mainnet addresses, kept so that packed keys and operations have the
+## same sizes as on chain.
+HDAO = "KT1AFA2mwNUMNd4SsujE1YYp29vd8BZejyKW"
+CURATION = "KT1TybhR7XraG75JFYKSrh7KnxukMBT5dor6"
+MINTER = "KT1Hkg5qeNhfwpKW4fXvq7HGZB9z2EnmCCA9"
+OBJKTS = "KT1RJ6PbjHpwc3M5rw5s2Nbmefwbuwbdxton"
+MARKETPLACE = "KT1HbQepzV1nVGg8QVznG7z4RcHseD5kwqBn"
+MARKETPLACE_V2_1 = "KT1QPvv7sWVaT9PcPiC4fN9BgfX8NB2d5WzL"
+
+MANAGER = account("manager")
+
+
+def _fa2_storage(admin):
+    return {
+        "administrator": admin, "all_tokens": 0, "ledger": {}, "metadata": {},
+        "operators": {}, "paused": False, "token_metadata": {},
+    }
+
+
+class Deployment:
+    """The contract instances of one local deployment, by role."""
+
+    def __init__(self, artifacts=ARTIFACTS, chain=None, manager=MANAGER):
+        artifacts = Path(artifacts)
+        self.chain = chain if chain is not None else Chain()
+        self.manager = manager
+        self.artifacts = artifacts
+
+        def originate(name, storage, address):
+            script = parse_file(artifacts / ("%s.tz" % name))
+            compiled = artifacts / "storage" / ("%s.tz" % name)
+            if compiled.exists():
+                storage = encode(from_fields(script.storage, storage, self.chain.store, compiled.read_text()))
+            return self.chain.originate(script, storage, address)
+
+        self.hdao = originate("fa2_hdao", _fa2_storage(MINTER), HDAO)
+        self.objkts = originate("fa2_objkts", _fa2_storage(MINTER), OBJKTS)
+        self.curation = originate("curation", {
+            "curations": {}, "fa2": HDAO, "locked": False, "manager": manager,
+            "metadata": {}, "protocol": MINTER,
+        }, CURATION)
+        self.minter = originate("objkt_swap_v1", {
+            "curate": CURATION, "genesis": 0, "hdao": HDAO, "locked": False, "manager": manager,
+            "metadata": {}, "objkt": OBJKTS, "objkt_id": 152, "royalties": {}, "swap_id": 0, "swaps": {},
+        }, MINTER)
+        self.marketplace = originate("objkt_swap_v2", {
+            "counter": 500000, "fee": 25, "manager": manager, "metadata": {}, "objkt": OBJKTS, "swaps": {},
+            "offers": {}, "offer_book": {}, "offer_counter": 0,
+        }, MARKETPLACE)
+        self.marketplace_v2_1 = originate("objkt_swap_v2_1", {
+            "book": {}, "counter": 0, "fee": 25, "manager": manager, "metadata": {}, "objkts": OBJKTS, "prices": {}, "swaps": {},
+        }, MARKETPLACE_V2_1)
+
+    def call(self, instance, entrypoint, parameter, sender, amount=0):
+        return self.chain.call(instance.address, entrypoint, parameter, sender, amount)
+
+    ## Helpers for the usual setup steps
+
+    def mint(self, artist, amount=10, royalties=100, metadata=b"ipfs://"):
+        """Mint an OBJKT through the v1 minter; return its token id."""
+        objkt_id = self.next_objkt_id()
+        self.call(self.minter, "mint_OBJKT", {
+            "address": artist, "amount": amount, "metadata": metadata, "royalties": royalties,
+        }, artist)
+        return objkt_id
+
+    def next_objkt_id(self):
+        return storage_field(self.minter, "objkt_id")
+
+    def give_hdao(self, owner, amount):
+        return self.call(self.hdao, "hDAO_batch", [{"to_": owner, "amount": amount}], MINTER)
+
+    def add_operator(self, fa2, owner, operator, token_id):
+        return self.call(fa2, "update_operators", [Left({"owner": owner, "operator": operator, "token_id": token_id})], owner)
+
+    def balance(self, fa2, owner, token_id):
+        ledger = storage_field(fa2, "ledger")
+        value = ledger.get((owner, token_id))
+        if value is None:
+            return 0
+        # the ledger value is either the balance or a `balance` record
+        return value if isinstance(value, int) else value[0]
+
+
+def storage_field(instance, name):
+    """Read a storage field of an instance by its annotation."""
+    value = _walk(instance.script.storage, instance.storage, name)
+    if value is _MISSING:
+        raise KeyError(name)
+    return value
+
+
+def _walk(ty, value, name):
+    if ty.annot("%") == name:
+        return value
+    if ty.name == "pair":
+        args = ty.args if len(ty.args) == 2 else (ty.args[0], Prim("pair", ty.args[1:]))
+        for arg, v in zip(args, value):
+            found = _walk(arg, v, name)
+            if found is not _MISSING:
+                return found
+    return _MISSING
+
+
+_MISSING = object()
+
@@ -0,0 +1,156 @@
+## Big_map keys of the FA2 contract
+##
+## Python counterparts of `Ledger_key`, `Operator_set.make_key` and
+## `Token_id_set` in `smart-py/fa2.py`, with the same `FA2_config` options
+## (`single_asset`, `readable`, `assume_consecutive_token_ids`), so that
+## ledger and operator entries can be read over RPC:
+##
+##     keys = Ledger_key(FA2_config())
+##     keys.hash("tz1...", 152)          # -> "expr..." for
+##     # /chains/main/blocks/head/context/big_maps/<ledger id>/<expr...>
+##
+## The key of a `readable` contract is the `(address, nat)` pair itself;
+## otherwise it is the packed pair as `bytes`. Either way the RPC hash is
+## the blake2b of the PACKed key. `hash_many` hashes a batch of keys from
+## the packed form of their address, which is cached, and `hash` keeps an
+## LRU cache of the hashes of hot wallets.
+import functools
+import hashlib
+import sys
+import time
+
+from .michelson.pack import pack, address_bytes, b58encode_check, _zarith, EXPR
+from .michelson.values import Address
+
+CACHE_SIZE = 65536
+
+
+class FA2_config:
+    """The `FA2_config` options that change how keys are encoded."""
+
+    def __init__(self, single_asset=False, readable=True, assume_consecutive_token_ids=True):
+        self.single_asset = single_asset
+        self.readable = readable
+        self.assume_consecutive_token_ids = assume_consecutive_token_ids
+
+
+def _packed_address(address):
+    raw = address_bytes(address)
+    return b"\x0a" + len(raw).to_bytes(4, "big") + raw
+
+
+def _packed_bytes(data):
+    # PACK of a `bytes` value, the key type of non-readable contracts
+    return b"\x05\x0a" + len(data).to_bytes(4, "big") + data
+
+
+def _expr(packed):
+    return b58encode_check(hashlib.blake2b(packed, digest_size=32).digest(), EXPR)
+
+
+class Ledger_key:
+    def __init__(self, config=None, cache_size=CACHE_SIZE):
+        self.config = config or FA2_config()
+        self._address = functools.lru_cache(maxsize=cache_size)(_packed_address)
+        self.hash = functools.lru_cache(maxsize=cache_size)(self._hash)
+
+    def make(self, user, token_id=0):
+        """The big_map key, as `Ledger_key.make` builds it."""
+        if self.config.single_asset:
+            result = Address(user)
+        else:
+            result = (Address(user), token_id)
+        if self.config.readable:
+            return result
+        return pack(result)
+
+    def packed(self, user, token_id=0):
+        """`PACK` of the big_map key."""
+        if self.config.single_asset:
+            if token_id != 0:
+                raise ValueError("single-asset: token-id <> 0")
+            value = b"\x05" + self._address(user)
+        else:
+            value = b"\x05\x07\x07" + self._address(user) + b"\x00" + _zarith(token_id)
+        if self.config.readable:
+            return value
+        return _packed_bytes(value)
+
+    def _hash(self, user, token_id=0):
+        return _expr(self.packed(user, token_id))
+
+    def hash_many(self, keys):
+        """The `expr...` hashes of `(user, token_id)` pairs, in order."""
+        packed = self.packed
+        return [_expr(packed(user, token_id)) for user, token_id in keys]
+
+
+class Operator_set:
+    def __init__(self, config=None, cache_size=CACHE_SIZE):
+        self.config = config or FA2_config()
+        self._address = functools.lru_cache(maxsize=cache_size)(_packed_address)
+
+    def make_key(self, owner, operator, token_id):
+        """The key of the lazy set, as `Operator_set.make_key` builds it."""
+        # layout ("owner", ("operator", "token_id"))
+        metakey = (Address(owner), (Address(operator), token_id))
+        if self.config.readable:
+            return metakey
+        return pack(metakey)
+
+    def packed(self, owner, operator, token_id):
+        value = (b"\x05\x07\x07" + self._address(owner) + b"\x07\x07" + self._address(operator)
+                 + b"\x00" + _zarith(token_id))
+        if self.config.readable:
+            return value
+        return _packed_bytes(value)
+
+    def hash(self, owner, operator, token_id):
+        return _expr(self.packed(owner, operator, token_id))
+
+    def hash_many(self, keys):
+        """The `expr...` hashes of `(owner, operator, token_id)` triples."""
+        packed = self.packed
+        return [_expr(packed(*key)) for key in keys]
+
+
+class Token_id_set:
+    """The `all_tokens` storage field: a count of consecutive token ids, or a
+    `set nat`."""
+
+    def __init__(self, config=None):
+        self.config = config or FA2_config()
+
+    def make(self, token_ids):
+        if self.config.assume_consecutive_token_ids:
+            # The "set" is its cardinal.
+            return max(token_ids, default=-1) + 1
+        return frozenset(token_ids)
+
+    def contains(self, metaset, token_id):
+        if self.config.assume_consecutive_token_ids:
+            return token_id < metaset
+        return token_id in metaset
+
+    def packed(self, token_ids):
+        return pack(self.make(token_ids))
+
+
+def bench(keys=100000, wallets=1000):
+    from .michelson import account
+    owners = [account(i) for i in range(wallets)]
+    batch = [(owners[i % wallets], i) for i in range(keys)]
+    ledger = Ledger_key()
+    start = time.perf_counter()
+    ledger.hash_many(batch)
+    elapsed = time.perf_counter() - start
+    start = time.perf_counter()
+    generic = [_expr(pack((Address(user), token_id))) for user, token_id in batch]
+    baseline = time.perf_counter() - start
+    assert generic == ledger.hash_many(batch)
+    print("%d ledger keys: %.3f s (%.1f us/key), generic PACK: %.3f s"
+          % (keys, elapsed, elapsed / keys * 1e6, baseline))
+
+
+if __name__ == "__main__":
+    bench(*map(int, sys.argv[1:]))
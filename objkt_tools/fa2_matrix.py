@@ -0,0 +1,221 @@
+## FA2 configuration matrix runner
+##
+## Expands the `FA2_config` options of `smart-py/fa2.py` into every valid
+## combination (the options, their defaults, the variant names and the
+## invalid combinations all come from `FA2_config` itself), compiles each variant with the SmartPy CLI and runs a
+## short scenario on the result with the local interpreter (mint,
+## update_operators, transfer), in a process pool.
+##
+## Compiled artifacts and scenario results are cached by a hash of the
+## contract source, the driver, the options and the CLI version, so only
+## variants whose inputs changed are rebuilt. All results go into one JSON
+## report.
+##
+##     python -m objkt_tools.fa2_matrix --vary single_asset,non_fungible,readable --jobs 16
+##     python -m objkt_tools.fa2_matrix --set lazy_entry_points=true --out matrix.json
+##
+## The CLI is looked up in `$SMARTPY_CLI`, then `~/smartpy-cli/SmartPy.sh`;
+## without it every variant is reported as `skipped`.
+import argparse
+import hashlib
+import inspect
+import itertools
+import json
+import os
+import sys
+import time
+import types
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from .build import smartpy_cli, cli_version, compile_driver
+
+FA2_SOURCE = Path(__file__).resolve().parents[1] / "smart-py" / "fa2.py"
+CACHE = Path(os.environ.get("XDG_CACHE_HOME", Path.home() / ".cache")) / "objkt_tools" / "fa2_matrix"
+
+
+def load_config(source=FA2_SOURCE):
+    """The `FA2_config` class of the contract source, loaded without
+    SmartPy: it only stores `sp.map` or `sp.big_map`, never calls them.
+
+    The rest of the file uses SmartPy's `sp.if`/`sp.for` syntax, so only the
+    lines of the class are compiled."""
+    lines = Path(source).read_text().splitlines(True)
+    start = next(i for i, line in enumerate(lines) if line.startswith("class FA2_config"))
+    end = next((i for i in range(start + 1, len(lines)) if lines[i][:1] not in ("", " ", "\t", "\n", "#")), len(lines))
+    namespace = {"sp": types.SimpleNamespace(map=dict, big_map=dict)}
+    exec(compile("\n" * start + "".join(lines[start:end]), str(source), "exec"), namespace)
+    return namespace["FA2_config"]
+
+
+FA2_config = load_config()
+
+## `FA2_config` options and their defaults, in the order of its signature
+OPTIONS = tuple((name, p.default) for name, p in inspect.signature(FA2_config).parameters.items())
+DEFAULTS = dict(OPTIONS)
+
+ADMIN = "tz1R8N94haSE8wUcaT1o3oBeR5hmLjPAooXd"
+
+DRIVER = '''import smartpy as sp
+exec(open({source!r}).read())
+sp.add_compilation_target("fa2", FA2(
+    FA2_config(**{options!r}),
+    admin = sp.address({admin!r}),
+    meta = sp.big_map({{"": sp.utils.bytes_of_string("ipfs://")}})))
+'''
+
+
+def config_name(options):
+    """The `FA2_config.name` of a variant."""
+    return FA2_config(**options).name
+
+
+def valid(options):
+    # `FA2_config.__init__` raises on combinations it does not support
+    try:
+        FA2_config(**options)
+    except Exception:
+        return False
+    return True
+
+
+def matrix(vary=None, fixed=None):
+    """Every valid combination of the `vary` options (all by default), the
+    others taking their `fixed` or default value."""
+    vary = [name for name, _ in OPTIONS] if vary is None else list(vary)
+    base = dict(DEFAULTS, **(fixed or {}))
+    variants = []
+    for values in itertools.product((False, True), repeat=len(vary)):
+        options = dict(base, **dict(zip(vary, values)))
+        if valid(options):
+            variants.append(options)
+    return variants
+
+
+def cache_key(source, options, version):
+    h = hashlib.sha256()
+    h.update(source)
+    h.update(DRIVER.encode())
+    h.update(json.dumps(options, sort_keys=True).encode())
+    h.update(str(version).encode())
+    return h.hexdigest()[:32]
+
+
+## ## Running one variant
+##
+## `run_variant` is the unit of work of the pool; it returns a JSON-able
+## result and never raises.
+
+def compile_variant(cli, options, out):
+    compile_driver(cli, DRIVER.format(source=str(FA2_SOURCE), options=options, admin=ADMIN), out)
+
+
+def scenario(options, artifacts):
+    """Gas of a few calls on the compiled variant, by step."""
+    from .michelson import Chain, Left, parse_file, account
+    from .michelson.pack import script_size
+
+    script = parse_file(artifacts / "contract.tz")
+    chain = Chain()
+    fa2 = chain.originate(script, (artifacts / "storage.tz").read_text())
+    alice, bob, operator = account("alice"), account("bob"), account("operator")
+    amount = 1 if options["non_fungible"] else 100
+    gas = {}
+    gas["mint"] = chain.call(fa2.address, "mint", {
+        "address": alice, "amount": amount, "token_id": 0, "token_info": {"": b"ipfs://"}}, ADMIN).gas
+    sender = alice
+    if options["support_operator"]:
+        gas["update_operators"] = chain.call(fa2.address, "update_operators", [
+            Left({"owner": alice, "operator": operator, "token_id": 0})], alice).gas
+        sender = operator
+    gas["transfer"] = chain.call(fa2.address, "transfer", [
+        {"from_": alice, "txs": [{"to_": bob, "token_id": 0, "amount": 1}]}], sender).gas
+    return {"code_bytes": script_size(script), "gas": gas}
+
+
+def run_variant(args):
+    options, key, cli, cache = args
+    name = config_name(options)
+    result = {"name": name, "options": options, "key": key}
+    out = Path(cache) / key
+    cached = out / "result.json"
+    if cached.exists():
+        return dict(json.loads(cached.read_text()), cached=True)
+    if cli is None:
+        return dict(result, status="skipped", error="SmartPy CLI not found")
+    start = time.perf_counter()
+    try:
+        compile_variant(cli, options, out)
+        result.update(scenario(options, out))
+        result["status"] = "ok"
+    except Exception as e:
+        result.update(status="failed", error="%s: %s" % (type(e).__name__, e))
+    result["seconds"] = time.perf_counter() - start
+    if result["status"] == "ok":
+        cached.write_text(json.dumps(result))
+    return dict(result, cached=False)
+
+
+def run(variants, jobs=None, cache=CACHE, cli=None):
+    cli = cli or smartpy_cli()
+    version = cli_version(cli)
+    source = FA2_SOURCE.read_bytes()
+    work = [(options, cache_key(source, options, version), cli, str(cache)) for options in variants]
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        results = list(pool.map(run_variant, work, chunksize=1))
+    return {
+        "source": str(FA2_SOURCE), "smartpy": version, "seconds": time.perf_counter() - start,
+        "variants": results,
+    }
+
+
+def _parse_bool(value):
+    if value.lower() in ("1", "true", "yes"):
+        return True
+    if value.lower() in ("0", "false", "no"):
+        return False
+    raise argparse.ArgumentTypeError("not a boolean: %s" % value)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m objkt_tools.fa2_matrix")
+    parser.add_argument("--vary", help="comma separated options to vary (default: all)")
+    parser.add_argument("--set", action="append", default=[], metavar="OPTION=BOOL", help="fix an option")
+    parser.add_argument("--jobs", type=int, default=os.cpu_count())
+    parser.add_argument("--cache", default=str(CACHE))
+    parser.add_argument("--out", help="write the JSON report to this file")
+    parser.add_argument("--list", action="store_true", help="only list the variants")
+    args = parser.parse_args(argv)
+
+    fixed = {}
+    for item in args.set:
+        option, _, value = item.partition("=")
+        if option not in DEFAULTS:
+            parser.error("unknown option %s" % option)
+        fixed[option] = _parse_bool(value)
+    vary = args.vary.split(",") if args.vary else [name for name in DEFAULTS if name not in fixed]
+    unknown = set(vary) - set(DEFAULTS)
+    if unknown:
+        parser.error("unknown options %s" % ", ".join(sorted(unknown)))
+    variants = matrix(vary, fixed)
+    if args.list:
+        for options in variants:
+            print(config_name(options))
+        return 0
+
+    report = run(variants, args.jobs, Path(args.cache))
+    counts = {}
+    for r in report["variants"]:
+        counts[r["status"]] = counts.get(r["status"], 0) + 1
+        print("%-8s %s%s" % (r["status"], r["name"], " (cached)" if r.get("cached") else ""))
+    print("%d variants in %.1f s: %s" % (len(variants), report["seconds"],
+                                         ", ".join("%d %s" % (n, s) for s, n in sorted(counts.items()))))
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=1)
+    return 1 if counts.get("failed") else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,299 @@
+## Load simulator for marketplace traffic
+##
+## `traffic` synthesizes a reproducible stream of mint, swap, collect,
+## cancel_swap and curate calls shaped like a drop day:
+##
+## - popularity is heavy-tailed: objkts and swaps are picked with a Pareto
+##   distributed rank, recent ones first;
+## - a new swap sometimes starts a burst, many buyers racing to collect it
+##   at once, more of them than there are editions: the collects of the
+##   buyers who come too late are marked `"expect": "sold out"`;
+## - collects target the v2 (tez) and v2.1 (hDAO) marketplaces.
+##
+## Events refer to objkts and swaps by the index of the event that created
+## them, so a stream can be saved as JSON lines and replayed on any
+## deployment. `Replayer` runs a stream through a local `Deployment` and
+## reports throughput, operations, gas and failures by reason. Failures of
+## events marked with `expect` are the races the stream was made with and
+## are reported apart from the others, which point at a bug in the
+## generator, the replayer or a contract.
+##
+##     python -m objkt_tools.loadsim --events 20000
+##     python -m objkt_tools.loadsim --save drop.jsonl && python -m objkt_tools.loadsim --replay drop.jsonl
+import argparse
+import json
+import random
+import sys
+import time
+from collections import Counter
+
+from .bench import param
+from .deployment import Deployment, ARTIFACTS, storage_field
+from .michelson import account, MichelsonFailure, InterpreterError
+
+## Share of each kind of call in the background traffic
+MIX = {"collect": 0.55, "swap": 0.17, "mint": 0.08, "curate": 0.12, "cancel_swap": 0.08}
+MARKETS = ("v2", "v2.1")
+## Most buyers racing on one swap, on top of its editions
+RACE_LIMIT = 50
+
+
+def _pick(rng, items, alpha=1.2):
+    # index of a Pareto distributed rank counted from the most recent item
+    rank = int(rng.paretovariate(alpha)) - 1
+    return len(items) - 1 - min(rank, len(items) - 1)
+
+
+def traffic(events=10000, seed=0, artists=200, buyers=2000, curators=100, burst=0.2, markets=MARKETS):
+    """Yield a stream of `events` call events.
+
+    The generator follows the editions it expects to be on sale, so that
+    background traffic mostly succeeds and failures come from the races.
+    """
+    rng = random.Random(seed)
+    kinds, weights = zip(*MIX.items())
+    objkts = []     # [id, artist]
+    stock = []      # [objkt id, artist, editions not on sale]
+    swaps = []      # [id, market, artist, editions left]
+    n = 0
+
+    def event(kind, **fields):
+        fields["kind"] = kind
+        fields["id"] = n
+        return fields
+
+    while n < events:
+        kind = rng.choices(kinds, weights)[0]
+        if kind == "swap" and not stock or kind == "curate" and not objkts:
+            kind = "mint"
+        if kind in ("collect", "cancel_swap") and not swaps:
+            kind = "swap" if stock else "mint"
+        if kind == "mint":
+            artist = rng.randrange(artists)
+            editions = rng.choice((1, 5, 10, 25, 50, 100))
+            objkts.append((n, artist))
+            stock.append([n, artist, editions])
+            yield event("mint", artist=artist, editions=editions, royalties=rng.choice((0, 100, 150, 250)))
+        elif kind == "swap":
+            i = _pick(rng, stock)
+            objkt, artist, held = stock[i]
+            editions = rng.randint(1, min(held, 5))
+            if held == editions:
+                del stock[i]
+            else:
+                stock[i][2] -= editions
+            market = rng.choice(markets)
+            swaps.append([n, market, artist, editions])
+            yield event("swap", market=market, artist=artist, objkt=objkt, editions=editions,
+                        price=rng.randint(1, 200) * 100000)
+            if rng.random() < burst and n + 1 < events:
+                # buyers racing on a fresh swap: more than its editions
+                swap = swaps.pop()
+                racers = editions + min(int(rng.paretovariate(1.5) * 2), RACE_LIMIT)
+                for i, buyer in enumerate(rng.sample(range(buyers), min(buyers, racers))):
+                    n += 1
+                    if n >= events:
+                        break
+                    if i < editions:
+                        yield event("collect", market=market, buyer=buyer, swap=swap[0], editions=1)
+                    else:
+                        yield event("collect", market=market, buyer=buyer, swap=swap[0], editions=1, expect="sold out")
+        elif kind == "collect":
+            i = _pick(rng, swaps)
+            swap, market, _, left = swaps[i]
+            if left == 1:
+                del swaps[i]
+            else:
+                swaps[i][3] -= 1
+            yield event("collect", market=market, buyer=rng.randrange(buyers), swap=swap, editions=1)
+        elif kind == "cancel_swap":
+            swap, market, artist, _ = swaps.pop(_pick(rng, swaps))
+            yield event("cancel_swap", market=market, artist=artist, swap=swap)
+        else:
+            objkt, _ = objkts[_pick(rng, objkts)]
+            yield event("curate", curator=rng.randrange(curators), objkt=objkt, amount=rng.randint(1, 100))
+        n += 1
+
+
+class Stats:
+    def __init__(self):
+        self.calls = Counter()
+        self.failed = Counter()
+        self.expected = Counter()
+        self.operations = Counter()
+        self.gas = Counter()
+        self.reasons = Counter()
+
+    def report(self, seconds):
+        calls = sum(self.calls.values())
+        kinds = {}
+        for kind in sorted(self.calls):
+            kinds[kind] = {
+                "calls": self.calls[kind], "failed": self.failed[kind], "expected": self.expected[kind],
+                "failure_rate": self.failed[kind] / self.calls[kind],
+                "unexpected_rate": (self.failed[kind] - self.expected[kind]) / self.calls[kind],
+                "operations": self.operations[kind], "gas": self.gas[kind],
+            }
+        failed, expected = sum(self.failed.values()), sum(self.expected.values())
+        return {
+            "calls": calls, "failed": failed, "expected": expected, "unexpected": failed - expected,
+            "seconds": seconds,
+            "calls_per_second": calls / seconds if seconds else 0.0,
+            "operations": sum(self.operations.values()),
+            "kinds": kinds,
+            "failures": [{"kind": k, "reason": r, "expected": x, "count": c}
+                         for (k, r, x), c in self.reasons.most_common()],
+        }
+
+
+class Replayer:
+    """Replays a stream on a `Deployment`; setup calls (hDAO grants, operator
+    approvals) are made on first use and are not counted."""
+
+    def __init__(self, deployment=None, artifacts=ARTIFACTS):
+        self.d = deployment or Deployment(artifacts)
+        self.market = {"v2": self.d.marketplace, "v2.1": self.d.marketplace_v2_1}
+        self.objkts = {}
+        self.swaps = {}
+        self.ready = set()
+        self.stats = Stats()
+
+    def run(self, events):
+        start = time.perf_counter()
+        for e in events:
+            self.replay(e)
+        return self.stats.report(time.perf_counter() - start)
+
+    def replay(self, e):
+        kind = e["kind"]
+        try:
+            call = getattr(self, "_" + kind)(e)
+        except KeyError:
+            # the objkt or swap this event refers to was never created
+            call = None
+        self.stats.calls[kind] += 1
+        if call is None:
+            self._failed(e, "unknown objkt or swap")
+            return
+        instance, entrypoint, parameter, sender, amount, created = call
+        try:
+            receipt = self.d.call(instance, entrypoint, parameter, sender, amount)
+        except MichelsonFailure as failure:
+            self._failed(e, str(failure.value)[:100])
+            return
+        except InterpreterError as error:
+            self._failed(e, "%s: %s" % (type(error).__name__, str(error)[:80]))
+            return
+        self.stats.operations[kind] += 1 + receipt.operations
+        self.stats.gas[kind] += receipt.gas
+        if created is not None:
+            created()
+
+    def _failed(self, e, reason):
+        # the contracts' messages differ by version: any failure of an event
+        # marked with `expect` is the expected one
+        expected = e.get("expect")
+        self.stats.failed[e["kind"]] += 1
+        if expected is not None:
+            self.stats.expected[e["kind"]] += 1
+        self.stats.reasons[(e["kind"], reason, expected)] += 1
+
+    def _setup(self, key, *calls):
+        if key not in self.ready:
+            for call in calls:
+                call()
+            self.ready.add(key)
+
+    ## Each handler returns `(instance, entrypoint, parameter, sender, amount, created)`
+
+    def _mint(self, e):
+        artist = account("artist-%d" % e["artist"])
+        objkt_id = self.d.next_objkt_id()
+
+        def created():
+            self.objkts[e["id"]] = (objkt_id, artist)
+        return (self.d.minter, "mint_OBJKT", {"address": artist, "amount": e["editions"], "metadata": b"ipfs://",
+                                              "royalties": e["royalties"]}, artist, 0, created)
+
+    def _swap(self, e):
+        objkt_id, creator = self.objkts[e["objkt"]]
+        artist = account("artist-%d" % e["artist"])
+        market = self.market[e["market"]]
+        self._setup((artist, market.address, objkt_id),
+                    lambda: self.d.add_operator(self.d.objkts, artist, market.address, objkt_id))
+        fields = {"creator": creator, "objkt_amount": e["editions"], "objkt_id": objkt_id, "royalties": 100}
+        if e["market"] == "v2.1":
+            fields.update(contract=self.d.hdao.address, token_id=0, token_per_objkt=e["price"] // 1000)
+        else:
+            fields["xtz_per_objkt"] = e["price"]
+        swap_id = storage_field(market, "counter")
+
+        def created():
+            self.swaps[e["id"]] = (swap_id, artist, e["price"] if e["market"] == "v2" else 0)
+        return market, "swap", fields, artist, 0, created
+
+    def _collect(self, e):
+        swap_id, _, price = self.swaps[e["swap"]]
+        buyer = account("buyer-%d" % e["buyer"])
+        market = self.market[e["market"]]
+        if e["market"] == "v2.1":
+            self._setup((buyer, "hDAO"), lambda: self.d.give_hdao(buyer, 10 ** 9),
+                        lambda: self.d.add_operator(self.d.hdao, buyer, market.address, 0))
+        parameter = param(market, "collect", {"objkt_amount": e["editions"], "swap_id": swap_id}, "swap_id")
+        return market, "collect", parameter, buyer, price * e["editions"], None
+
+    def _cancel_swap(self, e):
+        swap_id, artist, _ = self.swaps[e["swap"]]
+        market = self.market[e["market"]]
+        parameter = param(market, "cancel_swap", {"swap_id": swap_id}, "swap_id")
+        return market, "cancel_swap", parameter, artist, 0, None
+
+    def _curate(self, e):
+        objkt_id, _ = self.objkts[e["objkt"]]
+        curator = account("curator-%d" % e["curator"])
+        self._setup((curator, "hDAO"), lambda: self.d.give_hdao(curator, 10 ** 9))
+        return self.d.minter, "curate", {"hDAO_amount": e["amount"], "objkt_id": objkt_id}, curator, 0, None
+
+
+def format_report(report):
+    lines = ["%d calls in %.2f s (%.0f calls/s), %d operations, %d failed: %d expected (buyers racing on swaps"
+             " already sold out), %d unexpected"
+             % (report["calls"], report["seconds"], report["calls_per_second"], report["operations"], report["failed"],
+                report["expected"], report["unexpected"]),
+             "%-12s %8s %8s %8s %7s %10s %12s" % ("", "calls", "failed", "expected", "rate", "ops", "gas")]
+    for kind, k in report["kinds"].items():
+        lines.append("%-12s %8d %8d %8d %6.1f%% %10d %12d" % (kind, k["calls"], k["failed"], k["expected"],
+                                                               100 * k["failure_rate"], k["operations"], k["gas"]))
+    for f in report["failures"][:10]:
+        lines.append("  %6d  %-12s %-10s %s" % (f["count"], f["kind"], f["expected"] or "unexpected", f["reason"]))
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m objkt_tools.loadsim")
+    parser.add_argument("--events", type=int, default=10000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--burst", type=float, default=0.2, help="share of swaps followed by a buyer race")
+    parser.add_argument("--artifacts", default=str(ARTIFACTS))
+    parser.add_argument("--save", help="write the stream as JSON lines instead of replaying it")
+    parser.add_argument("--replay", help="replay a saved stream")
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    args = parser.parse_args(argv)
+
+    if args.replay:
+        with open(args.replay) as f:
+            events = [json.loads(line) for line in f if line.strip()]
+    else:
+        events = traffic(args.events, args.seed, burst=args.burst)
+    if args.save:
+        with open(args.save, "w") as f:
+            for e in events:
+                f.write(json.dumps(e, separators=(",", ":")) + "\n")
+        return 0
+    report = Replayer(artifacts=args.artifacts).run(events)
+    print(json.dumps(report, indent=1) if args.json else format_report(report))
+    return 1 if report["unexpected"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
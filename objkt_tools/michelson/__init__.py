@@ -0,0 +1,14 @@
+from .parser import (
+    Int, String, Bytes, Prim, Seq, Script, ParseError,
+    tokenize, parse, iter_sections, parse_script, parse_file, entrypoints, bench,
+)
+from .values import (
+    InterpreterError, Mutez, Address, Unit, Some, Left, Right, Contract, Transfer,
+    Lambda, BigMap, BigMapStore, compare, decode, encode, from_fields, to_fields,
+)
+from .pack import pack, script_expr_hash
+from .interpreter import (
+    MichelsonFailure, GasExhausted, Context, Result, Instance,
+    compile_code, run, entrypoint_wrapper,
+)
+from .chain import Chain, Receipt, account, originated
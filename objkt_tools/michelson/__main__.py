@@ -0,0 +1,9 @@
+import sys
+from pathlib import Path
+
+from .parser import bench
+
+results = bench(sys.argv[1:] or None)
+for path, seconds in results.items():
+    print("%-40s %8.2f ms" % (Path(path).name, seconds * 1000))
+print("%-40s %8.2f ms" % ("total", sum(results.values()) * 1000))
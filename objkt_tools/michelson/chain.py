@@ -0,0 +1,120 @@
+## A minimal local chain
+##
+## Holds several `Instance`s sharing one `BigMapStore` and applies the
+## operations they emit, depth-first as the protocol does, so that a call
+## to a marketplace also runs the FA2 transfers it triggers. A failure
+## anywhere in the chain of calls rolls every contract back.
+import hashlib
+
+from .interpreter import Instance
+from .pack import b58encode_check, TZ1, KT1
+from .parser import entrypoints
+from .values import Address, Mutez, BigMapStore, InterpreterError
+
+
+def account(seed):
+    """A deterministic, valid tz1 address for test accounts."""
+    return Address(b58encode_check(hashlib.blake2b(str(seed).encode(), digest_size=20).digest(), TZ1))
+
+
+def originated(seed):
+    """A deterministic, valid KT1 address."""
+    return Address(b58encode_check(hashlib.blake2b(("KT1/%s" % seed).encode(), digest_size=20).digest(), KT1))
+
+
+class Receipt:
+    """Results of one operation group: `calls` is a list of `(address, entrypoint, Result)`."""
+
+    __slots__ = ("calls", "transfers")
+
+    def __init__(self):
+        self.calls = []
+        self.transfers = 0
+
+    @property
+    def gas(self):
+        return sum(result.gas for _, _, result in self.calls)
+
+    @property
+    def operations(self):
+        # internal operations, the external call excluded
+        return len(self.calls) - 1 + self.transfers
+
+    @property
+    def big_map_diff(self):
+        return [d for _, _, result in self.calls for d in result.big_map_diff]
+
+    def __repr__(self):
+        return "Receipt(calls=%d, operations=%d, gas=%d)" % (len(self.calls), self.operations, self.gas)
+
+
+class Chain:
+    def __init__(self, now=0):
+        self.store = BigMapStore()
+        self.contracts = {}
+        self.entrypoints = {}
+        self.balances = {}
+        self.now = now
+
+    def originate(self, script, storage, address=None, balance=0):
+        address = Address(address) if address is not None else originated(len(self.contracts))
+        self.contracts[address] = Instance(script, storage, address=address, balance=balance,
+                                           store=self.store, now=self.now, contracts=self.has_entrypoint,
+                                           views=self.run_view)
+        self.entrypoints[address] = frozenset(entrypoints(script.parameter)) | {"default"}
+        return self.contracts[address]
+
+    def has_entrypoint(self, address, entrypoint):
+        if address in self.entrypoints:
+            return entrypoint in self.entrypoints[address]
+        return address.startswith("tz") and entrypoint == "default"
+
+    def run_view(self, address, name, argument, ctx):
+        """Run a view for `VIEW` in `ctx`, charging its gas to the caller."""
+        instance = self.contracts.get(address)
+        if instance is None:
+            return None
+        found = instance.view(name, argument, ctx.self_address, ctx.source, self.now)
+        if found is None:
+            return None
+        result, gas = found
+        ctx.gas += gas
+        return result
+
+    def call(self, destination, entrypoint, parameter, sender, amount=0):
+        """Apply an external call and the operations it emits; return a `Receipt`."""
+        saved = {address: (c.storage, c.balance) for address, c in self.contracts.items()}
+        balances = dict(self.balances)
+        receipt = Receipt()
+        self.store.begin()
+        try:
+            self._apply(Address(destination), entrypoint, parameter, Address(sender), Address(sender), Mutez(amount), receipt, False)
+        except Exception:
+            self.store.rollback()
+            for address, (storage, balance) in saved.items():
+                self.contracts[address].storage = storage
+                self.contracts[address].balance = balance
+            self.balances = balances
+            raise
+        self.store.end()
+        return receipt
+
+    def _apply(self, destination, entrypoint, parameter, sender, source, amount, receipt, typed):
+        instance = self.contracts.get(destination)
+        if instance is None:
+            self.balances[destination] = self.balances.get(destination, 0) + amount
+            receipt.transfers += 1
+            return
+        result = instance.call(entrypoint, parameter, sender, amount, source=source, now=self.now, typed=typed)
+        receipt.calls.append((destination, entrypoint, result))
+        for op in result.operations:
+            # tez leave the contract when the operation is applied, not when
+            # TRANSFER_TOKENS runs
+            if op.amount > instance.balance:
+                raise InterpreterError("balance of %s too low to transfer %d mutez" % (destination, op.amount))
+            instance.balance = Mutez(instance.balance - op.amount)
+            target = op.destination
+            self._apply(target.address, target.entrypoint, op.parameter, destination, source, op.amount, receipt, True)
+
+    def __getitem__(self, address):
+        return self.contracts[address]
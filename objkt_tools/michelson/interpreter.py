@@ -0,0 +1,794 @@
+## Local Michelson interpreter
+##
+## Executes the compiled contracts of `michelson/` without a node: given a
+## parameter and a storage it returns the new storage, the emitted
+## operations, the big_map diff and a gas estimate.
+##
+##     swap = Instance(parse_file("michelson/objkt_swap_v2.tz"), storage)
+##     result = swap.call("collect", "500001", sender=buyer, amount=Mutez(1000000))
+##
+## The code is compiled once into nested tuples of `(handler, operand, cost)`
+## so that repeated calls do not walk the AST again. Only the instruction
+## subset used by the hic et nunc contracts and their usual neighbours is
+## supported; anything else raises `InterpreterError` at compile time.
+##
+## Gas is an estimate: every instruction has a flat cost taken from `GAS`,
+## big_map accesses add `BIG_MAP_ACCESS_GAS` and every call pays
+## `SCRIPT_BYTE_GAS` per byte of the script to load it, which is what lazy
+## entry points save. It is meant to compare entry points and versions
+## with each other, not to predict the exact protocol consumption.
+import hashlib
+
+from .parser import Int, Prim, Seq
+from .values import (
+    InterpreterError, Mutez, Address, Unit, Some, Left, Right, Contract, Transfer,
+    Lambda, BigMap, BigMapStore, compare, sort_key, decode, encode, from_fields,
+)
+from .pack import pack, script_size
+
+DEFAULT_GAS = 10
+BIG_MAP_ACCESS_GAS = 100
+SCRIPT_BYTE_GAS = 1
+
+GAS = {
+    "COMPARE": 35, "ADD": 35, "SUB": 35, "MUL": 50, "EDIV": 80, "PACK": 100,
+    "CONTRACT": 100, "TRANSFER_TOKENS": 60, "GET": 50, "UPDATE": 60, "MEM": 50,
+    "CONCAT": 30, "BLAKE2B": 400, "SHA256": 400, "SHA512": 500, "EXEC": 20,
+    "VIEW": 100,
+}
+
+
+class MichelsonFailure(Exception):
+    """`FAILWITH` was reached; `value` is the failing value."""
+
+    def __init__(self, value):
+        Exception.__init__(self, value)
+        self.value = value
+
+
+class GasExhausted(InterpreterError):
+    pass
+
+
+class Context:
+    def __init__(self, amount=0, balance=0, sender=None, source=None, self_address=None,
+                 now=0, level=0, chain_id="NetXdQprcVkpaWU", store=None, contracts=None,
+                 views=None, gas_limit=None):
+        self.amount = Mutez(amount)
+        self.balance = Mutez(balance)
+        self.sender = Address(sender) if sender is not None else None
+        self.source = Address(source) if source is not None else self.sender
+        self.self_address = Address(self_address) if self_address is not None else None
+        self.now = now
+        self.level = level
+        self.chain_id = chain_id
+        self.store = store if store is not None else BigMapStore()
+        # `contracts(address, entrypoint)` tells whether `CONTRACT` succeeds;
+        # by default every address is assumed to have the entry point.
+        self.contracts = contracts
+        # `views(address, name, argument, ctx)` runs an on-chain view for
+        # `VIEW` and returns its result, or `None` when there is no such view
+        self.views = views
+        self.gas_limit = gas_limit
+        self.gas = 0
+
+
+## ## Instructions
+##
+## Each handler takes `(stack, operand, ctx)`; the top of the stack is the
+## end of the Python list.
+
+def _execute(code, stack, ctx):
+    for handler, operand, cost in code:
+        ctx.gas += cost
+        handler(stack, operand, ctx)
+    if ctx.gas_limit is not None and ctx.gas > ctx.gas_limit:
+        raise GasExhausted("gas limit %d exceeded" % ctx.gas_limit)
+
+
+def _drop(stack, n, ctx):
+    if n:
+        del stack[-n:]
+
+
+def _dup(stack, n, ctx):
+    stack.append(stack[-n])
+
+
+def _swap(stack, _, ctx):
+    stack[-1], stack[-2] = stack[-2], stack[-1]
+
+
+def _dig(stack, n, ctx):
+    if n:
+        stack.append(stack.pop(-1 - n))
+
+
+def _dug(stack, n, ctx):
+    if n:
+        value = stack.pop()
+        stack.insert(len(stack) - n, value)
+
+
+def _push(stack, value, ctx):
+    stack.append(value)
+
+
+def _some(stack, _, ctx):
+    stack[-1] = Some(stack[-1])
+
+
+def _nil(stack, _, ctx):
+    stack.append([])
+
+
+def _empty_map(stack, _, ctx):
+    stack.append({})
+
+
+def _empty_set(stack, _, ctx):
+    stack.append(frozenset())
+
+
+def _empty_big_map(stack, types, ctx):
+    stack.append(BigMap(ctx.store, None, None, types[0], types[1]))
+
+
+def _cons(stack, _, ctx):
+    x = stack.pop()
+    stack[-1] = [x] + stack[-1]
+
+
+def _pair_n(stack, n, ctx):
+    items = stack[-n:]
+    del stack[-n:]
+    # items[-1] is the top of the stack, i.e. the first component
+    result = items[0]
+    for item in items[1:]:
+        result = (item, result)
+    stack.append(result)
+
+
+def _unpair_n(stack, n, ctx):
+    value = stack.pop()
+    items = []
+    for _ in range(n - 1):
+        items.append(value[0])
+        value = value[1]
+    items.append(value)
+    stack.extend(reversed(items))
+
+
+def _car(stack, _, ctx):
+    stack[-1] = stack[-1][0]
+
+
+def _cdr(stack, _, ctx):
+    stack[-1] = stack[-1][1]
+
+
+def _get_n(stack, n, ctx):
+    value = stack[-1]
+    while n > 1:
+        value = value[1]
+        n -= 2
+    stack[-1] = value[0] if n == 1 else value
+
+
+def _update_comb(value, new, n):
+    if n == 0:
+        return new
+    if n == 1:
+        return (new, value[1])
+    return (value[0], _update_comb(value[1], new, n - 2))
+
+
+def _update_n(stack, n, ctx):
+    new = stack.pop()
+    stack[-1] = _update_comb(stack[-1], new, n)
+
+
+def _get(stack, _, ctx):
+    key = stack.pop()
+    collection = stack[-1]
+    if type(collection) is BigMap:
+        ctx.gas += BIG_MAP_ACCESS_GAS
+    value = collection.get(key)
+    stack[-1] = None if value is None else Some(value)
+
+
+def _mem(stack, _, ctx):
+    key = stack.pop()
+    collection = stack[-1]
+    if type(collection) is BigMap:
+        ctx.gas += BIG_MAP_ACCESS_GAS
+    stack[-1] = key in collection
+
+
+def _update(stack, _, ctx):
+    key = stack.pop()
+    value = stack.pop()
+    collection = stack[-1]
+    t = type(collection)
+    if t is BigMap:
+        ctx.gas += BIG_MAP_ACCESS_GAS
+        stack[-1] = collection.update(key, None if value is None else value.value)
+    elif t is dict:
+        collection = dict(collection)
+        if value is None:
+            collection.pop(key, None)
+        else:
+            collection[key] = value.value
+        stack[-1] = collection
+    else:
+        stack[-1] = collection | {key} if value else collection - {key}
+
+
+def _if(stack, branches, ctx):
+    _execute(branches[0] if stack.pop() else branches[1], stack, ctx)
+
+
+def _if_none(stack, branches, ctx):
+    value = stack.pop()
+    if value is None:
+        _execute(branches[0], stack, ctx)
+    else:
+        stack.append(value.value)
+        _execute(branches[1], stack, ctx)
+
+
+def _if_left(stack, branches, ctx):
+    value = stack.pop()
+    stack.append(value.value)
+    _execute(branches[0] if type(value) is Left else branches[1], stack, ctx)
+
+
+def _if_cons(stack, branches, ctx):
+    value = stack.pop()
+    if value:
+        stack.append(value[1:])
+        stack.append(value[0])
+        _execute(branches[0], stack, ctx)
+    else:
+        _execute(branches[1], stack, ctx)
+
+
+def _left(stack, _, ctx):
+    stack[-1] = Left(stack[-1])
+
+
+def _right(stack, _, ctx):
+    stack[-1] = Right(stack[-1])
+
+
+def _items(collection):
+    t = type(collection)
+    if t is dict or t is BigMap:
+        return sorted(collection.items(), key=lambda kv: sort_key(kv[0]))
+    if t is frozenset:
+        return sorted(collection, key=sort_key)
+    return collection
+
+
+def _iter(stack, body, ctx):
+    for item in _items(stack.pop()):
+        stack.append(item)
+        _execute(body, stack, ctx)
+
+
+def _map(stack, body, ctx):
+    collection = stack.pop()
+    if type(collection) is dict:
+        result = {}
+        for key, value in _items(collection):
+            stack.append((key, value))
+            _execute(body, stack, ctx)
+            result[key] = stack.pop()
+    else:
+        result = []
+        for item in collection:
+            stack.append(item)
+            _execute(body, stack, ctx)
+            result.append(stack.pop())
+    stack.append(result)
+
+
+def _loop(stack, body, ctx):
+    while stack.pop():
+        _execute(body, stack, ctx)
+
+
+def _loop_left(stack, body, ctx):
+    while True:
+        value = stack.pop()
+        stack.append(value.value)
+        if type(value) is not Left:
+            return
+        _execute(body, stack, ctx)
+
+
+def _dip(stack, operand, ctx):
+    n, body = operand
+    # `DIP 0` runs the body on the whole stack (`stack[-0:]` would be all of it)
+    split = len(stack) - n
+    saved = stack[split:]
+    del stack[split:]
+    _execute(body, stack, ctx)
+    stack.extend(saved)
+
+
+def _lambda(stack, code, ctx):
+    stack.append(Lambda(code))
+
+
+def _exec(stack, _, ctx):
+    argument = stack.pop()
+    function = stack.pop()
+    if function.compiled is None:
+        function.compiled = compile_code(function.code)
+    inner = [argument]
+    _execute(function.compiled, inner, ctx)
+    stack.append(inner[-1])
+
+
+def _failwith(stack, _, ctx):
+    raise MichelsonFailure(stack[-1])
+
+
+def _nop(stack, _, ctx):
+    pass
+
+
+def _compare(stack, _, ctx):
+    a = stack.pop()
+    stack[-1] = compare(a, stack[-1])
+
+
+def _compare_op(test):
+    def handler(stack, _, ctx):
+        stack[-1] = test(stack[-1])
+    return handler
+
+
+def _add(stack, _, ctx):
+    a = stack.pop()
+    b = stack[-1]
+    stack[-1] = Mutez(a + b) if type(a) is Mutez or type(b) is Mutez else a + b
+
+
+def _sub(stack, _, ctx):
+    a = stack.pop()
+    b = stack[-1]
+    if type(a) is Mutez:
+        if a < b:
+            raise InterpreterError("mutez subtraction underflow")
+        stack[-1] = Mutez(a - b)
+    else:
+        stack[-1] = a - b
+
+
+def _mul(stack, _, ctx):
+    a = stack.pop()
+    b = stack[-1]
+    stack[-1] = Mutez(a * b) if type(a) is Mutez or type(b) is Mutez else a * b
+
+
+def _ediv(stack, _, ctx):
+    a = stack.pop()
+    b = stack[-1]
+    if b == 0:
+        stack[-1] = None
+        return
+    # Euclidean division: the remainder is never negative
+    q, r = divmod(a, b)
+    if r < 0:
+        q, r = q + 1, r - b
+    if type(a) is Mutez:
+        stack[-1] = Some((int(q), Mutez(r)) if type(b) is Mutez else (Mutez(q), Mutez(r)))
+    else:
+        stack[-1] = Some((q, r))
+
+
+def _abs(stack, _, ctx):
+    stack[-1] = abs(stack[-1])
+
+
+def _isnat(stack, _, ctx):
+    stack[-1] = Some(stack[-1]) if stack[-1] >= 0 else None
+
+
+def _int(stack, _, ctx):
+    stack[-1] = int(stack[-1])
+
+
+def _neg(stack, _, ctx):
+    stack[-1] = -stack[-1]
+
+
+def _not(stack, _, ctx):
+    value = stack[-1]
+    stack[-1] = (not value) if type(value) is bool else ~value
+
+
+def _binary(op):
+    def handler(stack, _, ctx):
+        a = stack.pop()
+        stack[-1] = op(a, stack[-1])
+    return handler
+
+
+def _size(stack, _, ctx):
+    stack[-1] = len(stack[-1])
+
+
+def _concat(stack, _, ctx):
+    a = stack.pop()
+    if type(a) is list:
+        stack.append(b"".join(a) if a and type(a[0]) is bytes else "".join(a))
+    else:
+        stack[-1] = a + stack[-1]
+
+
+def _slice(stack, _, ctx):
+    offset = stack.pop()
+    length = stack.pop()
+    s = stack[-1]
+    stack[-1] = Some(s[offset:offset + length]) if offset + length <= len(s) else None
+
+
+def _env(attribute):
+    def handler(stack, _, ctx):
+        stack.append(getattr(ctx, attribute))
+    return handler
+
+
+def _self(stack, entrypoint, ctx):
+    stack.append(Contract(ctx.self_address, entrypoint))
+
+
+def _address(stack, _, ctx):
+    stack[-1] = stack[-1].address
+
+
+def _contract(stack, entrypoint, ctx):
+    address, _, suffix = str(stack[-1]).partition("%")
+    entrypoint = suffix or entrypoint
+    if ctx.contracts is not None and not ctx.contracts(address, entrypoint):
+        stack[-1] = None
+    else:
+        stack[-1] = Some(Contract(address, entrypoint))
+
+
+def _implicit_account(stack, _, ctx):
+    stack[-1] = Contract(stack[-1])
+
+
+def _transfer_tokens(stack, _, ctx):
+    parameter = stack.pop()
+    amount = stack.pop()
+    destination = stack[-1]
+    # the balance only changes when the operation is applied (see `Chain`)
+    stack[-1] = Transfer(parameter, amount, destination)
+
+
+def _view(stack, name, ctx):
+    argument = stack.pop()
+    address = str(stack[-1]).partition("%")[0]
+    result = ctx.views(address, name, argument, ctx) if ctx.views is not None else None
+    stack[-1] = None if result is None else Some(result)
+
+
+def _pack(stack, _, ctx):
+    stack[-1] = pack(stack[-1])
+
+
+def _hash(function):
+    def handler(stack, _, ctx):
+        stack[-1] = function(stack[-1])
+    return handler
+
+
+## ## Compilation
+
+def _plain(handler):
+    return lambda args, annots: (handler, None)
+
+
+def _count(handler, default=1):
+    return lambda args, annots: (handler, args[0].value if args else default)
+
+
+def _branches(handler):
+    return lambda args, annots: (handler, (compile_code(args[0]), compile_code(args[1])))
+
+
+def _body(handler):
+    return lambda args, annots: (handler, compile_code(args[0]))
+
+
+def _compile_pair(args, annots):
+    return (_pair_n, args[0].value if args else 2)
+
+
+def _compile_unpair(args, annots):
+    return (_unpair_n, args[0].value if args else 2)
+
+
+def _compile_get(args, annots):
+    return (_get_n, args[0].value) if args else (_get, None)
+
+
+def _compile_update(args, annots):
+    return (_update_n, args[0].value) if args else (_update, None)
+
+
+def _compile_push(args, annots):
+    return (_push, decode(args[0], args[1], _ConstantStore()))
+
+
+def _compile_dip(args, annots):
+    if len(args) == 2:
+        return (_dip, (args[0].value, compile_code(args[1])))
+    return (_dip, (1, compile_code(args[0])))
+
+
+def _compile_entrypoint(handler):
+    def compile_(args, annots):
+        entrypoint = "default"
+        for a in annots:
+            if a.startswith("%"):
+                entrypoint = a[1:]
+        return (handler, entrypoint)
+    return compile_
+
+
+class _ConstantStore(BigMapStore):
+    # `PUSH` cannot build big maps
+    def alloc(self, *args, **kwargs):
+        raise InterpreterError("big_map literals are not allowed in PUSH")
+
+
+_COMPILERS = {
+    "DROP": _count(_drop),
+    "DUP": _count(_dup),
+    "SWAP": _plain(_swap),
+    "DIG": _count(_dig),
+    "DUG": _count(_dug),
+    "PUSH": _compile_push,
+    "SOME": _plain(_some),
+    "NONE": lambda args, annots: (_push, None),
+    "UNIT": lambda args, annots: (_push, Unit),
+    "NIL": _plain(_nil),
+    "EMPTY_MAP": _plain(_empty_map),
+    "EMPTY_SET": _plain(_empty_set),
+    "EMPTY_BIG_MAP": lambda args, annots: (_empty_big_map, (args[0], args[1])),
+    "CONS": _plain(_cons),
+    "PAIR": _compile_pair,
+    "UNPAIR": _compile_unpair,
+    "CAR": _plain(_car),
+    "CDR": _plain(_cdr),
+    "GET": _compile_get,
+    "UPDATE": _compile_update,
+    "MEM": _plain(_mem),
+    "IF": _branches(_if),
+    "IF_NONE": _branches(_if_none),
+    "IF_SOME": lambda args, annots: (_if_none, (compile_code(args[1]), compile_code(args[0]))),
+    "IF_LEFT": _branches(_if_left),
+    "IF_CONS": _branches(_if_cons),
+    "LEFT": _plain(_left),
+    "RIGHT": _plain(_right),
+    "ITER": _body(_iter),
+    "MAP": _body(_map),
+    "LOOP": _body(_loop),
+    "LOOP_LEFT": _body(_loop_left),
+    "DIP": _compile_dip,
+    "LAMBDA": lambda args, annots: (_lambda, args[2]),
+    "EXEC": _plain(_exec),
+    "FAILWITH": _plain(_failwith),
+    "CAST": _plain(_nop),
+    "RENAME": _plain(_nop),
+    "COMPARE": _plain(_compare),
+    "EQ": _plain(_compare_op(lambda c: c == 0)),
+    "NEQ": _plain(_compare_op(lambda c: c != 0)),
+    "LT": _plain(_compare_op(lambda c: c < 0)),
+    "GT": _plain(_compare_op(lambda c: c > 0)),
+    "LE": _plain(_compare_op(lambda c: c <= 0)),
+    "GE": _plain(_compare_op(lambda c: c >= 0)),
+    "ADD": _plain(_add),
+    "SUB": _plain(_sub),
+    "MUL": _plain(_mul),
+    "EDIV": _plain(_ediv),
+    "ABS": _plain(_abs),
+    "ISNAT": _plain(_isnat),
+    "INT": _plain(_int),
+    "NEG": _plain(_neg),
+    "NOT": _plain(_not),
+    "AND": _plain(_binary(lambda a, b: a and b if type(a) is bool else a & b)),
+    "OR": _plain(_binary(lambda a, b: a or b if type(a) is bool else a | b)),
+    "XOR": _plain(_binary(lambda a, b: a != b if type(a) is bool else a ^ b)),
+    "LSL": _plain(_binary(lambda a, b: a << b)),
+    "LSR": _plain(_binary(lambda a, b: a >> b)),
+    "SIZE": _plain(_size),
+    "CONCAT": _plain(_concat),
+    "SLICE": _plain(_slice),
+    "AMOUNT": _plain(_env("amount")),
+    "BALANCE": _plain(_env("balance")),
+    "SENDER": _plain(_env("sender")),
+    "SOURCE": _plain(_env("source")),
+    "SELF_ADDRESS": _plain(_env("self_address")),
+    "NOW": _plain(_env("now")),
+    "LEVEL": _plain(_env("level")),
+    "CHAIN_ID": _plain(_env("chain_id")),
+    "SELF": _compile_entrypoint(_self),
+    "ADDRESS": _plain(_address),
+    "CONTRACT": _compile_entrypoint(_contract),
+    "IMPLICIT_ACCOUNT": _plain(_implicit_account),
+    "TRANSFER_TOKENS": _plain(_transfer_tokens),
+    "VIEW": lambda args, annots: (_view, args[0].value),
+    "PACK": _plain(_pack),
+    "BLAKE2B": _plain(_hash(lambda b: hashlib.blake2b(b, digest_size=32).digest())),
+    "SHA256": _plain(_hash(lambda b: hashlib.sha256(b).digest())),
+    "SHA512": _plain(_hash(lambda b: hashlib.sha512(b).digest())),
+}
+
+
+def compile_code(code):
+    """Compile an instruction or a sequence into `(handler, operand, cost)` tuples."""
+    if type(code) is not Seq:
+        code = Seq((code,))
+    compiled = []
+    for instr in code:
+        if type(instr) is Seq:
+            compiled.extend(compile_code(instr))
+            continue
+        compiler = _COMPILERS.get(instr.name)
+        if compiler is None:
+            raise InterpreterError("unsupported instruction %s" % instr.name)
+        handler, operand = compiler(instr.args, instr.annots)
+        compiled.append((handler, operand, GAS.get(instr.name, DEFAULT_GAS)))
+    return tuple(compiled)
+
+
+## ## Running contracts
+
+class Result:
+    __slots__ = ("storage", "operations", "gas", "big_map_diff")
+
+    def __init__(self, storage, operations, gas, big_map_diff):
+        self.storage = storage
+        self.operations = operations
+        self.gas = gas
+        self.big_map_diff = big_map_diff
+
+    def __repr__(self):
+        return "Result(operations=%d, gas=%d, big_map_diff=%d)" % (len(self.operations), self.gas, len(self.big_map_diff))
+
+
+def _big_maps(value, found):
+    t = type(value)
+    if t is BigMap:
+        found.append(value)
+    elif t is tuple:
+        _big_maps(value[0], found)
+        _big_maps(value[1], found)
+    elif t in (Some, Left, Right):
+        _big_maps(value.value, found)
+    elif t is list:
+        for v in value:
+            _big_maps(v, found)
+    elif t is dict:
+        for v in value.values():
+            _big_maps(v, found)
+    return found
+
+
+def entrypoint_wrapper(parameter_type, name):
+    """Return `(type, wrap)` to build the full parameter of entry point `name`."""
+    path = []
+
+    def find(node):
+        if type(node) is not Prim:
+            return None
+        if node.annot("%") == name:
+            return node
+        if node.name == "or":
+            for side, arg in ((Left, node.args[0]), (Right, node.args[1])):
+                path.append(side)
+                found = find(arg)
+                if found is not None:
+                    return found
+                path.pop()
+        return None
+
+    ty = find(parameter_type) if name is not None else None
+    if ty is None:
+        # without a `%default` annotation, `default` is the whole parameter
+        if name in (None, "default"):
+            return parameter_type, lambda value: value
+        raise InterpreterError("unknown entry point %s" % name)
+    sides = list(reversed(path))
+
+    def wrap(value):
+        for side in sides:
+            value = side(value)
+        return value
+    return ty, wrap
+
+
+def _value(ty, data, store):
+    # Micheline source or nodes are decoded, Python data is built by field name
+    if type(data) is str or isinstance(data, (Int, Prim, Seq)):
+        return decode(ty, data, store)
+    if isinstance(data, (dict, list, tuple)):
+        return from_fields(ty, data, store)
+    return data
+
+
+def run(code, parameter_type, parameter, storage, ctx, entrypoint=None, typed=False):
+    """Run compiled `code` on `(parameter, storage)`.
+
+    The parameter is Micheline data, Python data for `from_fields` or, with
+    `typed`, an interpreter value.
+    """
+    ty, wrap = entrypoint_wrapper(parameter_type, entrypoint)
+    if not typed:
+        parameter = _value(ty, parameter, ctx.store)
+    stack = [(wrap(parameter), storage)]
+    _execute(code, stack, ctx)
+    operations, storage = stack[-1]
+    diff = []
+    for big_map in _big_maps(storage, []):
+        diff.extend(ctx.store.commit(big_map))
+    return Result(storage, operations, ctx.gas, diff)
+
+
+class Instance:
+    """A deployed contract: script, storage, balance and big_map store.
+
+    `call` runs an entry point and, when it succeeds, keeps the new storage
+    and balance (the amount received; tez sent by the emitted operations
+    are debited by `Chain` when it applies them); a `MichelsonFailure`
+    leaves the instance untouched. `view` runs one of its on-chain views.
+    """
+
+    def __init__(self, script, storage, address="KT1Hkg5qeNhfwpKW4fXvq7HGZB9z2EnmCCA9",
+                 balance=0, store=None, now=0, contracts=None, views=None):
+        self.script = script
+        self.code = compile_code(script.code)
+        # view sections are `view "name" argument_type result_type code`
+        self.views = {view.args[0].value: compile_code(view.args[3]) for view in script.views}
+        self.view_runner = views
+        self.load_gas = SCRIPT_BYTE_GAS * script_size(script)
+        self.store = store if store is not None else BigMapStore()
+        self.address = Address(address)
+        self.balance = Mutez(balance)
+        self.now = now
+        self.contracts = contracts
+        self.storage = _value(script.storage, storage, self.store)
+
+    def call(self, entrypoint, parameter, sender, amount=0, source=None, now=None, gas_limit=None, typed=False):
+        ctx = Context(amount=amount, balance=self.balance + amount, sender=sender, source=source,
+                      self_address=self.address, now=self.now if now is None else now,
+                      store=self.store, contracts=self.contracts, views=self.view_runner, gas_limit=gas_limit)
+        ctx.gas = self.load_gas
+        result = run(self.code, self.script.parameter, parameter, self.storage, ctx, entrypoint, typed)
+        self.storage = result.storage
+        self.balance = ctx.balance
+        return result
+
+    def view(self, name, argument, sender, source=None, now=None, gas_limit=None):
+        """Run the view `name` on a typed `argument`; return `(result, gas)`,
+        or `None` when the contract has no such view. Views cannot change the
+        storage; the argument type is not checked."""
+        code = self.views.get(name)
+        if code is None:
+            return None
+        ctx = Context(balance=self.balance, sender=sender, source=source, self_address=self.address,
+                      now=self.now if now is None else now, store=self.store, contracts=self.contracts,
+                      views=self.view_runner, gas_limit=gas_limit)
+        stack = [(argument, self.storage)]
+        _execute(code, stack, ctx)
+        return stack[-1], ctx.gas
+
+    def storage_micheline(self):
+        return encode(self.storage)
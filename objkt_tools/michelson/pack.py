@@ -0,0 +1,212 @@
+## `PACK` and big_map key hashing
+##
+## Binary Micheline serialization of interpreter values, byte-for-byte with
+## the `PACK` instruction (`0x05` followed by the binary Micheline
+## expression), plus the base58check helpers needed to encode addresses and
+## the `expr...` script-expression hashes under which the RPC exposes
+## big_map entries.
+import hashlib
+import struct
+
+from .parser import Int, String, Bytes, Prim, Seq
+from .values import InterpreterError, Address, Mutez, Unit, Some, Left, Right, Contract, BigMap, sort_key
+
+_ALPHABET = "123456789ABCDEFGHJKLMNPQRSTUVWXYZabcdefghijkmnopqrstuvwxyz"
+_INDEX = {c: i for i, c in enumerate(_ALPHABET)}
+
+## Base58check prefixes
+TZ1 = b"\x06\xa1\x9f"
+TZ2 = b"\x06\xa1\xa1"
+TZ3 = b"\x06\xa1\xa4"
+KT1 = b"\x02\x5a\x79"
+EXPR = b"\x0d\x2c\x40\x1b"
+
+_IMPLICIT = {"tz1": (0, TZ1), "tz2": (1, TZ2), "tz3": (2, TZ3)}
+_IMPLICIT_TAGS = {tag: (name, prefix) for name, (tag, prefix) in _IMPLICIT.items()}
+
+## Micheline primitive codes of the data constructors
+_PRIMS = {"Elt": 4, "False": 3, "Left": 5, "None": 6, "Pair": 7, "Right": 8, "Some": 9, "True": 10, "Unit": 11}
+
+
+def _checksum(payload):
+    return hashlib.sha256(hashlib.sha256(payload).digest()).digest()[:4]
+
+
+def b58decode_check(s, prefix):
+    n = 0
+    for c in s:
+        n = n * 58 + _INDEX[c]
+    raw = n.to_bytes((n.bit_length() + 7) // 8, "big")
+    raw = b"\x00" * (len(s) - len(s.lstrip("1"))) + raw
+    payload, checksum = raw[:-4], raw[-4:]
+    if _checksum(payload) != checksum or not payload.startswith(prefix):
+        raise InterpreterError("invalid base58check string %r" % s)
+    return payload[len(prefix):]
+
+
+## Encoding works on ten digits at a time: one big-int division by 58**10,
+## then small-int divisions by 58**2 looked up in a table of digit pairs,
+## which halves the cost of hashing keys in bulk.
+_PAIRS = [a + b for a in _ALPHABET for b in _ALPHABET]
+_CHUNK = 58 ** 10
+
+
+def b58encode_check(data, prefix):
+    payload = prefix + data
+    raw = payload + _checksum(payload)
+    n = int.from_bytes(raw, "big")
+    out = []
+    while n:
+        n, r = divmod(n, _CHUNK)
+        r, a = divmod(r, 3364)
+        r, b = divmod(r, 3364)
+        r, c = divmod(r, 3364)
+        r, d = divmod(r, 3364)
+        out.append(_PAIRS[r] + _PAIRS[d] + _PAIRS[c] + _PAIRS[b] + _PAIRS[a])
+    digits = "".join(reversed(out)).lstrip("1")
+    return "1" * (len(raw) - len(raw.lstrip(b"\x00"))) + digits
+
+
+def address_bytes(address):
+    """The 22-byte binary form of an address (an optional `%entrypoint` is appended)."""
+    address, _, entrypoint = str(address).partition("%")
+    kind = address[:3]
+    if kind in _IMPLICIT:
+        tag, prefix = _IMPLICIT[kind]
+        raw = b"\x00" + bytes((tag,)) + b58decode_check(address, prefix)
+    elif kind == "KT1":
+        raw = b"\x01" + b58decode_check(address, KT1) + b"\x00"
+    else:
+        raise InterpreterError("unsupported address %r" % address)
+    if entrypoint and entrypoint != "default":
+        raw += entrypoint.encode()
+    return raw
+
+
+def address_from_bytes(raw):
+    if raw[0] == 0:
+        name, prefix = _IMPLICIT_TAGS[raw[1]]
+        return Address(b58encode_check(raw[2:22], prefix))
+    return Address(b58encode_check(raw[1:21], KT1))
+
+
+def _zarith(n):
+    out = bytearray()
+    sign = 0x40 if n < 0 else 0
+    n = abs(n)
+    out.append((n & 0x3f) | sign | (0x80 if n > 0x3f else 0))
+    n >>= 6
+    while n:
+        out.append((n & 0x7f) | (0x80 if n > 0x7f else 0))
+        n >>= 7
+    return bytes(out)
+
+
+def _prim(name, args, out):
+    out.append((3, 5, 7)[len(args)])
+    out.append(_PRIMS[name])
+    for a in args:
+        _micheline(a, out)
+
+
+def _sequence(items, out):
+    body = bytearray()
+    for item in items:
+        _micheline(item, body)
+    out.append(0x02)
+    out += struct.pack(">I", len(body))
+    out += body
+
+
+def _micheline(value, out):
+    t = type(value)
+    if t is bool:
+        _prim("True" if value else "False", (), out)
+    elif t in (int, Mutez):
+        out.append(0x00)
+        out += _zarith(value)
+    elif t is Address:
+        raw = address_bytes(value)
+        out.append(0x0a)
+        out += struct.pack(">I", len(raw)) + raw
+    elif t is Contract:
+        _micheline(Address(value.address if value.entrypoint == "default" else "%s%%%s" % (value.address, value.entrypoint)), out)
+    elif t is str:
+        raw = value.encode()
+        out.append(0x01)
+        out += struct.pack(">I", len(raw)) + raw
+    elif t is bytes:
+        out.append(0x0a)
+        out += struct.pack(">I", len(value)) + value
+    elif t is tuple:
+        _prim("Pair", value, out)
+    elif value is None:
+        _prim("None", (), out)
+    elif value is Unit:
+        _prim("Unit", (), out)
+    elif t is Some:
+        _prim("Some", (value.value,), out)
+    elif t is Left:
+        _prim("Left", (value.value,), out)
+    elif t is Right:
+        _prim("Right", (value.value,), out)
+    elif t is list:
+        _sequence(value, out)
+    elif t is frozenset:
+        _sequence(sorted(value, key=sort_key), out)
+    elif t is dict:
+        body = bytearray()
+        for k in sorted(value, key=sort_key):
+            _prim("Elt", (k, value[k]), body)
+        out.append(0x02)
+        out += struct.pack(">I", len(body))
+        out += body
+    elif t is BigMap and value.id is not None:
+        # big maps are stored by id
+        _micheline(value.id, out)
+    else:
+        raise InterpreterError("cannot PACK %r" % (value,))
+
+
+def pack(value):
+    out = bytearray(b"\x05")
+    _micheline(value, out)
+    return bytes(out)
+
+
+def blake2b_256(data):
+    return hashlib.blake2b(data, digest_size=32).digest()
+
+
+def script_expr_hash(packed):
+    """The `expr...` hash of packed data, as used for big_map keys over RPC."""
+    return b58encode_check(blake2b_256(packed), EXPR)
+
+
+def micheline_size(node):
+    """Size in bytes of the binary Micheline form of a code or type node, as
+    stored on chain (no `0x05` prefix); no primitive table is needed for it."""
+    t = type(node)
+    if t is Int:
+        return 1 + len(_zarith(node.value))
+    if t is String:
+        return 5 + len(node.value.encode())
+    if t is Bytes:
+        return 5 + len(node.value)
+    if t is Seq:
+        return 5 + sum(micheline_size(item) for item in node.items)
+    if t is Prim:
+        size = 2 + sum(micheline_size(arg) for arg in node.args)
+        annots = len(" ".join(node.annots).encode()) if node.annots else None
+        if len(node.args) > 2:
+            # generic form: argument sequence and annotations are length-prefixed
+            return size + 4 + 4 + (annots or 0)
+        return size + (4 + annots if annots is not None else 0)
+    raise InterpreterError("not a Micheline node: %r" % (node,))
+
+
+def script_size(script):
+    """Binary size of a script: its `parameter`, `storage`, `code` and
+    `view` sections."""
+    sections = sum(2 + micheline_size(section) for section in (script.parameter, script.storage, script.code))
+    return 5 + sections + sum(micheline_size(view) for view in script.views)
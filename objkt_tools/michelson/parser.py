@@ -0,0 +1,391 @@
+## Streaming Michelson parser
+##
+## Reads the compiled `.tz` artifacts of `michelson/` chunk by chunk and
+## builds a compact, immutable AST (`Int`, `String`, `Bytes`, `Prim`, `Seq`).
+## The tokenizer never holds more than a chunk plus one unfinished token in
+## memory, and the nodes use `__slots__` so that a full contract stays small.
+##
+##     script = parse_file("michelson/objkt_swap_v2.tz")
+##     entrypoints(script.parameter)   # {'cancel_swap': nat, 'collect': nat, ...}
+##
+## Run `python -m objkt_tools.michelson [files...]` to benchmark the parser
+## on every artifact of `michelson/`.
+import re
+import time
+from pathlib import Path
+
+CHUNK_SIZE = 1 << 16
+
+
+class ParseError(Exception):
+    pass
+
+
+## ## AST
+
+class Int:
+    __slots__ = ("value",)
+
+    def __init__(self, value):
+        self.value = value
+
+    def __eq__(self, other):
+        return type(other) is Int and other.value == self.value
+
+    def __hash__(self):
+        return hash((Int, self.value))
+
+    def __repr__(self):
+        return "Int(%d)" % self.value
+
+    def __str__(self):
+        return str(self.value)
+
+
+class String:
+    __slots__ = ("value",)
+
+    def __init__(self, value):
+        self.value = value
+
+    def __eq__(self, other):
+        return type(other) is String and other.value == self.value
+
+    def __hash__(self):
+        return hash((String, self.value))
+
+    def __repr__(self):
+        return "String(%r)" % self.value
+
+    def __str__(self):
+        return '"%s"' % self.value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class Bytes:
+    __slots__ = ("value",)
+
+    def __init__(self, value):
+        self.value = value
+
+    def __eq__(self, other):
+        return type(other) is Bytes and other.value == self.value
+
+    def __hash__(self):
+        return hash((Bytes, self.value))
+
+    def __repr__(self):
+        return "Bytes(%s)" % self
+
+    def __str__(self):
+        return "0x" + self.value.hex()
+
+
+class Prim:
+    __slots__ = ("name", "args", "annots")
+
+    def __init__(self, name, args=(), annots=()):
+        self.name = name
+        self.args = tuple(args)
+        self.annots = tuple(annots)
+
+    def annot(self, prefix="%"):
+        # first annotation with the given prefix, without the prefix
+        for a in self.annots:
+            if a[0] == prefix:
+                return a[1:]
+        return None
+
+    def __eq__(self, other):
+        return (type(other) is Prim and other.name == self.name
+                and other.args == self.args and other.annots == self.annots)
+
+    def __hash__(self):
+        return hash((Prim, self.name, self.args, self.annots))
+
+    def __repr__(self):
+        return "Prim(%r, %r, %r)" % (self.name, self.args, self.annots)
+
+    def __str__(self):
+        return " ".join((self.name,) + self.annots + tuple(_arg_str(a) for a in self.args))
+
+
+class Seq:
+    __slots__ = ("items",)
+
+    def __init__(self, items=()):
+        self.items = tuple(items)
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+    def __getitem__(self, i):
+        return self.items[i]
+
+    def __eq__(self, other):
+        return type(other) is Seq and other.items == self.items
+
+    def __hash__(self):
+        return hash((Seq, self.items))
+
+    def __repr__(self):
+        return "Seq(%r)" % (self.items,)
+
+    def __str__(self):
+        return "{ " + " ; ".join(str(i) for i in self.items) + " }" if self.items else "{}"
+
+
+def _arg_str(node):
+    if type(node) is Prim and (node.args or node.annots):
+        return "(%s)" % node
+    return str(node)
+
+
+class Script:
+    __slots__ = ("parameter", "storage", "code", "views")
+
+    def __init__(self, parameter, storage, code, views=()):
+        self.parameter = parameter
+        self.storage = storage
+        self.code = code
+        self.views = tuple(views)
+
+    def entrypoints(self):
+        return entrypoints(self.parameter)
+
+    def __eq__(self, other):
+        return (type(other) is Script and other.parameter == self.parameter
+                and other.storage == self.storage and other.code == self.code
+                and other.views == self.views)
+
+    def __str__(self):
+        sections = ["parameter " + _arg_str(self.parameter), "storage " + _arg_str(self.storage), "code " + _arg_str(self.code)]
+        sections.extend(str(v) for v in self.views)
+        return ";\n".join(sections) + ";"
+
+
+## ## Tokenizer
+##
+## Tokens are `(kind, value, line)` tuples; `kind` is one of `{ } ( ) ;`,
+## `int`, `string`, `bytes`, `annot` or `prim`.
+
+_TOKEN = re.compile(r"""
+    (?P<ws>\s+|\#[^\n]*|/\*.*?\*/)
+  | (?P<punct>[{}();])
+  | (?P<bytes>0x[0-9a-fA-F]*)
+  | (?P<int>-?[0-9]+)
+  | (?P<string>"(?:[^"\\\n]|\\.)*")
+  | (?P<annot>[%@:][A-Za-z0-9_.%@]*)
+  | (?P<prim>[A-Za-z_][A-Za-z0-9_]*)
+""", re.X | re.S)
+
+_ESCAPES = {"n": "\n", "t": "\t", "r": "\r", "b": "\b", "\\": "\\", '"': '"'}
+
+
+def _chunks(source, size):
+    if isinstance(source, str):
+        yield source
+    elif hasattr(source, "read"):
+        while True:
+            chunk = source.read(size)
+            if not chunk:
+                return
+            yield chunk
+    else:
+        yield from source
+
+
+def _unescape(s):
+    return re.sub(r"\\(.)", lambda m: _ESCAPES.get(m.group(1), m.group(1)), s)
+
+
+def tokenize(source, chunk_size=CHUNK_SIZE):
+    """Yield tokens from a string, a text file object or an iterable of chunks."""
+    chunks = _chunks(source, chunk_size)
+    buf, pos, line, eof = "", 0, 1, False
+    while True:
+        m = _TOKEN.match(buf, pos) if pos < len(buf) else None
+        # a token touching the end of the buffer may continue in the next chunk
+        if (m is None or m.end() == len(buf)) and not eof:
+            chunk = next(chunks, None)
+            if chunk is None:
+                eof = True
+            else:
+                buf, pos = buf[pos:] + chunk, 0
+            continue
+        if m is None:
+            if pos < len(buf):
+                raise ParseError("line %d: unexpected %r" % (line, buf[pos:pos + 20]))
+            return
+        kind = m.lastgroup
+        text = m.group(kind)
+        pos = m.end()
+        if kind == "ws":
+            line += text.count("\n")
+        elif kind == "punct":
+            yield (text, text, line)
+        elif kind == "int":
+            yield ("int", int(text), line)
+        elif kind == "string":
+            yield ("string", _unescape(text[1:-1]), line)
+        elif kind == "bytes":
+            yield ("bytes", bytes.fromhex(text[2:]), line)
+        else:
+            yield (kind, text, line)
+
+
+## ## Parser
+
+_EOF = ("eof", None, 0)
+_END = frozenset((";", "}", ")", "eof"))
+_ATOMS = {"prim": Prim, "int": Int, "string": String, "bytes": Bytes}
+
+
+class _Parser:
+    def __init__(self, tokens):
+        self.tokens = tokens
+        self.advance()
+
+    def advance(self):
+        self.tok = next(self.tokens, _EOF)
+
+    def fail(self, what):
+        kind, value, line = self.tok
+        raise ParseError("line %d: expected %s, got %r" % (line, what, value if kind != "eof" else "end of input"))
+
+    def expect(self, kind):
+        if self.tok[0] != kind:
+            self.fail(repr(kind))
+        self.advance()
+
+    def expr(self):
+        # an expression in a sequence or between parentheses: prims take all
+        # following arguments
+        kind, value, _ = self.tok
+        if kind != "prim":
+            return self.arg()
+        self.advance()
+        annots = []
+        while self.tok[0] == "annot":
+            annots.append(self.tok[1])
+            self.advance()
+        args = []
+        while self.tok[0] not in _END:
+            args.append(self.arg())
+        return Prim(value, args, annots)
+
+    def arg(self):
+        kind, value, _ = self.tok
+        if kind == "(":
+            self.advance()
+            node = self.expr()
+            self.expect(")")
+            return node
+        if kind == "{":
+            return self.seq()
+        if kind not in _ATOMS:
+            self.fail("an expression")
+        self.advance()
+        return _ATOMS[kind](value)
+
+    def seq(self):
+        self.expect("{")
+        items = []
+        while self.tok[0] != "}":
+            items.append(self.expr())
+            if self.tok[0] == ";":
+                self.advance()
+            elif self.tok[0] != "}":
+                self.fail("';' or '}'")
+        self.advance()
+        return Seq(items)
+
+    def toplevel(self):
+        # a `.tz` file is a `;`-separated list of sections without braces
+        while self.tok[0] != "eof":
+            yield self.expr()
+            if self.tok[0] == ";":
+                self.advance()
+            elif self.tok[0] != "eof":
+                self.fail("';'")
+
+
+def parse(source):
+    """Parse a single Michelson expression (type, data or instruction sequence)."""
+    p = _Parser(tokenize(source))
+    node = p.expr()
+    if p.tok[0] != "eof":
+        p.fail("end of input")
+    return node
+
+
+def iter_sections(source):
+    """Lazily yield the top-level sections (`parameter`, `storage`, `code`, `view`)."""
+    return _Parser(tokenize(source)).toplevel()
+
+
+def parse_script(source):
+    parameter = storage = code = None
+    views = []
+    for section in iter_sections(source):
+        if type(section) is not Prim or len(section.args) < 1:
+            raise ParseError("unexpected top-level expression %s" % section)
+        if section.name == "parameter":
+            parameter = section.args[0]
+        elif section.name == "storage":
+            storage = section.args[0]
+        elif section.name == "code":
+            code = section.args[0]
+        elif section.name == "view":
+            views.append(section)
+        else:
+            raise ParseError("unknown section %s" % section.name)
+    if parameter is None or storage is None or code is None:
+        raise ParseError("a script needs parameter, storage and code")
+    return Script(parameter, storage, code, views)
+
+
+def parse_file(path):
+    with open(path) as f:
+        return parse_script(f)
+
+
+def entrypoints(parameter):
+    """Map entry point annotations to their types by walking the `or` tree."""
+    result = {}
+
+    def walk(node):
+        name = node.annot("%") if type(node) is Prim else None
+        if name is not None:
+            result[name] = node
+        elif type(node) is Prim and node.name == "or":
+            walk(node.args[0])
+            walk(node.args[1])
+
+    walk(parameter)
+    if not result:
+        result["default"] = parameter
+    return result
+
+
+## ## Benchmark
+
+def _default_files():
+    return sorted((Path(__file__).resolve().parents[2] / "michelson").glob("*.tz"))
+
+
+def bench(paths=None, repeat=5):
+    """Parse every file `repeat` times; return `{path: best time in seconds}`."""
+    results = {}
+    for path in paths or _default_files():
+        best = None
+        for _ in range(repeat):
+            start = time.perf_counter()
+            parse_file(path)
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        results[str(path)] = best
+    return results
+
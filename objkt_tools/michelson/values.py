@@ -0,0 +1,586 @@
+## Michelson values
+##
+## Runtime representation used by the interpreter:
+##
+## | Michelson            | Python                                   |
+## |----------------------|------------------------------------------|
+## | int, nat, timestamp  | `int`                                    |
+## | mutez                | `Mutez` (an `int` checked for overflow)  |
+## | string, key, ...     | `str`                                    |
+## | address, key_hash    | `Address` (a `str`)                      |
+## | bytes                | `bytes`                                  |
+## | bool                 | `bool`                                   |
+## | unit                 | `Unit`                                   |
+## | pair                 | `tuple` of two values                    |
+## | option               | `Some(v)` / `None`                       |
+## | or                   | `Left(v)` / `Right(v)`                   |
+## | list, set            | `list`, `frozenset`                      |
+## | map                  | `dict` (never mutated in place)          |
+## | big_map              | `BigMap`, backed by a `BigMapStore`      |
+## | contract             | `Contract`                               |
+## | operation            | `Transfer`                               |
+## | lambda               | `Lambda`                                 |
+##
+## `decode` turns Micheline data into these values following a type and
+## `encode` goes back to Micheline.
+import calendar
+import time
+
+from .parser import Int, String, Bytes, Prim, Seq, parse
+
+MUTEZ_MAX = (1 << 63) - 1
+
+
+class InterpreterError(Exception):
+    pass
+
+
+class Mutez(int):
+    __slots__ = ()
+
+    def __new__(cls, value):
+        if value < 0 or value > MUTEZ_MAX:
+            raise InterpreterError("mutez overflow: %d" % value)
+        return int.__new__(cls, value)
+
+    def __repr__(self):
+        return "Mutez(%d)" % self
+
+
+class Address(str):
+    __slots__ = ()
+
+    @property
+    def implicit(self):
+        return self.startswith("tz")
+
+    def __repr__(self):
+        return "Address(%s)" % str.__repr__(self)
+
+
+class _Unit:
+    __slots__ = ()
+
+    def __repr__(self):
+        return "Unit"
+
+
+Unit = _Unit()
+
+
+class Some:
+    __slots__ = ("value",)
+
+    def __init__(self, value):
+        self.value = value
+
+    def __eq__(self, other):
+        return type(other) is Some and other.value == self.value
+
+    def __hash__(self):
+        return hash((Some, self.value))
+
+    def __repr__(self):
+        return "Some(%r)" % (self.value,)
+
+
+class Left:
+    __slots__ = ("value",)
+
+    def __init__(self, value):
+        self.value = value
+
+    def __eq__(self, other):
+        return type(other) is Left and other.value == self.value
+
+    def __hash__(self):
+        return hash((Left, self.value))
+
+    def __repr__(self):
+        return "Left(%r)" % (self.value,)
+
+
+class Right:
+    __slots__ = ("value",)
+
+    def __init__(self, value):
+        self.value = value
+
+    def __eq__(self, other):
+        return type(other) is Right and other.value == self.value
+
+    def __hash__(self):
+        return hash((Right, self.value))
+
+    def __repr__(self):
+        return "Right(%r)" % (self.value,)
+
+
+class Contract:
+    __slots__ = ("address", "entrypoint")
+
+    def __init__(self, address, entrypoint="default"):
+        self.address = Address(address)
+        self.entrypoint = entrypoint
+
+    def __eq__(self, other):
+        return type(other) is Contract and (other.address, other.entrypoint) == (self.address, self.entrypoint)
+
+    def __hash__(self):
+        return hash((Contract, self.address, self.entrypoint))
+
+    def __repr__(self):
+        return "Contract(%r, %r)" % (str(self.address), self.entrypoint)
+
+
+class Transfer:
+    __slots__ = ("parameter", "amount", "destination")
+
+    def __init__(self, parameter, amount, destination):
+        self.parameter = parameter
+        self.amount = amount
+        self.destination = destination
+
+    def __eq__(self, other):
+        return (type(other) is Transfer and other.parameter == self.parameter
+                and other.amount == self.amount and other.destination == self.destination)
+
+    def __repr__(self):
+        return "Transfer(%r, %r, %r)" % (self.parameter, self.amount, self.destination)
+
+
+class Lambda:
+    __slots__ = ("code", "compiled")
+
+    def __init__(self, code):
+        self.code = code
+        self.compiled = None
+
+    def __eq__(self, other):
+        return type(other) is Lambda and other.code == self.code
+
+    def __hash__(self):
+        return hash((Lambda, self.code))
+
+    def __repr__(self):
+        return "Lambda(%s)" % self.code
+
+
+## ## Big maps
+##
+## A `BigMapStore` keeps every big_map of a simulated chain in memory,
+## indexed by id. A `BigMap` value is a view on one of them plus an overlay
+## of pending updates; updating returns a new `BigMap`, so that `DUP`ed big
+## maps keep value semantics while the (large) committed content is never
+## copied. The versions of an overlay share one dict (see `_Overlay`), so
+## that a run of updates costs O(1) each instead of a copy of the overlay.
+
+_REMOVED = object()
+_ABSENT = object()
+
+
+class _Overlay:
+    """One version of the pending updates of a big map.
+
+    The versions derived from one another share a single dict: the version
+    holding it is the root, every other one records the single change that
+    turns the root's dict into its own and points towards the root.
+    Reading a version makes it the root by replaying these changes, so
+    updating the latest version, the usual case, is O(1).
+    """
+
+    __slots__ = ("data", "key", "value", "next")
+
+    def __init__(self, data=None):
+        self.data = {} if data is None else data
+        self.key = self.value = self.next = None
+
+    def dict(self):
+        if self.next is not None:
+            self._reroot()
+        return self.data
+
+    def set(self, key, value):
+        data = self.dict()
+        new = _Overlay(data)
+        self.data, self.key, self.value, self.next = None, key, data.get(key, _ABSENT), new
+        data[key] = value
+        return new
+
+    def _reroot(self):
+        path = []
+        node = self
+        while node.next is not None:
+            path.append(node)
+            node = node.next
+        for version in reversed(path):
+            root = version.next
+            data = root.data
+            # the old root now records how to get back to it
+            root.data, root.key, root.value, root.next = None, version.key, data.get(version.key, _ABSENT), version
+            if version.value is _ABSENT:
+                data.pop(version.key, None)
+            else:
+                data[version.key] = version.value
+            version.data, version.key, version.value, version.next = data, None, None, None
+
+
+class BigMapStore:
+    def __init__(self):
+        self.maps = {}
+        self.types = {}
+        self.next_id = 0
+        self.journal = None
+
+    def alloc(self, key_type=None, value_type=None, entries=None):
+        big_map_id = self.next_id
+        self.next_id += 1
+        self.maps[big_map_id] = dict(entries or {})
+        self.types[big_map_id] = (key_type, value_type)
+        return big_map_id
+
+    def get(self, big_map_id):
+        return BigMap(self, big_map_id)
+
+    def commit(self, big_map):
+        """Write the overlay of `big_map` to the store, return its diff."""
+        if big_map.id is None:
+            big_map.id = self.alloc(big_map.key_type, big_map.value_type)
+        content = self.maps[big_map.id]
+        diff = []
+        for key, value in big_map.overlay.dict().items():
+            if self.journal is not None:
+                self.journal.append((content, key, content.get(key, _REMOVED)))
+            if value is _REMOVED:
+                content.pop(key, None)
+                diff.append((big_map.id, key, None))
+            else:
+                content[key] = value
+                diff.append((big_map.id, key, value))
+        big_map.overlay = _Overlay()
+        return diff
+
+    ## Commits between `begin` and `rollback` can be undone, which lets a
+    ## chain of calls fail atomically.
+    def begin(self):
+        self.journal = []
+
+    def rollback(self):
+        for content, key, previous in reversed(self.journal or ()):
+            if previous is _REMOVED:
+                content.pop(key, None)
+            else:
+                content[key] = previous
+        self.journal = None
+
+    def end(self):
+        self.journal = None
+
+
+class BigMap:
+    __slots__ = ("store", "id", "overlay", "key_type", "value_type")
+
+    def __init__(self, store, big_map_id=None, overlay=None, key_type=None, value_type=None):
+        self.store = store
+        self.id = big_map_id
+        self.overlay = overlay if overlay is not None else _Overlay()
+        if big_map_id is not None and key_type is None:
+            key_type, value_type = store.types.get(big_map_id, (None, None))
+        self.key_type = key_type
+        self.value_type = value_type
+
+    def _committed(self):
+        return self.store.maps[self.id] if self.id is not None else {}
+
+    def get(self, key):
+        overlay = self.overlay.dict()
+        if key in overlay:
+            value = overlay[key]
+            return None if value is _REMOVED else value
+        return self._committed().get(key)
+
+    def __contains__(self, key):
+        overlay = self.overlay.dict()
+        if key in overlay:
+            return overlay[key] is not _REMOVED
+        return key in self._committed()
+
+    def update(self, key, value):
+        overlay = self.overlay.set(key, _REMOVED if value is None else value)
+        return BigMap(self.store, self.id, overlay, self.key_type, self.value_type)
+
+    def items(self):
+        merged = dict(self._committed())
+        for key, value in self.overlay.dict().items():
+            if value is _REMOVED:
+                merged.pop(key, None)
+            else:
+                merged[key] = value
+        return merged.items()
+
+    def __len__(self):
+        return len(dict(self.items()))
+
+    def __repr__(self):
+        return "BigMap(id=%r, pending=%d)" % (self.id, len(self.overlay.dict()))
+
+
+## ## Comparison
+
+def _rank(v):
+    # Michelson compares values of the same type only; the rank keeps Python
+    # from comparing unrelated representations of the same type.
+    if v is None:
+        return 0
+    if type(v) is Left:
+        return 0
+    return 1
+
+
+def compare(a, b):
+    if type(a) is tuple:
+        c = compare(a[0], b[0])
+        return c if c else compare(a[1], b[1])
+    if a is None or type(a) in (Some, Left, Right):
+        ra, rb = _rank(a), _rank(b)
+        if ra != rb:
+            return -1 if ra < rb else 1
+        if a is None:
+            return 0
+        return compare(a.value, b.value)
+    if type(a) is Address:
+        # implicit accounts come before originated contracts
+        ka, kb = (not a.implicit, str(a)), (not b.implicit, str(b))
+        return (ka > kb) - (ka < kb)
+    if a is Unit:
+        return 0
+    return (a > b) - (a < b)
+
+
+class _Key:
+    __slots__ = ("v",)
+
+    def __init__(self, v):
+        self.v = v
+
+    def __lt__(self, other):
+        return compare(self.v, other.v) < 0
+
+
+def sort_key(v):
+    return _Key(v)
+
+
+## ## Micheline data <-> values
+
+def _timestamp(node):
+    if type(node) is Int:
+        return node.value
+    return calendar.timegm(time.strptime(node.value.replace("Z", "").split(".")[0], "%Y-%m-%dT%H:%M:%S"))
+
+
+def _comb(node, n):
+    # `Pair a b c`, `{a; b; c}` and nested `Pair a (Pair b c)` are equivalent
+    if type(node) is Seq:
+        items = list(node.items)
+    elif type(node) is Prim and node.name == "Pair":
+        items = list(node.args)
+    else:
+        raise InterpreterError("expected a pair, got %s" % node)
+    if len(items) > n:
+        items[n - 1:] = [Prim("Pair", items[n - 1:])]
+    return items
+
+
+def decode(ty, node, store=None):
+    """Build the value of Micheline data `node` of type `ty`."""
+    if isinstance(ty, str):
+        ty = parse(ty)
+    if isinstance(node, str):
+        node = parse(node)
+    name = ty.name
+    if name in ("int", "nat"):
+        return node.value
+    if name == "mutez":
+        return Mutez(node.value)
+    if name == "timestamp":
+        return _timestamp(node)
+    if name in ("string", "key", "signature", "chain_id"):
+        return node.value
+    if name in ("address", "key_hash"):
+        return Address(node.value)
+    if name == "contract":
+        address, _, entrypoint = node.value.partition("%")
+        return Contract(address, entrypoint or "default")
+    if name == "bytes":
+        return node.value
+    if name == "bool":
+        return node.name == "True"
+    if name == "unit":
+        return Unit
+    if name == "pair":
+        if len(ty.args) > 2:
+            ty = Prim("pair", (ty.args[0], Prim("pair", ty.args[1:])))
+        left, right = _comb(node, 2)
+        return (decode(ty.args[0], left, store), decode(ty.args[1], right, store))
+    if name == "option":
+        return None if node.name == "None" else Some(decode(ty.args[0], node.args[0], store))
+    if name == "or":
+        if node.name == "Left":
+            return Left(decode(ty.args[0], node.args[0], store))
+        return Right(decode(ty.args[1], node.args[0], store))
+    if name == "list":
+        return [decode(ty.args[0], item, store) for item in node]
+    if name == "set":
+        return frozenset(decode(ty.args[0], item, store) for item in node)
+    if name == "map":
+        return {decode(ty.args[0], e.args[0], store): decode(ty.args[1], e.args[1], store) for e in node}
+    if name == "big_map":
+        if store is None:
+            raise InterpreterError("big_map values need a BigMapStore")
+        if type(node) is Int:
+            return store.get(node.value)
+        entries = {decode(ty.args[0], e.args[0], store): decode(ty.args[1], e.args[1], store) for e in node}
+        return store.get(store.alloc(ty.args[0], ty.args[1], entries))
+    if name == "lambda":
+        return Lambda(node)
+    raise InterpreterError("cannot decode values of type %s" % name)
+
+
+def encode(value):
+    """Micheline data of a value (types are not needed in this direction)."""
+    if value is None:
+        return Prim("None")
+    if value is Unit:
+        return Prim("Unit")
+    t = type(value)
+    if t is bool:
+        return Prim("True" if value else "False")
+    if t in (int, Mutez):
+        return Int(int(value))
+    if t in (str, Address):
+        return String(str(value))
+    if t is bytes:
+        return Bytes(value)
+    if t is tuple:
+        return Prim("Pair", (encode(value[0]), encode(value[1])))
+    if t is Some:
+        return Prim("Some", (encode(value.value),))
+    if t is Left:
+        return Prim("Left", (encode(value.value),))
+    if t is Right:
+        return Prim("Right", (encode(value.value),))
+    if t is list:
+        return Seq(encode(v) for v in value)
+    if t is frozenset:
+        return Seq(encode(v) for v in sorted(value, key=sort_key))
+    if t is dict:
+        return Seq(Prim("Elt", (encode(k), encode(v))) for k, v in sorted(value.items(), key=lambda kv: sort_key(kv[0])))
+    if t is BigMap:
+        return Int(value.id) if value.id is not None else Seq()
+    if t is Contract:
+        return String(value.address if value.entrypoint == "default" else "%s%%%s" % (value.address, value.entrypoint))
+    if t is Lambda:
+        return value.code
+    raise InterpreterError("cannot encode %r" % (value,))
+
+
+def from_fields(ty, data, store=None, default=None):
+    """Build a value of type `ty` from Python data, filling records by name.
+
+    Pairs are read from dicts keyed by the field annotations (so the result
+    does not depend on the record layout) or from 2-tuples; `or` values
+    must already be `Left`/`Right`; `map` and `big_map` take dicts. Record
+    fields missing from a dict, including fields without annotation, are
+    decoded from the Micheline data `default` when it is given.
+    """
+    if isinstance(ty, str):
+        ty = parse(ty)
+    if isinstance(default, str):
+        default = parse(default)
+    name = ty.name
+    if name == "pair":
+        if len(ty.args) > 2:
+            ty = Prim("pair", (ty.args[0], Prim("pair", ty.args[1:])), ty.annots)
+        if isinstance(data, dict):
+            defaults = _comb(default, 2) if default is not None else (None, None)
+            return tuple(_field(arg, data, store, d) for arg, d in zip(ty.args, defaults))
+        return (from_fields(ty.args[0], data[0], store), from_fields(ty.args[1], data[1], store))
+    if name in ("int", "nat", "timestamp"):
+        return int(data)
+    if name == "mutez":
+        return Mutez(data)
+    if name in ("address", "key_hash"):
+        return Address(data)
+    if name == "contract":
+        return data if type(data) is Contract else Contract(data)
+    if name in ("string", "key", "signature", "chain_id"):
+        return str(data)
+    if name == "bytes":
+        return bytes(data)
+    if name == "bool":
+        return bool(data)
+    if name == "unit":
+        return Unit
+    if name == "option":
+        return None if data is None else Some(from_fields(ty.args[0], data, store))
+    if name == "or":
+        if type(data) is Left:
+            return Left(from_fields(ty.args[0], data.value, store))
+        return Right(from_fields(ty.args[1], data.value, store))
+    if name == "list":
+        return [from_fields(ty.args[0], d, store) for d in data]
+    if name == "set":
+        return frozenset(from_fields(ty.args[0], d, store) for d in data)
+    if name in ("map", "big_map"):
+        entries = {from_fields(ty.args[0], k, store): from_fields(ty.args[1], v, store) for k, v in data.items()}
+        if name == "map":
+            return entries
+        if store is None:
+            raise InterpreterError("big_map values need a BigMapStore")
+        return store.get(store.alloc(ty.args[0], ty.args[1], entries))
+    if name == "lambda":
+        return data if type(data) is Lambda else Lambda(parse(data))
+    raise InterpreterError("cannot build values of type %s" % name)
+
+
+def _field(ty, data, store, default):
+    label = ty.annot("%") if type(ty) is Prim else None
+    if label is not None and label in data:
+        return from_fields(ty, data[label], store)
+    if label is None and ty.name == "pair":
+        return from_fields(ty, data, store, default)
+    if default is not None:
+        return decode(ty, default, store)
+    if label is not None:
+        raise KeyError(label)
+    raise InterpreterError("record field without annotation in %s" % ty)
+
+
+def to_fields(ty, value):
+    """The inverse of `from_fields`: records become dicts keyed by field
+    annotation, other values are returned as they are (`option` as the
+    value or `None`, maps as dicts)."""
+    if isinstance(ty, str):
+        ty = parse(ty)
+    name = ty.name
+    if name == "pair":
+        if len(ty.args) > 2:
+            ty = Prim("pair", (ty.args[0], Prim("pair", ty.args[1:])), ty.annots)
+        if all(type(arg) is Prim and (arg.annot("%") is not None or arg.name == "pair") for arg in ty.args):
+            record = {}
+            for arg, v in zip(ty.args, value):
+                label = arg.annot("%")
+                if label is None:
+                    record.update(to_fields(arg, v))
+                else:
+                    record[label] = to_fields(arg, v)
+            return record
+        return (to_fields(ty.args[0], value[0]), to_fields(ty.args[1], value[1]))
+    if name == "option":
+        return None if value is None else to_fields(ty.args[0], value.value)
+    if name == "list":
+        return [to_fields(ty.args[0], v) for v in value]
+    if name == "map":
+        return {k: to_fields(ty.args[1], v) for k, v in value.items()}
+    return value
@@ -0,0 +1,349 @@
+## Off-chain order book of the swap contracts
+##
+## Keeps the open swaps of the v1, v2 and v2.1 marketplaces in memory,
+## built from the big_map diffs of their `swaps` maps (and of the v1
+## `royalties` map, which holds the creator of every OBJKT). Diffs come in
+## blocks:
+##
+##     {"level": 1234, "diffs": [
+##         {"contract": "KT1...", "map": "swaps", "key": 17, "value": {...}},
+##         {"contract": "KT1...", "map": "swaps", "key": 12, "value": null}]}
+##
+## where `value` is the new entry with its fields by name, or `null` when
+## the key is removed. Sold-out swaps, which v2 and v2.1 keep in storage
+## with an `objkt_amount` of 0, are removed from the book as well. Blocks
+## are read from a JSON lines recording (`read_blocks`) or produced by
+## `ChainFeed` from calls on a local `Chain`, so the index runs offline.
+##
+## Swaps are indexed by objkt, issuer and creator; prices are kept in one
+## heap per `(objkt_id, currency)` so that the floor of an objkt is found
+## in O(log n). Heaps drop removed swaps lazily and are compacted when
+## more than half of their entries are dead.
+##
+##     python -m objkt_tools.orderbook bench --swaps 5000000
+##     python -m objkt_tools.orderbook load history.jsonl --floor 152
+import argparse
+import gzip
+import heapq
+import json
+import random
+import sys
+import time
+from collections import namedtuple
+
+from .deployment import MINTER, MARKETPLACE, MARKETPLACE_V2_1, storage_field
+from .michelson import to_fields
+
+## Markets by contract address
+MARKETS = {MINTER: "v1", MARKETPLACE: "v2", MARKETPLACE_V2_1: "v2.1"}
+
+## `currency` is `None` for tez, `(contract, token_id)` for v2.1 swaps
+## priced in an FA2 token; `price` is per edition, in mutez or token units.
+Swap = namedtuple("Swap", "market swap_id objkt_id issuer creator amount price currency")
+
+
+def _swap(market, swap_id, value, creator=None):
+    if market == "v2.1":
+        return Swap(market, swap_id, int(value["objkt_id"]), value["issuer"], value["creator"],
+                    int(value["objkt_amount"]), int(value["token_per_objkt"]),
+                    (value["contract"], int(value["token_id"])))
+    return Swap(market, swap_id, int(value["objkt_id"]), value["issuer"], value.get("creator", creator),
+                int(value["objkt_amount"]), int(value["xtz_per_objkt"]), None)
+
+
+class OrderBook:
+    def __init__(self, markets=None):
+        self.markets = dict(MARKETS if markets is None else markets)
+        self.level = None
+        self.swaps = {}
+        self.creators = {}
+        self._by_objkt = {}
+        self._by_issuer = {}
+        self._by_creator = {}
+        self._prices = {}
+        self._live = {}
+
+    def __len__(self):
+        return len(self.swaps)
+
+    def get(self, market, swap_id):
+        return self.swaps.get((market, swap_id))
+
+    ## ## Updates
+
+    def apply(self, block):
+        """Apply the diffs of a block; blocks at or below the current level
+        are skipped, so a feed can be replayed safely."""
+        level = block.get("level")
+        if level is not None and self.level is not None and level <= self.level:
+            return False
+        for diff in block["diffs"]:
+            self.apply_diff(diff)
+        if level is not None:
+            self.level = level
+        return True
+
+    def apply_diff(self, diff):
+        market = self.markets.get(diff["contract"])
+        if market is None:
+            return
+        key = int(diff["key"])
+        value = diff["value"]
+        if diff["map"] == "royalties":
+            if value is not None:
+                self._set_creator(key, value["issuer"])
+        elif diff["map"] == "swaps":
+            if value is None:
+                self._remove((market, key))
+            else:
+                self._put((market, key), _swap(market, key, value, self.creators.get(int(value["objkt_id"]))))
+
+    def _put(self, key, swap):
+        if not swap.amount:
+            self._remove(key)
+            return
+        old = self.swaps.get(key)
+        if old is not None:
+            if old[:5] == swap[:5] and old.price == swap.price and old.currency == swap.currency:
+                # a partial collect only changes the amount
+                self.swaps[key] = swap
+                return
+            self._remove(key)
+        self.swaps[key] = swap
+        _add(self._by_objkt, swap.objkt_id, key)
+        _add(self._by_issuer, swap.issuer, key)
+        if swap.creator is not None:
+            _add(self._by_creator, swap.creator, key)
+        bucket = (swap.objkt_id, swap.currency)
+        heapq.heappush(self._prices.setdefault(bucket, []), (swap.price, key))
+        self._live[bucket] = self._live.get(bucket, 0) + 1
+
+    def _remove(self, key):
+        swap = self.swaps.pop(key, None)
+        if swap is None:
+            return
+        _discard(self._by_objkt, swap.objkt_id, key)
+        _discard(self._by_issuer, swap.issuer, key)
+        if swap.creator is not None:
+            _discard(self._by_creator, swap.creator, key)
+        bucket = (swap.objkt_id, swap.currency)
+        live = self._live[bucket] - 1
+        heap = self._prices[bucket]
+        if not live:
+            del self._live[bucket]
+            del self._prices[bucket]
+        else:
+            self._live[bucket] = live
+            if len(heap) > 2 * live + 8:
+                heap[:] = [e for e in heap if self._valid(e, bucket)]
+                heapq.heapify(heap)
+
+    def _valid(self, entry, bucket):
+        # heap entries of removed (or re-listed) swaps are stale
+        swap = self.swaps.get(entry[1])
+        return swap is not None and swap.price == entry[0] and (swap.objkt_id, swap.currency) == bucket
+
+    def _set_creator(self, objkt_id, creator):
+        self.creators[objkt_id] = creator
+        # v1 swaps recorded before the royalties of their objkt
+        for key in self._by_objkt.get(objkt_id, ()):
+            swap = self.swaps[key]
+            if swap.creator is None:
+                self.swaps[key] = swap._replace(creator=creator)
+                _add(self._by_creator, creator, key)
+
+    ## ## Queries
+
+    def floor(self, objkt_id, currency=None):
+        """The cheapest open swap of an objkt, or `None`."""
+        bucket = (objkt_id, currency)
+        heap = self._prices.get(bucket)
+        while heap:
+            if self._valid(heap[0], bucket):
+                return self.swaps[heap[0][1]]
+            heapq.heappop(heap)
+        return None
+
+    def listings(self, objkt_id, currency=None):
+        """The open swaps of an objkt in a currency, cheapest first."""
+        swaps = [self.swaps[key] for key in self._by_objkt.get(objkt_id, ())]
+        return sorted((s for s in swaps if s.currency == currency), key=lambda s: (s.price, s.market, s.swap_id))
+
+    def by_objkt(self, objkt_id):
+        return self._select(self._by_objkt, objkt_id)
+
+    def by_issuer(self, issuer):
+        return self._select(self._by_issuer, issuer)
+
+    def by_creator(self, creator):
+        return self._select(self._by_creator, creator)
+
+    def _select(self, index, value):
+        return sorted((self.swaps[key] for key in index.get(value, ())), key=lambda s: (s.market, s.swap_id))
+
+
+def _add(index, value, key):
+    keys = index.get(value)
+    if keys is None:
+        index[value] = keys = set()
+    keys.add(key)
+
+
+def _discard(index, value, key):
+    keys = index[value]
+    keys.discard(key)
+    if not keys:
+        del index[value]
+
+
+## ## Feeds
+
+def read_blocks(path):
+    """Blocks of a JSON lines recording (optionally gzipped)."""
+    opener = gzip.open if str(path).endswith(".gz") else open
+    with opener(path, "rt") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def write_blocks(path, blocks):
+    opener = gzip.open if str(path).endswith(".gz") else open
+    with opener(path, "wt") as f:
+        for block in blocks:
+            f.write(json.dumps(block, separators=(",", ":")))
+            f.write("\n")
+
+
+class ChainFeed:
+    """Turns the receipts of calls on a local `Deployment` into blocks."""
+
+    def __init__(self, deployment):
+        self.maps = {}
+        for instance in (deployment.minter, deployment.marketplace, deployment.marketplace_v2_1):
+            for name in ("swaps", "royalties"):
+                try:
+                    big_map = storage_field(instance, name)
+                except KeyError:
+                    continue
+                self.maps[big_map.id] = (str(instance.address), name, big_map.value_type)
+        self.level = 0
+
+    def block(self, receipts):
+        diffs = []
+        for receipt in receipts:
+            for big_map_id, key, value in receipt.big_map_diff:
+                if big_map_id in self.maps:
+                    contract, name, value_type = self.maps[big_map_id]
+                    diffs.append({"contract": contract, "map": name, "key": key,
+                                  "value": None if value is None else to_fields(value_type, value)})
+        self.level += 1
+        return {"level": self.level, "diffs": diffs}
+
+
+## ## Benchmark
+
+def synthetic_history(swaps, per_block=1000, objkts=None, issuers=None, seed=0):
+    """Blocks of a random v2 history with `swaps` swaps: a third of them are
+    collected edition by edition, a sixth cancelled, the rest stay open.
+    Like the deployed v2, a swap collected to its last edition stays in
+    storage with an `objkt_amount` of 0."""
+    rng = random.Random(seed)
+    objkts = objkts or max(swaps // 20, 1)
+    issuers = issuers or max(swaps // 50, 1)
+    open_swaps = []
+    diffs = []
+    level = 0
+    for swap_id in range(swaps):
+        value = {"creator": "tz1creator%d" % rng.randrange(issuers), "issuer": "tz1issuer%d" % rng.randrange(issuers),
+                 "objkt_amount": rng.randint(1, 5), "objkt_id": rng.randrange(objkts), "royalties": 100,
+                 "xtz_per_objkt": rng.randint(1, 1000) * 100000}
+        diffs.append({"contract": MARKETPLACE, "map": "swaps", "key": swap_id, "value": value})
+        open_swaps.append((swap_id, value))
+        r = rng.random()
+        if r < 0.5 and open_swaps:
+            i = rng.randrange(len(open_swaps))
+            key, value = open_swaps[i]
+            if r < 0.33:
+                value = dict(value, objkt_amount=value["objkt_amount"] - 1)
+                if value["objkt_amount"]:
+                    open_swaps[i] = (key, value)
+                else:
+                    open_swaps[i] = open_swaps[-1]
+                    open_swaps.pop()
+            else:
+                open_swaps[i] = open_swaps[-1]
+                open_swaps.pop()
+                value = None
+            diffs.append({"contract": MARKETPLACE, "map": "swaps", "key": key, "value": value})
+        if len(diffs) >= per_block:
+            level += 1
+            yield {"level": level, "diffs": diffs}
+            diffs = []
+    if diffs:
+        yield {"level": level + 1, "diffs": diffs}
+
+
+def bench(swaps=5000000, queries=100000, seed=0):
+    book = OrderBook()
+    diffs = 0
+    applied = 0.0
+    # only `apply` is timed, not the generation of the history
+    for block in synthetic_history(swaps, seed=seed):
+        diffs += len(block["diffs"])
+        start = time.perf_counter()
+        book.apply(block)
+        applied += time.perf_counter() - start
+
+    rng = random.Random(seed)
+    objkts = max(swaps // 20, 1)
+    issuers = max(swaps // 50, 1)
+    start = time.perf_counter()
+    for _ in range(queries):
+        book.floor(rng.randrange(objkts))
+    floors = time.perf_counter() - start
+    start = time.perf_counter()
+    for _ in range(queries):
+        book.by_issuer("tz1issuer%d" % rng.randrange(issuers))
+    by_issuer = time.perf_counter() - start
+    return {
+        "swaps": swaps, "diffs": diffs, "open": len(book),
+        "apply_seconds": applied, "diffs_per_second": diffs / applied,
+        "floor_us": floors / queries * 1e6, "by_issuer_us": by_issuer / queries * 1e6,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m objkt_tools.orderbook")
+    commands = parser.add_subparsers(dest="command", required=True)
+    b = commands.add_parser("bench", help="replay a synthetic history and time queries")
+    b.add_argument("--swaps", type=int, default=5000000)
+    b.add_argument("--queries", type=int, default=100000)
+    b.add_argument("--seed", type=int, default=0)
+    load = commands.add_parser("load", help="build the book from a JSON lines recording")
+    load.add_argument("path")
+    load.add_argument("--floor", type=int, action="append", default=[], metavar="OBJKT_ID")
+    load.add_argument("--issuer", action="append", default=[])
+    load.add_argument("--creator", action="append", default=[])
+    args = parser.parse_args(argv)
+
+    if args.command == "bench":
+        print(json.dumps(bench(args.swaps, args.queries, args.seed), indent=1))
+        return 0
+    book = OrderBook()
+    for block in read_blocks(args.path):
+        book.apply(block)
+    print("level %s, %d open swaps" % (book.level, len(book)))
+    for objkt_id in args.floor:
+        print("floor %d: %s" % (objkt_id, book.floor(objkt_id)))
+    for issuer in args.issuer:
+        for swap in book.by_issuer(issuer):
+            print(swap)
+    for creator in args.creator:
+        for swap in book.by_creator(creator):
+            print(swap)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,339 @@
+## Columnar snapshots of the marketplace state
+##
+## Stores the `swaps` maps of the three marketplaces, the v1 `royalties`,
+## the FA2 `ledger`s and the curation `curations` in one binary file, one
+## typed column per field. Addresses are dictionary-encoded: the file
+## holds every distinct address once, in its 22-byte binary form, and
+## address columns hold `uint32` ids into that dictionary. Numeric columns
+## are little-endian `uint64`.
+##
+## Layout: an 8-byte magic, a `<IIQQ` prefix (version, reserved, header
+## offset, header length), the column data aligned to 64 bytes, and a JSON
+## header at the end describing tables, columns, offsets and row counts.
+## `Snapshot` memory-maps the file; columns are NumPy views on the map (or
+## `memoryview`s when NumPy is not installed), so opening a snapshot costs
+## the same whatever its size.
+##
+##     python -m objkt_tools.snapshot info state.snap
+##     python -m objkt_tools.snapshot bench --rows 10000000
+import argparse
+import json
+import mmap
+import struct
+import sys
+import time
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from .deployment import storage_field
+from .michelson import to_fields
+from .michelson.pack import address_bytes, address_from_bytes
+
+MAGIC = b"OBJKTCOL"
+VERSION = 1
+_PREFIX = struct.Struct("<IIQQ")
+_ALIGN = 64
+ADDRESS_SIZE = 22
+
+ADDRESS = "address"
+U64 = "u64"
+_CODES = {ADDRESS: ("<u4", "I", 4), U64: ("<u8", "Q", 8)}
+
+## Column kinds of every table, keys first
+SCHEMAS = {
+    "swaps_v1": (("swap_id", U64), ("issuer", ADDRESS), ("objkt_id", U64), ("objkt_amount", U64),
+                 ("xtz_per_objkt", U64)),
+    "swaps_v2": (("swap_id", U64), ("creator", ADDRESS), ("issuer", ADDRESS), ("objkt_id", U64),
+                 ("objkt_amount", U64), ("royalties", U64), ("xtz_per_objkt", U64)),
+    "swaps_v2_1": (("swap_id", U64), ("contract", ADDRESS), ("token_id", U64), ("creator", ADDRESS),
+                   ("issuer", ADDRESS), ("objkt_id", U64), ("objkt_amount", U64), ("royalties", U64),
+                   ("token_per_objkt", U64)),
+    "royalties": (("objkt_id", U64), ("issuer", ADDRESS), ("royalties", U64)),
+    "ledger_objkts": (("owner", ADDRESS), ("token_id", U64), ("balance", U64)),
+    "ledger_hdao": (("owner", ADDRESS), ("token_id", U64), ("balance", U64)),
+    "curations": (("objkt_id", U64), ("issuer", ADDRESS), ("hDAO_balance", U64)),
+}
+
+
+class SnapshotError(Exception):
+    pass
+
+
+## ## Writing
+
+class Writer:
+    """Collects tables, then writes them with `write`.
+
+    Columns are sequences of Python values or NumPy arrays. An address
+    column given as an integer array holds ids from `address_id`, which
+    lets large tables be built without a Python loop per row.
+    """
+
+    def __init__(self):
+        self.ids = {}
+        self.addresses = []
+        self.tables = {}
+
+    def address_id(self, address):
+        address = str(address)
+        i = self.ids.get(address)
+        if i is None:
+            i = self.ids[address] = len(self.addresses)
+            self.addresses.append(address_bytes(address)[:ADDRESS_SIZE])
+        return i
+
+    def add_table(self, name, columns, schema=None):
+        schema = schema or SCHEMAS[name]
+        rows = None
+        encoded = []
+        for column, kind in schema:
+            values = columns[column]
+            if kind == ADDRESS and not _is_int_array(values):
+                values = [self.address_id(a) for a in values]
+            data = _column_bytes(name, column, kind, values)
+            n = len(data) // _CODES[kind][2]
+            if rows is not None and n != rows:
+                raise SnapshotError("%s.%s has %d rows, expected %d" % (name, column, n, rows))
+            rows = n
+            encoded.append((column, kind, data))
+        self.tables[name] = (rows or 0, encoded)
+
+    def add_rows(self, name, rows, schema=None):
+        """Add a table from an iterable of dicts keyed by column name."""
+        schema = schema or SCHEMAS[name]
+        columns = {column: [] for column, _ in schema}
+        for row in rows:
+            for column, _ in schema:
+                columns[column].append(row[column])
+        self.add_table(name, columns, schema)
+
+    def write(self, path):
+        header = {"version": VERSION, "tables": {}}
+        with open(path, "wb") as f:
+            f.write(MAGIC + _PREFIX.pack(VERSION, 0, 0, 0))
+            header["addresses"] = {"offset": _write_aligned(f, b"".join(self.addresses)),
+                                   "count": len(self.addresses)}
+            for name, (rows, encoded) in self.tables.items():
+                columns = {}
+                for column, kind, data in encoded:
+                    columns[column] = {"kind": kind, "offset": _write_aligned(f, data)}
+                header["tables"][name] = {"rows": rows, "columns": columns,
+                                          "order": [column for column, _, _ in encoded]}
+            raw = json.dumps(header, separators=(",", ":")).encode()
+            offset = f.tell()
+            f.write(raw)
+            f.seek(len(MAGIC))
+            f.write(_PREFIX.pack(VERSION, 0, offset, len(raw)))
+
+
+def _is_int_array(values):
+    return np is not None and isinstance(values, np.ndarray) and values.dtype.kind in "ui"
+
+
+def _column_bytes(table, column, kind, values):
+    dtype, code, size = _CODES[kind]
+    limit = 1 << (8 * size)
+    if np is not None and isinstance(values, np.ndarray):
+        if values.size and (values.min() < 0 or int(values.max()) >= limit):
+            raise SnapshotError("%s.%s does not fit in %s" % (table, column, dtype))
+        return values.astype(dtype, copy=False).tobytes()
+    values = [int(v) for v in values]
+    for v in values:
+        if not 0 <= v < limit:
+            raise SnapshotError("%s.%s: %d does not fit in %s" % (table, column, v, dtype))
+    return struct.pack("<%d%s" % (len(values), code), *values)
+
+
+def _write_aligned(f, data):
+    pad = -f.tell() % _ALIGN
+    f.write(b"\0" * pad)
+    offset = f.tell()
+    f.write(data)
+    return offset
+
+
+## ## Reading
+
+class Table:
+    def __init__(self, snapshot, name, header):
+        self.snapshot = snapshot
+        self.name = name
+        self.rows = header["rows"]
+        self.columns = header["order"]
+        self._header = header["columns"]
+        self._cache = {}
+
+    def __len__(self):
+        return self.rows
+
+    def kind(self, column):
+        return self._header[column]["kind"]
+
+    def __getitem__(self, column):
+        """The column as a zero-copy view; address columns hold ids."""
+        view = self._cache.get(column)
+        if view is None:
+            spec = self._header[column]
+            view = self._cache[column] = self.snapshot._view(spec["kind"], spec["offset"], self.rows)
+        return view
+
+    def records(self):
+        """Rows as dicts with decoded addresses (the slow, import path)."""
+        columns = [(c, self[c], self.kind(c) == ADDRESS) for c in self.columns]
+        address = self.snapshot.address
+        for i in range(self.rows):
+            yield {c: address(int(v[i])) if is_address else int(v[i]) for c, v, is_address in columns}
+
+
+class Snapshot:
+    def __init__(self, path):
+        self._file = open(path, "rb")
+        try:
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            self._file.close()
+            raise SnapshotError("%s is empty" % path)
+        if self._map[:len(MAGIC)] != MAGIC:
+            self.close()
+            raise SnapshotError("%s is not a snapshot" % path)
+        version, _, offset, length = _PREFIX.unpack_from(self._map, len(MAGIC))
+        if version != VERSION:
+            self.close()
+            raise SnapshotError("unsupported snapshot version %d" % version)
+        header = json.loads(self._map[offset:offset + length])
+        self._addresses = header["addresses"]
+        self.tables = {name: Table(self, name, t) for name, t in header["tables"].items()}
+        self._ids = None
+
+    def __getitem__(self, name):
+        return self.tables[name]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.tables = {}
+        try:
+            self._map.close()
+        except BufferError:
+            # columns are still referenced; the map goes with the last one
+            pass
+        self._file.close()
+
+    def _view(self, kind, offset, count):
+        dtype, code, size = _CODES[kind]
+        if np is not None:
+            return np.frombuffer(self._map, dtype=dtype, count=count, offset=offset)
+        return memoryview(self._map)[offset:offset + count * size].cast(code)
+
+    @property
+    def address_count(self):
+        return self._addresses["count"]
+
+    def address(self, i):
+        start = self._addresses["offset"] + i * ADDRESS_SIZE
+        return address_from_bytes(self._map[start:start + ADDRESS_SIZE])
+
+    def address_id(self, address):
+        """The id of an address, or `None`; the first call builds the index."""
+        if self._ids is None:
+            start = self._addresses["offset"]
+            raw = self._map[start:start + self.address_count * ADDRESS_SIZE]
+            self._ids = {raw[i:i + ADDRESS_SIZE]: i // ADDRESS_SIZE for i in range(0, len(raw), ADDRESS_SIZE)}
+        return self._ids.get(address_bytes(address)[:ADDRESS_SIZE])
+
+
+## ## Export from a local deployment
+
+def export(deployment, path):
+    """Write the big_maps of a `Deployment` to a snapshot."""
+    writer = Writer()
+    store = deployment.chain.store
+
+    def entries(instance, name):
+        big_map = storage_field(instance, name)
+        for key, value in store.maps[big_map.id].items():
+            yield key, to_fields(big_map.value_type, value)
+
+    for table, instance in (("swaps_v1", deployment.minter), ("swaps_v2", deployment.marketplace),
+                            ("swaps_v2_1", deployment.marketplace_v2_1)):
+        writer.add_rows(table, (dict(value, swap_id=key) for key, value in entries(instance, "swaps")))
+    writer.add_rows("royalties", (dict(value, objkt_id=key) for key, value in entries(deployment.minter, "royalties")))
+    for table, instance in (("ledger_objkts", deployment.objkts), ("ledger_hdao", deployment.hdao)):
+        writer.add_rows(table, ({"owner": key[0], "token_id": key[1], "balance": _balance(value)}
+                                for key, value in entries(instance, "ledger")))
+    writer.add_rows("curations", (dict(value, objkt_id=key) for key, value in entries(deployment.curation, "curations")))
+    writer.write(path)
+
+
+def _balance(value):
+    # the ledger value is either the balance or a `balance` record
+    return value["balance"] if isinstance(value, dict) else value
+
+
+## ## Benchmark
+
+def bench(path, rows=10000000, addresses=100000, seed=0):
+    if np is None:
+        raise ImportError("the snapshot benchmark requires numpy")
+    from .michelson import account
+    rng = np.random.default_rng(seed)
+    writer = Writer()
+    for i in range(addresses):
+        writer.address_id(account(i))
+    start = time.perf_counter()
+    writer.add_table("swaps_v2", {
+        "swap_id": np.arange(rows, dtype=np.uint64),
+        "creator": rng.integers(0, addresses, rows, dtype=np.uint32),
+        "issuer": rng.integers(0, addresses, rows, dtype=np.uint32),
+        "objkt_id": rng.integers(0, rows // 20 + 1, rows, dtype=np.uint64),
+        "objkt_amount": rng.integers(1, 10, rows, dtype=np.uint64),
+        "royalties": rng.integers(0, 251, rows, dtype=np.uint64),
+        "xtz_per_objkt": rng.integers(1, 1000, rows, dtype=np.uint64) * 100000,
+    })
+    writer.write(path)
+    written = time.perf_counter() - start
+
+    start = time.perf_counter()
+    snapshot = Snapshot(path)
+    swaps = snapshot["swaps_v2"]
+    opened = time.perf_counter() - start
+
+    start = time.perf_counter()
+    listed = int((swaps["xtz_per_objkt"] * swaps["objkt_amount"]).sum())
+    floors = np.full(int(swaps["objkt_id"].max()) + 1, np.iinfo(np.uint64).max, dtype=np.uint64)
+    np.minimum.at(floors, swaps["objkt_id"], swaps["xtz_per_objkt"])
+    scanned = time.perf_counter() - start
+    snapshot.close()
+    return {"rows": rows, "write_seconds": written, "open_seconds": opened,
+            "scan_seconds": scanned, "listed_mutez": listed}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m objkt_tools.snapshot")
+    commands = parser.add_subparsers(dest="command", required=True)
+    info = commands.add_parser("info", help="list the tables of a snapshot")
+    info.add_argument("path")
+    b = commands.add_parser("bench", help="write, open and scan a synthetic snapshot")
+    b.add_argument("--rows", type=int, default=10000000)
+    b.add_argument("--out", default="bench.snap")
+    args = parser.parse_args(argv)
+
+    if args.command == "bench":
+        print(json.dumps(bench(args.out, args.rows), indent=1))
+        return 0
+    with Snapshot(args.path) as snapshot:
+        print("%d addresses" % snapshot.address_count)
+        for name, table in snapshot.tables.items():
+            print("%-14s %10d rows  %s" % (name, table.rows, ", ".join(table.columns)))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
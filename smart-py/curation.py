@@ -0,0 +1,84 @@
+import smartpy as sp
+
+class Curation(sp.Contract):
+    def __init__(self, manager, metadata, fa2, protocol):
+        # fa2 is the hDAO token, protocol the v1 minter; configure can still
+        # replace both once, until it locks them
+        self.init(
+            curations = sp.big_map(tkey=sp.TNat, tvalue=sp.TRecord(hDAO_balance=sp.TNat, issuer=sp.TAddress)),
+            fa2 = fa2,
+            protocol = protocol,
+            manager = manager,
+            metadata = metadata,
+            locked = False
+            )
+
+    @sp.entry_point
+    def configure(self, params):
+        sp.verify((sp.sender == self.data.manager) & ~(self.data.locked))
+        self.data.fa2 = params.fa2
+        self.data.protocol = params.protocol
+        self.data.locked = True
+
+    @sp.entry_point
+    def curate(self, params):
+        # called by the v1 protocol once it moved the hDAO here
+        sp.verify(sp.sender == self.data.protocol)
+        self.add_curation(params.objkt_id, params.issuer, params.hDAO_amount)
+
+    @sp.entry_point
+    def curate_batch(self, params):
+        # votes sent straight to this contract: one operation for any number of
+        # objkts, the hDAO being pulled in a single FA2 transfer. Two
+        # requirements:
+        # - each objkt must already have a curation, made through the v1
+        #   minter, which records its issuer; the deployed minter exposes no
+        #   views, so there is no other trusted source for it and first votes
+        #   still go through v1
+        # - the curation contract must be an operator of the sender's hDAO;
+        #   the first batch of a voter is update_operators + curate_batch,
+        #   2 operations, later ones 1 (against 3 per vote through v1)
+        sp.set_type(params, sp.TList(sp.TRecord(objkt_id=sp.TNat, hDAO_amount=sp.TNat)))
+
+        total = sp.local('total', sp.nat(0))
+
+        sp.for vote in params:
+            sp.verify((vote.hDAO_amount > 0) & self.data.curations.contains(vote.objkt_id))
+            self.data.curations[vote.objkt_id].hDAO_balance += vote.hDAO_amount
+            total.value += vote.hDAO_amount
+
+        self.fa2_transfer(self.data.fa2, sp.sender, sp.to_address(sp.self), 0, total.value)
+
+    @sp.entry_point
+    def claim_hDAO(self, params):
+        sp.verify((sp.sender == self.data.curations[params.objkt_id].issuer) & (params.hDAO_amount <= self.data.curations[params.objkt_id].hDAO_balance))
+
+        self.fa2_transfer(self.data.fa2, sp.to_address(sp.self), sp.sender, 0, params.hDAO_amount)
+
+        self.data.curations[params.objkt_id].hDAO_balance = abs(self.data.curations[params.objkt_id].hDAO_balance - params.hDAO_amount)
+
+    @sp.entry_point
+    def claim_hDAO_batch(self, params):
+        # claims of one issuer over many objkts, paid out in a single FA2 transfer
+        sp.set_type(params, sp.TList(sp.TRecord(objkt_id=sp.TNat, hDAO_amount=sp.TNat)))
+
+        total = sp.local('total', sp.nat(0))
+
+        sp.for claim in params:
+            sp.verify((sp.sender == self.data.curations[claim.objkt_id].issuer) & (claim.hDAO_amount <= self.data.curations[claim.objkt_id].hDAO_balance))
+            self.data.curations[claim.objkt_id].hDAO_balance = abs(self.data.curations[claim.objkt_id].hDAO_balance - claim.hDAO_amount)
+            total.value += claim.hDAO_amount
+
+        sp.if (total.value > 0):
+            self.fa2_transfer(self.data.fa2, sp.to_address(sp.self), sp.sender, 0, total.value)
+
+    def add_curation(self, objkt_id, issuer, hDAO_amount):
+        sp.if self.data.curations.contains(objkt_id):
+            self.data.curations[objkt_id].hDAO_balance += hDAO_amount
+            self.data.curations[objkt_id].issuer = issuer
+        sp.else:
+            self.data.curations[objkt_id] = sp.record(hDAO_balance=hDAO_amount, issuer=issuer)
+
+    def fa2_transfer(self, fa2, from_, to_, objkt_id, objkt_amount):
+        c = sp.contract(sp.TList(sp.TRecord(from_=sp.TAddress, txs=sp.TList(sp.TRecord(amount=sp.TNat, to_=sp.TAddress, token_id=sp.TNat).layout(("to_", ("token_id", "amount")))))), fa2, entry_point='transfer').open_some()
+        sp.transfer(sp.list([sp.record(from_=from_, txs=sp.list([sp.record(amount=objkt_amount, to_=to_, token_id=objkt_id)]))]), sp.mutez(0), c)
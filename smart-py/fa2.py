@@ -417,48 +417,80 @@ class FA2_core(sp.Contract):
             **extra_storage
         )
 
+    ## Consecutive txs of a transfer that move the same `token_id` form a
+    ## group: the permission and token checks run once per group and the
+    ## sender's balance is read into `available` once, debited tx by tx
+    ## and written back when the group ends (`end_group`). This is the
+    ## shape the marketplaces send (one `from_`, one token, many `to_`).
     @sp.entry_point
     def transfer(self, params):
         sp.verify( ~self.is_paused() )
         sp.set_type(params, self.batch_transfer.get_type())
+        group = sp.local("group", sp.none, t = sp.TOption(token_id_type))
+        available = sp.local("available", sp.nat(0))
+        debited = sp.local("debited", sp.nat(0))
         sp.for transfer in params:
            current_from = transfer.from_
            sp.for tx in transfer.txs:
                 #sp.verify(tx.amount > 0, message = "TRANSFER_OF_ZERO")
-                if self.config.single_asset:
-                    sp.verify(tx.token_id == 0, "single-asset: token-id <> 0")
-                if self.config.support_operator:
-                          sp.verify(
-                              (self.is_administrator(sp.sender)) |
-                              (current_from == sp.sender) |
-                              self.operator_set.is_member(self.data.operators,
-                                                          current_from,
-                                                          sp.sender,
-                                                          tx.token_id),
-                              message = self.error_message.not_operator())
-                else:
-                          sp.verify(
-                              (self.is_administrator(sp.sender)) |
-                              (current_from == sp.sender),
-                              message = self.error_message.not_owner())
-                sp.verify(self.data.token_metadata.contains(tx.token_id),
-                          message = self.error_message.token_undefined())
+                sp.if group.value != sp.some(tx.token_id):
+                    self.end_group(current_from, group, available, debited)
+                    self.check_transfer(current_from, tx.token_id)
+                    group.value = sp.some(tx.token_id)
+                    available.value = self.data.ledger.get(
+                        self.ledger_key.make(current_from, tx.token_id),
+                        Ledger_value.make(0)).balance
                 # If amount is 0 we do nothing now:
                 sp.if (tx.amount > 0):
-                    from_user = self.ledger_key.make(current_from, tx.token_id)
                     sp.verify(
-                        (self.data.ledger[from_user].balance >= tx.amount),
+                        (available.value >= tx.amount),
                         message = self.error_message.insufficient_balance())
-                    to_user = self.ledger_key.make(tx.to_, tx.token_id)
-                    self.data.ledger[from_user].balance = sp.as_nat(
-                        self.data.ledger[from_user].balance - tx.amount)
-                    sp.if self.data.ledger.contains(to_user):
-                        self.data.ledger[to_user].balance += tx.amount
-                    sp.else:
-                         self.data.ledger[to_user] = Ledger_value.make(tx.amount)
+                    # a transfer to oneself leaves the balance as it is
+                    sp.if tx.to_ != current_from:
+                        available.value = sp.as_nat(available.value - tx.amount)
+                        debited.value += tx.amount
+                        to_user = self.ledger_key.make(tx.to_, tx.token_id)
+                        sp.if self.data.ledger.contains(to_user):
+                            self.data.ledger[to_user].balance += tx.amount
+                        sp.else:
+                             self.data.ledger[to_user] = Ledger_value.make(tx.amount)
                 sp.else:
                     pass
-                
+           self.end_group(current_from, group, available, debited)
+
+    def check_transfer(self, from_, token_id):
+        if self.config.single_asset:
+            sp.verify(token_id == 0, "single-asset: token-id <> 0")
+        if self.config.support_operator:
+                  sp.verify(
+                      (self.is_administrator(sp.sender)) |
+                      (from_ == sp.sender) |
+                      self.operator_set.is_member(self.data.operators,
+                                                  from_,
+                                                  sp.sender,
+                                                  token_id),
+                      message = self.error_message.not_operator())
+        else:
+                  sp.verify(
+                      (self.is_administrator(sp.sender)) |
+                      (from_ == sp.sender),
+                      message = self.error_message.not_owner())
+        sp.verify(self.data.token_metadata.contains(token_id),
+                  message = self.error_message.token_undefined())
+
+    # Write the sender's balance of the current group back, if it moved.
+    # Entries that drop to zero are deleted: `balance_of` and the
+    # transfer checks already read a missing key as a zero balance.
+    def end_group(self, from_, group, available, debited):
+        sp.if debited.value > 0:
+            from_user = self.ledger_key.make(from_, group.value.open_some())
+            sp.if available.value == 0:
+                del self.data.ledger[from_user]
+            sp.else:
+                self.data.ledger[from_user].balance = available.value
+        group.value = sp.none
+        debited.value = 0
+
     @sp.entry_point
     def balance_of(self, params):
         # paused may mean that balances are meaningless:
@@ -562,6 +594,23 @@ class FA2_mint(FA2_core):
     def mint(self, params):
         sp.verify(self.is_administrator(sp.sender))
         # We don't check for pauseness because we're the admin.
+        self.mint_token(params)
+
+    ## `mint_batch` mints a list of `mint` parameters with a single
+    ## administrator check. Only new deployments have it: the v1 minter
+    ## calls `mint` once per OBJKT, which the deployed OBJKT FA2 supports.
+    @sp.entry_point
+    def mint_batch(self, params):
+        sp.set_type(params, sp.TList(sp.TRecord(
+            address = sp.TAddress,
+            amount = sp.TNat,
+            token_id = token_id_type,
+            token_info = sp.TMap(sp.TString, sp.TBytes))))
+        sp.verify(self.is_administrator(sp.sender))
+        sp.for e in params:
+            self.mint_token(e)
+
+    def mint_token(self, params):
         if self.config.single_asset:
             sp.verify(params.token_id == 0, "single-asset: token-id <> 0")
         if self.config.non_fungible:
@@ -19,13 +19,13 @@ class OBJKTSwap(sp.Contract):
             locked = False
             )
     
-    @sp.entry_point
+    @sp.entry_point(lazify = True)
     def genesis(self):
         sp.verify((sp.sender == self.data.manager) & ~(self.data.locked))
         self.data.genesis = (sp.now).add_days(45)
         self.data.locked = True
     
-    @sp.entry_point
+    @sp.entry_point(lazify = True)
     def update_manager(self, params):
         sp.verify(sp.sender == self.data.manager)
         self.data.manager = params
@@ -39,45 +39,58 @@ class OBJKTSwap(sp.Contract):
     
     @sp.entry_point
     def cancel_swap(self, params):
-        sp.verify( (self.data.swaps[params].issuer == sp.sender) )
-        self.fa2_transfer(self.data.objkt, sp.to_address(sp.self), sp.sender, self.data.swaps[params].objkt_id, self.data.swaps[params].objkt_amount)
+        swap = sp.local('swap', self.data.swaps[params])
+        sp.verify( (swap.value.issuer == sp.sender) )
+        self.fa2_transfer(self.data.objkt, sp.to_address(sp.self), sp.sender, swap.value.objkt_id, swap.value.objkt_amount)
         
         del self.data.swaps[params]
         
     @sp.entry_point
     def collect(self, params):
-        sp.verify( (params.objkt_amount > 0) & (sp.sender != self.data.swaps[params.swap_id].issuer) )
+        # the swap is read from the big_map once and written back once
+        swap = sp.local('swap', self.data.swaps[params.swap_id])
         
-        sp.if (self.data.swaps[params.swap_id].xtz_per_objkt != sp.tez(0)):
+        sp.verify( (params.objkt_amount > 0) & (sp.sender != swap.value.issuer) )
         
-            self.objkt_amount = sp.fst(sp.ediv(sp.amount, self.data.swaps[params.swap_id].xtz_per_objkt).open_some())
+        sp.if (swap.value.xtz_per_objkt != sp.tez(0)):
+        
+            self.objkt_amount = sp.fst(sp.ediv(sp.amount, swap.value.xtz_per_objkt).open_some())
             
-            self.amount = self.objkt_amount * sp.fst(sp.ediv(self.data.swaps[params.swap_id].xtz_per_objkt, sp.mutez(1)).open_some())
+            self.amount = self.objkt_amount * sp.fst(sp.ediv(swap.value.xtz_per_objkt, sp.mutez(1)).open_some())
             
             sp.verify((params.objkt_amount == self.objkt_amount) & (sp.amount == sp.utils.nat_to_mutez(self.amount)) & (sp.amount > sp.tez(0)))
+            
+            royalties = sp.local('royalties', self.data.royalties[swap.value.objkt_id])
+            
             # calculate fees and royalties
-            self.fee = sp.fst(sp.ediv(sp.utils.nat_to_mutez(self.amount), sp.utils.nat_to_mutez(1)).open_some()) * (self.data.royalties[self.data.swaps[params.swap_id].objkt_id].royalties + 25) / 1000
-            self.royalties = self.data.royalties[self.data.swaps[params.swap_id].objkt_id].royalties * self.fee / (self.data.royalties[self.data.swaps[params.swap_id].objkt_id].royalties + 25)
+            self.fee, self.royalties = self.split(sp.fst(sp.ediv(sp.utils.nat_to_mutez(self.amount), sp.utils.nat_to_mutez(1)).open_some()), royalties.value.royalties)
+            
+            payouts = sp.local('payouts', sp.map(tkey=sp.TAddress, tvalue=sp.TMutez))
+            
+            # royalties to NFT creator
+            self.add_payout(payouts.value, royalties.value.issuer, sp.utils.nat_to_mutez(self.royalties))
             
-            # send royalties to NFT creator
-            sp.send(self.data.royalties[self.data.swaps[params.swap_id].objkt_id].issuer, sp.utils.nat_to_mutez(self.royalties))
+            # management fees
+            self.add_payout(payouts.value, self.data.manager, sp.utils.nat_to_mutez(abs(self.fee - self.royalties)))
             
-            # send management fees
-            sp.send(self.data.manager, sp.utils.nat_to_mutez(abs(self.fee - self.royalties)))
+            # value to issuer
+            self.add_payout(payouts.value, swap.value.issuer, sp.amount - sp.utils.nat_to_mutez(self.fee))
             
-            # send value to issuer
-            sp.send(self.data.swaps[params.swap_id].issuer, sp.amount - sp.utils.nat_to_mutez(self.fee))
+            # one transfer per distinct recipient
+            self.send_payouts(payouts.value)
             
             # off on test scenarios
             # sp.if (sp.now < self.data.genesis):
             #self.mint_hDAO([sp.record(to_=sp.sender, amount=self.amount / 2), sp.record(to_=self.data.swaps[params.swap_id].issuer, amount=self.amount / 2), sp.record(to_=self.data.manager, amount=abs(self.fee - self.royalties))])
         
-        self.fa2_transfer(self.data.objkt, sp.to_address(sp.self), sp.sender, self.data.swaps[params.swap_id].objkt_id, params.objkt_amount)
+        self.fa2_transfer(self.data.objkt, sp.to_address(sp.self), sp.sender, swap.value.objkt_id, params.objkt_amount)
 
-        self.data.swaps[params.swap_id].objkt_amount = abs(self.data.swaps[params.swap_id].objkt_amount - params.objkt_amount)
+        swap.value.objkt_amount = abs(swap.value.objkt_amount - params.objkt_amount)
         
-        sp.if (self.data.swaps[params.swap_id].objkt_amount == 0):
+        sp.if (swap.value.objkt_amount == 0):
             del self.data.swaps[params.swap_id]
+        sp.else:
+            self.data.swaps[params.swap_id] = swap.value
     
     @sp.entry_point
     def mint_OBJKT(self, params):
@@ -106,6 +119,40 @@ class OBJKTSwap(sp.Contract):
         self.data.royalties[self.data.objkt_id] = sp.record(issuer=sp.sender, royalties=params.royalties)
         self.data.objkt_id += 1
     
+    @sp.entry_point
+    def mint_batch(self, params):
+        sp.set_type(params, sp.TList(sp.TRecord(address=sp.TAddress, amount=sp.TNat, metadata=sp.TBytes, royalties=sp.TNat)))
+        
+        # one FA2 mint per item, in the order of params (consecutive
+        # objkt_ids): the deployed OBJKT FA2 has no mint_batch and cannot be
+        # replaced, as the minter is its administrator
+        c = sp.contract(
+            self.mint_type(),
+            self.data.objkt,
+            entry_point = "mint").open_some()
+        
+        sp.for e in params:
+            sp.verify((e.amount > 0) & ((e.royalties >= 0) & (e.royalties <= 250)) & (e.amount <= 10000))
+            sp.transfer(
+                sp.record(
+                address=e.address,
+                amount=e.amount,
+                token_id=self.data.objkt_id,
+                token_info={ '' : e.metadata }
+                ),
+                sp.mutez(0),
+                c)
+            self.data.royalties[self.data.objkt_id] = sp.record(issuer=sp.sender, royalties=e.royalties)
+            self.data.objkt_id += 1
+    
+    def mint_type(self):
+        return sp.TRecord(
+            address=sp.TAddress,
+            amount=sp.TNat,
+            token_id=sp.TNat,
+            token_info=sp.TMap(sp.TString, sp.TBytes)
+            )
+    
     @sp.entry_point
     def curate(self, params):
         self.fa2_transfer(self.data.hdao, sp.sender, self.data.curate, 0, params.hDAO_amount)
@@ -130,6 +177,43 @@ class OBJKTSwap(sp.Contract):
                 c
             )
             
+    @sp.onchain_view()
+    def get_swap(self, params):
+        sp.set_type(params, sp.TNat)
+        sp.result(self.data.swaps[params])
+    
+    @sp.onchain_view()
+    def quote(self, params):
+        # price, royalties, management fee and issuer share exactly as collect pays them
+        sp.set_type(params, sp.TRecord(swap_id=sp.TNat, objkt_amount=sp.TNat))
+        amount = sp.local('amount', params.objkt_amount * sp.fst(sp.ediv(self.data.swaps[params.swap_id].xtz_per_objkt, sp.mutez(1)).open_some()))
+        fee = sp.local('fee', sp.nat(0))
+        royalties = sp.local('royalties', sp.nat(0))
+        sp.if (amount.value != 0):
+            fee.value, royalties.value = self.split(amount.value, self.data.royalties[self.data.swaps[params.swap_id].objkt_id].royalties)
+        sp.result(sp.record(price=sp.utils.nat_to_mutez(amount.value), royalties=sp.utils.nat_to_mutez(royalties.value), fee=sp.utils.nat_to_mutez(abs(fee.value - royalties.value)), seller=sp.utils.nat_to_mutez(abs(amount.value - fee.value))))
+    
+    @sp.onchain_view()
+    def get_counter(self):
+        sp.result(self.data.swap_id)
+    
+    def split(self, amount, royalties):
+        # total fee and creator royalties (in mutez) taken from an amount of mutez, the management fee is 2.5%
+        fee = amount * (royalties + 25) / 1000
+        return (fee, royalties * fee / (royalties + 25))
+    
+    def add_payout(self, payouts, recipient, value):
+        # merges payouts per recipient, zero values are dropped
+        sp.if (value != sp.mutez(0)):
+            sp.if payouts.contains(recipient):
+                payouts[recipient] += value
+            sp.else:
+                payouts[recipient] = value
+    
+    def send_payouts(self, payouts):
+        sp.for payout in payouts.items():
+            sp.send(payout.key, payout.value)
+    
     def mint_hDAO(self, params):
         
         c = sp.contract(
@@ -6,7 +6,10 @@ class Marketplace(sp.Contract):
             manager = manager,
             swaps = sp.big_map(tkey=sp.TNat, tvalue=sp.TRecord(issuer=sp.TAddress, objkt_amount=sp.TNat, objkt_id=sp.TNat, xtz_per_objkt=sp.TMutez, royalties=sp.TNat, creator=sp.TAddress)),
             counter = 500000,
-            fee = fee
+            fee = fee,
+            offers = sp.big_map(tkey=sp.TNat, tvalue=sp.TRecord(buyer=sp.TAddress, objkt_amount=sp.TNat, objkt_id=sp.TNat, xtz_per_objkt=sp.TMutez)),
+            offer_book = sp.big_map(tkey=sp.TNat, tvalue=self.levels_type()),
+            offer_counter = 0
             )
             
     @sp.entry_point
@@ -16,49 +19,286 @@ class Marketplace(sp.Contract):
         self.data.swaps[self.data.counter] = sp.record(issuer=sp.sender, objkt_amount=params.objkt_amount, objkt_id=params.objkt_id, xtz_per_objkt=params.xtz_per_objkt, royalties=params.royalties, creator=params.creator)
         self.data.counter += 1
     
+    @sp.entry_point
+    def swap_batch(self, params):
+        txs = sp.local('txs', sp.list(t=self.tx_type()))
+        sp.for item in params:
+            sp.verify((item.objkt_amount > 0) & ((item.royalties >= 0) & (item.royalties <= 250)))
+            txs.value.push(sp.record(amount=item.objkt_amount, to_=sp.self_address, token_id=item.objkt_id))
+            self.data.swaps[self.data.counter] = sp.record(issuer=sp.sender, objkt_amount=item.objkt_amount, objkt_id=item.objkt_id, xtz_per_objkt=item.xtz_per_objkt, royalties=item.royalties, creator=item.creator)
+            self.data.counter += 1
+        self.fa2_transfer_batch(self.data.objkt, sp.sender, txs.value)
+    
     @sp.entry_point
     def collect(self, params):
+        # the swap is read from the big_map once and written back once
+        swap = sp.local('swap', self.data.swaps[params.swap_id])
+        
         sp.verify(
-            # verifies if tez amount is equal to price per objkt
-            (sp.amount == sp.utils.nat_to_mutez(sp.fst(sp.ediv(self.data.swaps[params.swap_id].xtz_per_objkt, sp.mutez(1)).open_some()))) & (self.data.swaps[params.swap_id].objkt_amount != 0))
+            # verifies if tez amount is equal to price per objkt times the amount of objkts
+            (sp.amount == sp.utils.nat_to_mutez(params.objkt_amount * sp.fst(sp.ediv(swap.value.xtz_per_objkt, sp.mutez(1)).open_some()))) & (params.objkt_amount > 0) & (swap.value.objkt_amount >= params.objkt_amount))
 
-        sp.if (self.data.swaps[params.swap_id].xtz_per_objkt != sp.tez(0)):
+        sp.if (swap.value.xtz_per_objkt != sp.tez(0)):
 
-            self.amount = sp.fst(sp.ediv(self.data.swaps[params.swap_id].xtz_per_objkt, sp.mutez(1)).open_some())
+            self.amount = params.objkt_amount * sp.fst(sp.ediv(swap.value.xtz_per_objkt, sp.mutez(1)).open_some())
                 
             # calculate fees and royalties
-            self.fee = self.amount * (self.data.swaps[params.swap_id].royalties + self.data.fee) / 1000
-            self.royalties = self.data.swaps[params.swap_id].royalties * self.fee / (self.data.swaps[params.swap_id].royalties + self.data.fee)
+            self.fee, self.royalties = self.split(self.amount, swap.value.royalties)
+            
+            payouts = sp.local('payouts', sp.map(tkey=sp.TAddress, tvalue=sp.TMutez))
             
-            # send royalties to NFT creator
-            sp.send(self.data.swaps[params.swap_id].creator, sp.utils.nat_to_mutez(self.royalties))
+            # royalties to NFT creator
+            self.add_payout(payouts.value, swap.value.creator, sp.utils.nat_to_mutez(self.royalties))
                 
-            # send management fees
-            sp.send(self.data.manager, sp.utils.nat_to_mutez(abs(self.fee - self.royalties)))
+            # management fees
+            self.add_payout(payouts.value, self.data.manager, sp.utils.nat_to_mutez(abs(self.fee - self.royalties)))
                 
-            # send value to issuer
-            sp.send(self.data.swaps[params.swap_id].issuer, sp.amount - sp.utils.nat_to_mutez(self.fee))
+            # value to issuer
+            self.add_payout(payouts.value, swap.value.issuer, sp.amount - sp.utils.nat_to_mutez(self.fee))
+            
+            # one transfer per distinct recipient
+            self.send_payouts(payouts.value)
+        
+        self.fa2_transfer(self.data.objkt, sp.self_address, sp.sender, swap.value.objkt_id, params.objkt_amount)
         
-        self.data.swaps[params.swap_id].objkt_amount = sp.as_nat(self.data.swaps[params.swap_id].objkt_amount - 1)
+        swap.value.objkt_amount = sp.as_nat(swap.value.objkt_amount - params.objkt_amount)
         
-        self.fa2_transfer(self.data.objkt, sp.self_address, sp.sender, self.data.swaps[params.swap_id].objkt_id, 1)
+        # sold out swaps are removed from storage
+        self.store_swap(params.swap_id, swap.value)
+    
+    @sp.entry_point
+    def collect_batch(self, params):
+        sp.set_type(params, sp.TList(sp.TRecord(swap_id=sp.TNat, objkt_amount=sp.TNat)))
+        
+        total = sp.local('total', sp.mutez(0))
+        payouts = sp.local('payouts', sp.map(tkey=sp.TAddress, tvalue=sp.TMutez))
+        txs = sp.local('txs', sp.list(t=self.tx_type()))
+        
+        sp.for item in params:
+            swap = sp.local('swap', self.data.swaps[item.swap_id])
+            
+            sp.verify((item.objkt_amount > 0) & (swap.value.objkt_amount >= item.objkt_amount))
+            
+            sp.if (swap.value.xtz_per_objkt != sp.tez(0)):
+                
+                amount = sp.local('amount', item.objkt_amount * sp.fst(sp.ediv(swap.value.xtz_per_objkt, sp.mutez(1)).open_some()))
+                
+                # calculate fees and royalties
+                fee, royalties = self.split(amount.value, swap.value.royalties)
+                
+                self.add_payout(payouts.value, swap.value.creator, sp.utils.nat_to_mutez(royalties))
+                self.add_payout(payouts.value, self.data.manager, sp.utils.nat_to_mutez(abs(fee - royalties)))
+                self.add_payout(payouts.value, swap.value.issuer, sp.utils.nat_to_mutez(abs(amount.value - fee)))
+                
+                total.value += sp.utils.nat_to_mutez(amount.value)
+            
+            txs.value.push(sp.record(amount=item.objkt_amount, to_=sp.sender, token_id=swap.value.objkt_id))
+            
+            swap.value.objkt_amount = sp.as_nat(swap.value.objkt_amount - item.objkt_amount)
+            
+            self.store_swap(item.swap_id, swap.value)
+        
+        # verifies if tez amount is equal to the price of the whole batch
+        sp.verify(sp.amount == total.value)
+        
+        self.send_payouts(payouts.value)
+        
+        self.fa2_transfer_batch(self.data.objkt, sp.self_address, txs.value)
     
     @sp.entry_point
     def cancel_swap(self, params):
-        sp.verify((sp.sender == self.data.swaps[params].issuer) & (self.data.swaps[params].objkt_amount != 0))
-        self.fa2_transfer(self.data.objkt, sp.self_address, sp.sender, self.data.swaps[params].objkt_id, self.data.swaps[params].objkt_amount)
+        swap = sp.local('swap', self.data.swaps[params])
+        sp.verify((sp.sender == swap.value.issuer) & (swap.value.objkt_amount != 0))
+        self.fa2_transfer(self.data.objkt, sp.self_address, sp.sender, swap.value.objkt_id, swap.value.objkt_amount)
         del self.data.swaps[params]
     
     @sp.entry_point
+    def cancel_swap_batch(self, params):
+        sp.set_type(params, sp.TList(sp.TNat))
+        txs = sp.local('txs', sp.list(t=self.tx_type()))
+        sp.for swap_id in params:
+            swap = sp.local('swap', self.data.swaps[swap_id])
+            sp.verify((sp.sender == swap.value.issuer) & (swap.value.objkt_amount != 0))
+            txs.value.push(sp.record(amount=swap.value.objkt_amount, to_=sp.sender, token_id=swap.value.objkt_id))
+            del self.data.swaps[swap_id]
+        self.fa2_transfer_batch(self.data.objkt, sp.self_address, txs.value)
+    
+    @sp.entry_point
+    def make_offer(self, params):
+        # a bid for objkt_amount editions, the tez held in escrow until it is
+        # accepted or cancelled
+        sp.set_type(params, sp.TRecord(objkt_id=sp.TNat, objkt_amount=sp.TNat, xtz_per_objkt=sp.TMutez))
+        sp.verify((params.objkt_amount > 0) & (params.xtz_per_objkt > sp.mutez(0)))
+        sp.verify(sp.amount == sp.utils.nat_to_mutez(params.objkt_amount * sp.fst(sp.ediv(params.xtz_per_objkt, sp.mutez(1)).open_some())))
+        self.data.offers[self.data.offer_counter] = sp.record(buyer=sp.sender, objkt_amount=params.objkt_amount, objkt_id=params.objkt_id, xtz_per_objkt=params.xtz_per_objkt)
+        self.index_offer(self.data.offer_counter, params)
+        self.data.offer_counter += 1
+    
+    @sp.entry_point
+    def cancel_offer(self, params):
+        sp.set_type(params, sp.TNat)
+        offer = sp.local('offer', self.data.offers[params])
+        sp.verify(sp.sender == offer.value.buyer)
+        self.unindex_offer(params, offer.value)
+        del self.data.offers[params]
+        sp.send(offer.value.buyer, sp.utils.nat_to_mutez(offer.value.objkt_amount * sp.fst(sp.ediv(offer.value.xtz_per_objkt, sp.mutez(1)).open_some())))
+    
+    @sp.entry_point
+    def accept_offer(self, params):
+        # sells objkt_amount editions to the highest offer on an objkt, the
+        # oldest one at equal prices; min_payout, what the seller receives
+        # after royalties and fees, guards against the best offer changing
+        # before the call is included. The editions are transferred from the
+        # seller, who must have made this contract an operator of the objkt
+        # (update_operators in the same batch).
+        # creator and royalties are declared by the seller and checked as in
+        # swap: the deployed minter has no views, so the royalties it records
+        # cannot be read on chain. As for swaps, the dapp fills them in from
+        # the minter's royalties big_map and indexers can spot a sale that
+        # underpays the creator; the buyer pays the offered price either way
+        sp.set_type(params, sp.TRecord(objkt_id=sp.TNat, objkt_amount=sp.TNat, min_payout=sp.TMutez, creator=sp.TAddress, royalties=sp.TNat))
+        sp.verify((params.objkt_amount > 0) & ((params.royalties >= 0) & (params.royalties <= 250)))
+        
+        levels = sp.local('levels', self.data.offer_book[params.objkt_id])
+        best = sp.local('best', sp.mutez(0))
+        # price levels are iterated in increasing order, the last one is the best
+        sp.for level in levels.value.items():
+            best.value = level.key
+        
+        offer_id = sp.local('offer_id', sp.nat(0))
+        found = sp.local('found', False)
+        sp.for candidate in levels.value[best.value].elements():
+            sp.if ~found.value:
+                offer_id.value = candidate
+                found.value = True
+        
+        offer = sp.local('offer', self.data.offers[offer_id.value])
+        sp.verify(offer.value.objkt_amount >= params.objkt_amount)
+        
+        # the holder sends the editions straight to the buyer
+        self.fa2_transfer(self.data.objkt, sp.sender, offer.value.buyer, params.objkt_id, params.objkt_amount)
+        
+        amount = sp.local('amount', params.objkt_amount * sp.fst(sp.ediv(offer.value.xtz_per_objkt, sp.mutez(1)).open_some()))
+        fee, royalties = self.split(amount.value, params.royalties)
+        payout = sp.local('payout', sp.utils.nat_to_mutez(abs(amount.value - fee)))
+        sp.verify(payout.value >= params.min_payout)
+        payouts = sp.local('payouts', sp.map(tkey=sp.TAddress, tvalue=sp.TMutez))
+        self.add_payout(payouts.value, params.creator, sp.utils.nat_to_mutez(royalties))
+        self.add_payout(payouts.value, self.data.manager, sp.utils.nat_to_mutez(abs(fee - royalties)))
+        self.add_payout(payouts.value, sp.sender, payout.value)
+        self.send_payouts(payouts.value)
+        
+        offer.value.objkt_amount = sp.as_nat(offer.value.objkt_amount - params.objkt_amount)
+        sp.if (offer.value.objkt_amount == 0):
+            self.unindex_offer(offer_id.value, offer.value)
+            del self.data.offers[offer_id.value]
+        sp.else:
+            self.data.offers[offer_id.value] = offer.value
+    
+    @sp.entry_point
+    def purge(self, params):
+        # permissionless removal of swaps sold out before they were deleted on collect
+        sp.set_type(params, sp.TList(sp.TNat))
+        sp.for swap_id in params:
+            sp.verify(self.data.swaps[swap_id].objkt_amount == 0)
+            del self.data.swaps[swap_id]
+    
+    @sp.entry_point(lazify = True)
     def update_fee(self, params):
         sp.verify(sp.sender == self.data.manager)
         self.data.fee = params
         
-    @sp.entry_point
+    @sp.entry_point(lazify = True)
     def update_manager(self, params):
         sp.verify(sp.sender == self.data.manager)
         self.data.manager = params
         
+    @sp.onchain_view()
+    def get_swap(self, params):
+        sp.set_type(params, sp.TNat)
+        sp.result(self.data.swaps[params])
+    
+    @sp.onchain_view()
+    def quote(self, params):
+        # price, royalties, management fee and issuer share exactly as collect pays them
+        sp.set_type(params, sp.TRecord(swap_id=sp.TNat, objkt_amount=sp.TNat))
+        amount = sp.local('amount', params.objkt_amount * sp.fst(sp.ediv(self.data.swaps[params.swap_id].xtz_per_objkt, sp.mutez(1)).open_some()))
+        fee = sp.local('fee', sp.nat(0))
+        royalties = sp.local('royalties', sp.nat(0))
+        sp.if (amount.value != 0):
+            fee.value, royalties.value = self.split(amount.value, self.data.swaps[params.swap_id].royalties)
+        sp.result(sp.record(price=sp.utils.nat_to_mutez(amount.value), royalties=sp.utils.nat_to_mutez(royalties.value), fee=sp.utils.nat_to_mutez(abs(fee.value - royalties.value)), seller=sp.utils.nat_to_mutez(abs(amount.value - fee.value))))
+    
+    @sp.onchain_view()
+    def get_counter(self):
+        sp.result(self.data.counter)
+    
+    @sp.onchain_view()
+    def get_offer(self, params):
+        sp.set_type(params, sp.TNat)
+        sp.result(self.data.offers[params])
+    
+    @sp.onchain_view()
+    def get_offers(self, params):
+        # open offers on an objkt: offer ids by xtz_per_objkt
+        sp.set_type(params, sp.TNat)
+        sp.result(self.data.offer_book.get(params, sp.map(tkey=sp.TMutez, tvalue=sp.TSet(sp.TNat))))
+    
+    def levels_type(self):
+        return sp.TMap(sp.TMutez, sp.TSet(sp.TNat))
+    
+    def index_offer(self, offer_id, offer):
+        # adds an offer to the price level of its objkt
+        levels = sp.local('levels', self.data.offer_book.get(offer.objkt_id, sp.map(tkey=sp.TMutez, tvalue=sp.TSet(sp.TNat))))
+        ids = sp.local('ids', levels.value.get(offer.xtz_per_objkt, sp.set(t=sp.TNat)))
+        ids.value.add(offer_id)
+        levels.value[offer.xtz_per_objkt] = ids.value
+        self.data.offer_book[offer.objkt_id] = levels.value
+    
+    def unindex_offer(self, offer_id, offer):
+        levels = sp.local('levels', self.data.offer_book[offer.objkt_id])
+        ids = sp.local('ids', levels.value[offer.xtz_per_objkt])
+        ids.value.remove(offer_id)
+        sp.if (sp.len(ids.value) == 0):
+            del levels.value[offer.xtz_per_objkt]
+        sp.else:
+            levels.value[offer.xtz_per_objkt] = ids.value
+        # objkts without offers left are removed from the book
+        sp.if (sp.len(levels.value) == 0):
+            del self.data.offer_book[offer.objkt_id]
+        sp.else:
+            self.data.offer_book[offer.objkt_id] = levels.value
+    
+    def store_swap(self, swap_id, swap):
+        # writes a collected swap back, sold out swaps are removed from storage
+        sp.if (swap.objkt_amount == 0):
+            del self.data.swaps[swap_id]
+        sp.else:
+            self.data.swaps[swap_id] = swap
+    
+    def split(self, amount, royalties):
+        # total fee and creator royalties (in mutez) taken from an amount of mutez
+        fee = amount * (royalties + self.data.fee) / 1000
+        return (fee, royalties * fee / (royalties + self.data.fee))
+    
+    def add_payout(self, payouts, recipient, value):
+        # merges payouts per recipient, zero values are dropped
+        sp.if (value != sp.mutez(0)):
+            sp.if payouts.contains(recipient):
+                payouts[recipient] += value
+            sp.else:
+                payouts[recipient] = value
+    
+    def send_payouts(self, payouts):
+        sp.for payout in payouts.items():
+            sp.send(payout.key, payout.value)
+    
+    def tx_type(self):
+        return sp.TRecord(amount=sp.TNat, to_=sp.TAddress, token_id=sp.TNat).layout(("to_", ("token_id", "amount")))
+        
     def fa2_transfer(self, fa2, from_, to_, objkt_id, objkt_amount):
-        c = sp.contract(sp.TList(sp.TRecord(from_=sp.TAddress, txs=sp.TList(sp.TRecord(amount=sp.TNat, to_=sp.TAddress, token_id=sp.TNat).layout(("to_", ("token_id", "amount")))))), fa2, entry_point='transfer').open_some()
-        sp.transfer(sp.list([sp.record(from_=from_, txs=sp.list([sp.record(amount=objkt_amount, to_=to_, token_id=objkt_id)]))]), sp.mutez(0), c)
\ No newline at end of file
+        self.fa2_transfer_batch(fa2, from_, sp.list([sp.record(amount=objkt_amount, to_=to_, token_id=objkt_id)]))
+    
+    def fa2_transfer_batch(self, fa2, from_, txs):
+        c = sp.contract(sp.TList(sp.TRecord(from_=sp.TAddress, txs=sp.TList(self.tx_type()))), fa2, entry_point='transfer').open_some()
+        sp.transfer(sp.list([sp.record(from_=from_, txs=txs)]), sp.mutez(0), c)
\ No newline at end of file
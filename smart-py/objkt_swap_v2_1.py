@@ -5,16 +5,18 @@ class OBJKTSWAPV21(sp.Contract):
             metadata = metadata,
             objkts = objkts,
             swaps = sp.big_map(tkey=sp.TNat, tvalue=sp.TRecord(token_per_objkt=sp.TNat, objkt_amount=sp.TNat, objkt_id=sp.TNat, issuer=sp.TAddress, creator=sp.TAddress, royalties=sp.TNat, contract=sp.TAddress, token_id=sp.TNat)),
+            prices = sp.big_map(tkey=self.book_key_type(), tvalue=sp.TSet(sp.TNat)),
+            book = sp.big_map(tkey=self.level_key_type(), tvalue=sp.TSet(sp.TNat)),
             counter = 0,
             fee = 25
             )
     
-    @sp.entry_point
+    @sp.entry_point(lazify = True)
     def update_manager(self, params):
         sp.verify(sp.sender == self.data.manager)
         self.data.manager = params
 
-    @sp.entry_point
+    @sp.entry_point(lazify = True)
     def update_fee(self, params):
         sp.verify(sp.sender == self.data.manager)
         self.data.fee = params
@@ -22,37 +24,213 @@ class OBJKTSWAPV21(sp.Contract):
     @sp.entry_point
     def swap(self, params):
         sp.verify((params.royalties >= 0) & (params.royalties <= 250))
+        sp.verify(params.objkt_amount > 0)
         self.data.swaps[self.data.counter] = sp.record(token_per_objkt=params.token_per_objkt, objkt_amount=params.objkt_amount, objkt_id=params.objkt_id, issuer=sp.sender, creator=params.creator, royalties=params.royalties, contract=params.contract, token_id=params.token_id)
+        self.index_swap(self.data.counter, params)
         self.tk_transfer(self.data.objkts, sp.sender, sp.to_address(sp.self), params.objkt_id, params.objkt_amount)
         self.data.counter += 1
 
+    @sp.entry_point
+    def swap_batch(self, params):
+        txs = sp.local('txs', sp.list(t=self.tx_type()))
+        sp.for item in params:
+            sp.verify((item.royalties >= 0) & (item.royalties <= 250))
+            sp.verify(item.objkt_amount > 0)
+            self.data.swaps[self.data.counter] = sp.record(token_per_objkt=item.token_per_objkt, objkt_amount=item.objkt_amount, objkt_id=item.objkt_id, issuer=sp.sender, creator=item.creator, royalties=item.royalties, contract=item.contract, token_id=item.token_id)
+            self.index_swap(self.data.counter, item)
+            txs.value.push(sp.record(amount=item.objkt_amount, to_=sp.to_address(sp.self), token_id=item.objkt_id))
+            self.data.counter += 1
+        self.tk_transfer_batch(self.data.objkts, sp.sender, txs.value)
+
     @sp.entry_point
     def cancel_swap(self, params):
-        sp.verify((sp.sender == self.data.swaps[params.swap_id].issuer))
-        self.tk_transfer(self.data.objkts, sp.to_address(sp.self), self.data.swaps[params.swap_id].issuer, self.data.swaps[params.swap_id].objkt_id, self.data.swaps[params.swap_id].objkt_amount) 
+        swap = sp.local('swap', self.data.swaps[params.swap_id])
+        sp.verify((sp.sender == swap.value.issuer))
+        self.tk_transfer(self.data.objkts, sp.to_address(sp.self), swap.value.issuer, swap.value.objkt_id, swap.value.objkt_amount) 
+        self.unindex_swap(params.swap_id, swap.value)
         del self.data.swaps[params.swap_id]
 
+    @sp.entry_point
+    def cancel_swap_batch(self, params):
+        sp.set_type(params, sp.TList(sp.TNat))
+        txs = sp.local('txs', sp.list(t=self.tx_type()))
+        sp.for swap_id in params:
+            swap = sp.local('swap', self.data.swaps[swap_id])
+            sp.verify((sp.sender == swap.value.issuer))
+            txs.value.push(sp.record(amount=swap.value.objkt_amount, to_=swap.value.issuer, token_id=swap.value.objkt_id))
+            self.unindex_swap(swap_id, swap.value)
+            del self.data.swaps[swap_id]
+        self.tk_transfer_batch(self.data.objkts, sp.to_address(sp.self), txs.value)
+
     @sp.entry_point
     def collect(self, params):
-        sp.verify((self.data.swaps[params.swap_id].objkt_amount > 0))
-        self.tk_transfer(self.data.objkts, sp.to_address(sp.self), sp.sender, self.data.swaps[params.swap_id].objkt_id, 1)
+        # the swap is read from the big_map once and written back once
+        swap = sp.local('swap', self.data.swaps[params.swap_id])
+        
+        sp.verify((params.objkt_amount > 0) & (swap.value.objkt_amount >= params.objkt_amount))
+        self.tk_transfer(self.data.objkts, sp.to_address(sp.self), sp.sender, swap.value.objkt_id, params.objkt_amount)
+        
+        self.amount = swap.value.token_per_objkt * params.objkt_amount
         
         # royalties/fees
-        self.fee = (self.data.swaps[params.swap_id].token_per_objkt * self.data.swaps[params.swap_id].royalties + self.data.fee) / 1000
-        self.royalties = self.data.swaps[params.swap_id].royalties * self.fee / (self.data.swaps[params.swap_id].royalties + self.data.fee)
+        self.fee, self.royalties = self.split(self.amount, params.objkt_amount, swap.value.royalties)
      
         # send royalties to NFT creator
-        self.tk_transfer(self.data.swaps[params.swap_id].contract, sp.sender, self.data.swaps[params.swap_id].creator, self.data.swaps[params.swap_id].token_id, self.royalties)
+        self.tk_transfer(swap.value.contract, sp.sender, swap.value.creator, swap.value.token_id, self.royalties)
                 
         # send management fees
-        self.tk_transfer(self.data.swaps[params.swap_id].contract, sp.sender, self.data.manager, self.data.swaps[params.swap_id].token_id, abs(self.fee - self.royalties))
+        self.tk_transfer(swap.value.contract, sp.sender, self.data.manager, swap.value.token_id, abs(self.fee - self.royalties))
                 
         # send value to issuer
-        self.tk_transfer(self.data.swaps[params.swap_id].contract, sp.sender, self.data.swaps[params.swap_id].issuer, self.data.swaps[params.swap_id].token_id, abs(self.data.swaps[params.swap_id].token_per_objkt - self.fee))
-                
-        self.data.swaps[params.swap_id].objkt_amount = sp.as_nat(self.data.swaps[params.swap_id].objkt_amount - 1)
+        self.tk_transfer(swap.value.contract, sp.sender, swap.value.issuer, swap.value.token_id, abs(self.amount - self.fee))
+        
+        swap.value.objkt_amount = sp.as_nat(swap.value.objkt_amount - params.objkt_amount)
+        self.data.swaps[params.swap_id] = swap.value
+        sp.if (swap.value.objkt_amount == 0):
+            self.unindex_swap(params.swap_id, swap.value)
+
+    @sp.entry_point
+    def collect_best(self, params):
+        # buys objkt_amount editions of an objkt from its cheapest swaps in one
+        # currency, none above max_token_per_objkt, oldest swap first at equal
+        # prices; fails unless the whole amount is filled
+        sp.set_type(params, sp.TRecord(objkt_id=sp.TNat, contract=sp.TAddress, token_id=sp.TNat, objkt_amount=sp.TNat, max_token_per_objkt=sp.TNat))
+        sp.verify(params.objkt_amount > 0)
+
+        key = sp.record(objkt_id=params.objkt_id, contract=params.contract, token_id=params.token_id)
+        prices = sp.local('prices', self.data.prices[key])
+        left = sp.local('left', prices.value)
+        remaining = sp.local('remaining', params.objkt_amount)
+        payouts = sp.local('payouts', sp.map(tkey=sp.TAddress, tvalue=sp.TNat))
+
+        # prices are iterated in increasing order, only the levels that are
+        # filled are read. The loops run over prices and ids, which are never
+        # written: removals go to the copies left and left_ids and writes to
+        # the book, so no set is changed while it is iterated
+        sp.for price in prices.value.elements():
+            sp.if (remaining.value > 0) & (price <= params.max_token_per_objkt):
+                level = sp.local('level', sp.record(objkt_id=params.objkt_id, contract=params.contract, token_id=params.token_id, token_per_objkt=price))
+                ids = sp.local('ids', self.data.book[level.value])
+                left_ids = sp.local('left_ids', ids.value)
+                sp.for swap_id in ids.value.elements():
+                    sp.if (remaining.value > 0):
+                        swap = sp.local('swap', self.data.swaps[swap_id])
+                        fill = sp.local('fill', sp.min(remaining.value, swap.value.objkt_amount))
+                        amount = sp.local('amount', price * fill.value)
+                        fee, royalties = self.split(amount.value, fill.value, swap.value.royalties)
+                        self.add_payout(payouts.value, swap.value.creator, royalties)
+                        self.add_payout(payouts.value, self.data.manager, abs(fee - royalties))
+                        self.add_payout(payouts.value, swap.value.issuer, abs(amount.value - fee))
+                        remaining.value = sp.as_nat(remaining.value - fill.value)
+                        swap.value.objkt_amount = sp.as_nat(swap.value.objkt_amount - fill.value)
+                        self.data.swaps[swap_id] = swap.value
+                        sp.if (swap.value.objkt_amount == 0):
+                            left_ids.value.remove(swap_id)
+                sp.if (sp.len(left_ids.value) == 0):
+                    del self.data.book[level.value]
+                    left.value.remove(price)
+                sp.else:
+                    self.data.book[level.value] = left_ids.value
+
+        sp.verify(remaining.value == 0)
+        self.store_prices(key, left.value)
+
+        # one transfer of the payment token for all payouts, one for the editions
+        txs = sp.local('txs', sp.list(t=self.tx_type()))
+        sp.for payout in payouts.value.items():
+            txs.value.push(sp.record(amount=payout.value, to_=payout.key, token_id=params.token_id))
+        self.tk_transfer_batch(params.contract, sp.sender, txs.value)
+        self.tk_transfer(self.data.objkts, sp.to_address(sp.self), sp.sender, params.objkt_id, params.objkt_amount)
+
+    @sp.onchain_view()
+    def get_swap(self, params):
+        sp.set_type(params, sp.TNat)
+        sp.result(self.data.swaps[params])
+
+    @sp.onchain_view()
+    def quote(self, params):
+        # price, royalties, management fee and issuer share exactly as collect pays them
+        sp.set_type(params, sp.TRecord(swap_id=sp.TNat, objkt_amount=sp.TNat))
+        amount = sp.local('amount', self.data.swaps[params.swap_id].token_per_objkt * params.objkt_amount)
+        fee, royalties = self.split(amount.value, params.objkt_amount, self.data.swaps[params.swap_id].royalties)
+        sp.result(sp.record(price=amount.value, royalties=royalties, fee=abs(fee - royalties), seller=abs(amount.value - fee)))
+
+    @sp.onchain_view()
+    def get_prices(self, params):
+        # prices of the swaps of an objkt in one currency
+        sp.set_type(params, self.book_key_type())
+        sp.result(self.data.prices.get(params, sp.set(t=sp.TNat)))
+
+    @sp.onchain_view()
+    def get_book(self, params):
+        # swap ids of an objkt at one price in one currency
+        sp.set_type(params, self.level_key_type())
+        sp.result(self.data.book.get(params, sp.set(t=sp.TNat)))
+
+    @sp.onchain_view()
+    def get_counter(self):
+        sp.result(self.data.counter)
+
+    def book_key_type(self):
+        return sp.TRecord(objkt_id=sp.TNat, contract=sp.TAddress, token_id=sp.TNat)
+
+    def level_key_type(self):
+        return sp.TRecord(objkt_id=sp.TNat, contract=sp.TAddress, token_id=sp.TNat, token_per_objkt=sp.TNat)
+
+    def index_swap(self, swap_id, swap):
+        # adds a swap to the price level of its objkt and currency
+        key = sp.record(objkt_id=swap.objkt_id, contract=swap.contract, token_id=swap.token_id)
+        prices = sp.local('prices', self.data.prices.get(key, sp.set(t=sp.TNat)))
+        prices.value.add(swap.token_per_objkt)
+        self.data.prices[key] = prices.value
+        level = sp.record(objkt_id=swap.objkt_id, contract=swap.contract, token_id=swap.token_id, token_per_objkt=swap.token_per_objkt)
+        ids = sp.local('ids', self.data.book.get(level, sp.set(t=sp.TNat)))
+        ids.value.add(swap_id)
+        self.data.book[level] = ids.value
+
+    def unindex_swap(self, swap_id, swap):
+        # a no-op for swaps already out of the book (sold out by collect)
+        level = sp.record(objkt_id=swap.objkt_id, contract=swap.contract, token_id=swap.token_id, token_per_objkt=swap.token_per_objkt)
+        ids = sp.local('ids', self.data.book.get(level, sp.set(t=sp.TNat)))
+        ids.value.remove(swap_id)
+        sp.if (sp.len(ids.value) == 0):
+            del self.data.book[level]
+            key = sp.record(objkt_id=swap.objkt_id, contract=swap.contract, token_id=swap.token_id)
+            prices = sp.local('prices', self.data.prices.get(key, sp.set(t=sp.TNat)))
+            prices.value.remove(swap.token_per_objkt)
+            self.store_prices(key, prices.value)
+        sp.else:
+            self.data.book[level] = ids.value
+
+    def store_prices(self, key, prices):
+        # objkts without swaps left are removed from the book
+        sp.if (sp.len(prices) == 0):
+            del self.data.prices[key]
+        sp.else:
+            self.data.prices[key] = prices
+
+    def add_payout(self, payouts, recipient, value):
+        # merges payouts per recipient, zero values are dropped
+        sp.if (value != 0):
+            sp.if payouts.contains(recipient):
+                payouts[recipient] += value
+            sp.else:
+                payouts[recipient] = value
+
+    def split(self, amount, objkt_amount, royalties):
+        # total fee and creator royalties taken from an amount of tokens; the
+        # management fee is data.fee / 1000 tokens per edition, as when the
+        # deployed contract sold one edition per collect
+        fee = (amount * royalties + self.data.fee * objkt_amount) / 1000
+        return (fee, royalties * fee / (royalties + self.data.fee))
+
+    def tx_type(self):
+        return sp.TRecord(amount=sp.TNat, to_=sp.TAddress, token_id=sp.TNat).layout(("to_", ("token_id", "amount")))
 
     def tk_transfer(self, kt, issuer, destination, tk_id, tk_amount):
-        c = sp.contract(sp.TList(sp.TRecord(from_=sp.TAddress, txs=sp.TList(sp.TRecord(amount=sp.TNat, to_=sp.TAddress, token_id=sp.TNat).layout(("to_", ("token_id", "amount")))))), kt, entry_point='transfer').open_some()
-        sp.transfer(sp.list([sp.record(from_=issuer, txs=sp.list([sp.record(amount=tk_amount, to_=destination, token_id=tk_id)]))]), sp.mutez(0), c)
+        self.tk_transfer_batch(kt, issuer, sp.list([sp.record(amount=tk_amount, to_=destination, token_id=tk_id)]))
+
+    def tk_transfer_batch(self, kt, issuer, txs):
+        c = sp.contract(sp.TList(sp.TRecord(from_=sp.TAddress, txs=sp.TList(self.tx_type()))), kt, entry_point='transfer').open_some()
+        sp.transfer(sp.list([sp.record(from_=issuer, txs=txs)]), sp.mutez(0), c)
         
\ No newline at end of file
@@ -0,0 +1,121 @@
+## Off-chain payout math of the swap contracts
+##
+## Reproduces the fee/royalty split performed by `collect` (and returned by
+## the `quote` view) of every marketplace version, with the same nat/mutez
+## truncation as the compiled Michelson:
+##
+## - v1 (`OBJKTSwap`): management fee hardcoded to 25 (2.5%), amounts in mutez.
+## - v2 (`Marketplace`): management fee read from storage, amounts in mutez.
+## - v2.1 (`OBJKTSWAPV21`): amounts in FA2 tokens and a different formula,
+##   `fee = (amount * royalties + fee * objkt_amount) / 1000`: the management
+##   fee is a flat `fee / 1000` tokens per edition, not a share of the price.
+##
+## All values are nats: Michelson `EDIV` on nats truncates, which is what
+## Python's `//` does on non-negative integers. `abs` mirrors `ABS` in the
+## contracts where the subtraction is not checked.
+from collections import namedtuple
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+V1_FEE = 25
+_MAX = None if np is None else np.uint64(np.iinfo(np.uint64).max)
+
+Split = namedtuple("Split", ["price", "royalties", "fee", "seller"])
+
+
+def _check_denominator(royalties, fee):
+    # `collect` fails with a division by zero on `EDIV` in that case
+    if royalties + fee == 0:
+        raise ValueError("royalties + fee is 0, collect would fail")
+
+
+def split_v1(xtz_per_objkt, objkt_amount, royalties):
+    return split_v2(xtz_per_objkt, objkt_amount, royalties, V1_FEE)
+
+
+def split_v2(xtz_per_objkt, objkt_amount, royalties, fee):
+    price = xtz_per_objkt * objkt_amount
+    if price == 0:
+        # free swaps send no payouts at all
+        return Split(0, 0, 0, 0)
+    _check_denominator(royalties, fee)
+    total_fee = price * (royalties + fee) // 1000
+    creator = royalties * total_fee // (royalties + fee)
+    return Split(price, creator, abs(total_fee - creator), abs(price - total_fee))
+
+
+def split_v2_1(token_per_objkt, objkt_amount, royalties, fee):
+    price = token_per_objkt * objkt_amount
+    _check_denominator(royalties, fee)
+    total_fee = (price * royalties + fee * objkt_amount) // 1000
+    creator = royalties * total_fee // (royalties + fee)
+    return Split(price, creator, abs(total_fee - creator), abs(price - total_fee))
+
+
+def split(version, price, objkt_amount, royalties, fee=V1_FEE):
+    if version == "v1":
+        return split_v1(price, objkt_amount, royalties)
+    if version == "v2":
+        return split_v2(price, objkt_amount, royalties, fee)
+    if version == "v2.1":
+        return split_v2_1(price, objkt_amount, royalties, fee)
+    raise KeyError(version)
+
+
+## ## Vectorized pricing
+##
+## `split_many` takes array-likes (or scalars, broadcast with NumPy rules) and
+## returns a `Split` of `uint64` arrays. Intermediate products are computed in
+## `uint64`, which covers any price up to ~1.8e16 mutez with royalties and fee
+## below 1000; larger inputs raise instead of silently wrapping.
+def _uint64(values):
+    values = np.asarray(values)
+    if values.dtype.kind not in "ui":
+        # Python ints above 2**63 come as objects
+        values = values.astype(object)
+    if values.size and (values.min() < 0 or values.max() > _MAX):
+        raise OverflowError("values do not fit in uint64")
+    return values.astype(np.uint64)
+
+
+def _product(a, b, what, plus=0):
+    # a * b + plus, raising where it would wrap around in uint64
+    a, b, plus = np.broadcast_arrays(a, b, np.asarray(plus, dtype=np.uint64))
+    nonzero = b != 0
+    limit = np.zeros(b.shape, dtype=np.uint64)
+    np.floor_divide(_MAX - plus, b, out=limit, where=nonzero)
+    if np.any(nonzero & (a > limit)):
+        raise OverflowError("%s does not fit in uint64" % what)
+    return a * b
+
+
+def split_many(version, price, objkt_amount, royalties, fee=V1_FEE):
+    if np is None:
+        raise ImportError("split_many requires numpy")
+    objkt_amount = _uint64(objkt_amount)
+    price = _product(_uint64(price), objkt_amount, "price * objkt_amount")
+    royalties = _uint64(royalties)
+    fee = _uint64(V1_FEE if version == "v1" else fee)
+    price, objkt_amount, royalties, fee = np.broadcast_arrays(price, objkt_amount, royalties, fee)
+    denominator = royalties + fee
+    if version == "v2.1":
+        flat = _product(fee, objkt_amount, "fee * objkt_amount")
+        _product(price, royalties, "price * royalties", flat)
+        live = np.ones(price.shape, dtype=bool)
+        total_fee = (price * royalties + flat) // 1000
+    elif version in ("v1", "v2"):
+        _product(price, denominator, "price * (royalties + fee)")
+        live = price != 0
+        total_fee = np.where(live, price * denominator // 1000, 0).astype(np.uint64)
+    else:
+        raise KeyError(version)
+    if np.any(live & (denominator == 0)):
+        raise ValueError("royalties + fee is 0, collect would fail")
+    creator = np.zeros(price.shape, dtype=np.uint64)
+    np.floor_divide(_product(total_fee, royalties, "royalties * total fee"), denominator, out=creator, where=live)
+    fee_share = np.where(total_fee >= creator, total_fee - creator, creator - total_fee)
+    seller = np.where(price >= total_fee, price - total_fee, total_fee - price)
+    return Split(np.where(live, price, 0).astype(np.uint64), creator, fee_share.astype(np.uint64), np.where(live, seller, 0).astype(np.uint64))
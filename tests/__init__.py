@@ -0,0 +1,17 @@
+import os
+
+import pytest
+
+from objkt_tools.michelson import entrypoints
+
+
+def requires(instance, *names):
+    """Skip a test when the checked-in artifact of `instance` lacks entry
+    points it covers, or fail it when `$REQUIRE_ENTRYPOINTS` is set, as it
+    should be wherever the artifacts are rebuilt with objkt_tools.build."""
+    missing = [name for name in names if name not in entrypoints(instance.script.parameter)]
+    if missing:
+        message = "the checked-in artifact has no %s, rebuild it with objkt_tools.build" % ", ".join(missing)
+        if os.environ.get("REQUIRE_ENTRYPOINTS"):
+            pytest.fail(message)
+        pytest.skip(message)
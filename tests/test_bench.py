@@ -0,0 +1,29 @@
+import pytest
+
+from objkt_tools import bench
+from objkt_tools.bench import MissingEntrypoints, format_report, main, run
+
+
+@pytest.fixture
+def requires_more(monkeypatch):
+    monkeypatch.setitem(bench.REQUIRES, "v2_1_market", (("marketplace_v2_1", "collect_later"),))
+
+
+def test_missing_entry_points_fail_the_run(requires_more):
+    with pytest.raises(MissingEntrypoints) as e:
+        run(batch_sizes=(1,), scenarios=["v2_1_market"])
+    assert e.value.missing == [("v2_1_market", "marketplace_v2_1", "collect_later")]
+    assert main(["--batch", "1", "--scenario", "v2_1_market"]) == 2
+
+
+def test_allow_missing_reports_what_was_not_measured(requires_more):
+    report = run(batch_sizes=(1,), scenarios=["v2_1_market"], allow_missing=True)
+    assert report["missing"] == [{"scenario": "v2_1_market", "contract": "marketplace_v2_1", "entrypoint": "collect_later"}]
+    assert {r["entrypoint"] for r in report["results"]} == {"swap", "collect", "cancel_swap"}
+    assert "v2_1_market: marketplace_v2_1.collect_later" in format_report(report)
+
+
+def test_scenarios_without_requirements_run():
+    report = run(batch_sizes=(2,), scenarios=["fa2_transfer"])
+    assert report["missing"] == []
+    assert [r["mode"] for r in report["results"]] == ["single", "batch"]
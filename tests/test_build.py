@@ -0,0 +1,107 @@
+import shutil
+import sys
+import textwrap
+
+import pytest
+
+from objkt_tools import build
+from objkt_tools.build import SOURCES, TARGETS, main, target_key
+
+# Stands in for the SmartPy CLI: the compiled "contract" is a hash of the
+# driver and of the sources it loads, every run is logged to $STUB_LOG,
+# $STUB_FAIL makes it fail and $STUB_SALT changes its output.
+STUB = textwrap.dedent("""\
+    #!%s
+    import hashlib, os, re, sys
+    from pathlib import Path
+    if sys.argv[1] == "--version":
+        print("stub 1.0")
+        sys.exit(0)
+    _, _, driver, out = sys.argv
+    text = Path(driver).read_text()
+    with open(os.environ["STUB_LOG"], "a") as log:
+        log.write(driver + "\\n")
+    if os.environ.get("STUB_FAIL"):
+        sys.exit("error: stub failure")
+    h = hashlib.sha256((text + os.environ.get("STUB_SALT", "")).encode())
+    for source in re.findall(r"open\\('([^']*)'\\)", text):
+        h.update(Path(source).read_bytes())
+    out = Path(out, "step_000")
+    out.mkdir(parents=True)
+    (out / "step_000_cont_0_contract.tz").write_text("# %%s\\n" %% h.hexdigest())
+    (out / "step_000_cont_0_storage.tz").write_text("Unit\\n")
+    """) % sys.executable
+
+
+@pytest.fixture
+def cli(tmp_path, monkeypatch):
+    path = tmp_path / "SmartPy.sh"
+    path.write_text(STUB)
+    path.chmod(0o755)
+    monkeypatch.setenv("SMARTPY_CLI", str(path))
+    monkeypatch.setenv("STUB_LOG", str(tmp_path / "log"))
+    (tmp_path / "log").write_text("")
+    return path
+
+
+def runs(tmp_path):
+    return len((tmp_path / "log").read_text().splitlines())
+
+
+def test_key_follows_the_sources_and_the_version(tmp_path):
+    sources = tmp_path / "smart-py"
+    shutil.copytree(SOURCES, sources)
+    key = target_key(TARGETS["curation"], "1.0", sources)
+    # the key does not depend on where the sources are
+    assert key == target_key(TARGETS["curation"], "1.0", SOURCES)
+    assert key != target_key(TARGETS["curation"], "1.1", sources)
+    assert target_key(TARGETS["fa2_objkts"], "1.0", sources) == target_key(TARGETS["fa2_hdao"], "1.0", sources)
+    with open(sources / "curation.py", "a") as f:
+        f.write("\n")
+    assert key != target_key(TARGETS["curation"], "1.0", sources)
+
+
+def test_same_inputs_compile_once_then_come_from_the_cache(tmp_path, cli):
+    out, cache = tmp_path / "out", tmp_path / "cache"
+    results = build.build(["fa2_objkts", "fa2_hdao", "curation"], out, cache)
+    assert [r["status"] for r in results] == ["compiled", "compiled", "compiled"]
+    assert runs(tmp_path) == 2
+    assert (out / "fa2_objkts.tz").read_bytes() == (out / "fa2_hdao.tz").read_bytes()
+    assert (out / "storage" / "curation.tz").read_text() == "Unit\n"
+    results = build.build(["fa2_objkts", "fa2_hdao", "curation"], out, cache)
+    assert [r["status"] for r in results] == ["cached", "cached", "cached"]
+    assert runs(tmp_path) == 2
+
+
+def test_check_fails_on_differences(tmp_path, cli):
+    reference = tmp_path / "reference"
+    reference.mkdir()
+    args = ["curation", "--out", str(tmp_path / "out"), "--cache", str(tmp_path / "cache"), "--reference", str(reference)]
+    assert main(args + ["--check"]) == 1
+    shutil.copy(tmp_path / "out" / "curation.tz", reference)
+    assert main(args + ["--check"]) == 0
+    (reference / "curation.tz").write_text("# edited\n")
+    assert main(args + ["--check"]) == 1
+    assert main(args) == 0
+
+
+def test_rebuild_reports_non_reproducible_outputs(tmp_path, cli, monkeypatch):
+    out, cache = tmp_path / "out", tmp_path / "cache"
+    build.build(["curation"], out, cache)
+    monkeypatch.setenv("STUB_SALT", "1")
+    [result] = build.build(["curation"], out, cache, rebuild=True)
+    assert result["status"] == "differs"
+
+
+def test_failures_and_a_missing_cli(tmp_path, cli, monkeypatch):
+    args = ["curation", "--out", str(tmp_path / "out"), "--cache", str(tmp_path / "cache")]
+    monkeypatch.setenv("STUB_FAIL", "1")
+    [result] = build.build(["curation"], tmp_path / "out", tmp_path / "cache")
+    assert result["status"] == "failed" and "stub failure" in result["error"]
+    assert main(args) == 1
+    monkeypatch.setenv("SMARTPY_CLI", str(tmp_path / "missing"))
+    [result] = build.build(["curation"], tmp_path / "out", tmp_path / "cache")
+    assert result["status"] == "skipped"
+    # nothing was compiled, so nothing was checked
+    assert main(args) == 0
+    assert main(args + ["--check", "--reference", str(tmp_path)]) == 1
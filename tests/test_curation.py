@@ -0,0 +1,80 @@
+import pytest
+
+from objkt_tools.deployment import Deployment, storage_field
+from objkt_tools.michelson import MichelsonFailure, account, to_fields
+
+from . import requires
+
+
+@pytest.fixture
+def d():
+    return Deployment()
+
+
+@pytest.fixture
+def curated(d):
+    artist, curator = account("artist"), account("curator")
+    objkt_ids = [d.mint(artist, 1) for _ in range(3)]
+    d.give_hdao(curator, 100)
+    for objkt_id in objkt_ids:
+        d.call(d.minter, "curate", {"hDAO_amount": 10, "objkt_id": objkt_id}, curator)
+    return artist, objkt_ids
+
+
+def curation_balance(d, objkt_id):
+    curations = storage_field(d.curation, "curations")
+    return to_fields(curations.value_type, curations.get(objkt_id))["hDAO_balance"]
+
+
+def test_claims_are_paid_in_one_transfer(d, curated):
+    requires(d.curation, "claim_hDAO_batch")
+    artist, objkt_ids = curated
+    receipt = d.call(d.curation, "claim_hDAO_batch", [{"objkt_id": objkt_id, "hDAO_amount": 10 - i}
+                                                        for i, objkt_id in enumerate(objkt_ids)], artist)
+    assert receipt.operations == 1
+    assert d.balance(d.hdao, artist, 0) == 27
+    assert [curation_balance(d, objkt_id) for objkt_id in objkt_ids] == [0, 1, 2]
+
+
+def test_claims_are_checked_one_by_one(d, curated):
+    requires(d.curation, "claim_hDAO_batch")
+    artist, objkt_ids = curated
+    with pytest.raises(MichelsonFailure):
+        d.call(d.curation, "claim_hDAO_batch", [{"objkt_id": objkt_ids[0], "hDAO_amount": 1}], account("someone"))
+    # 6 + 6 is more than the 10 curated on the first objkt
+    with pytest.raises(MichelsonFailure):
+        d.call(d.curation, "claim_hDAO_batch", [{"objkt_id": objkt_ids[0], "hDAO_amount": 6},
+                                                {"objkt_id": objkt_ids[0], "hDAO_amount": 6}], artist)
+    assert d.balance(d.hdao, artist, 0) == 0
+    assert curation_balance(d, objkt_ids[0]) == 10
+
+
+def test_curate_batch_adds_to_existing_curations(d, curated):
+    requires(d.curation, "curate_batch")
+    artist, objkt_ids = curated
+    curator = account("voter")
+    d.give_hdao(curator, 100)
+    votes = [{"objkt_id": objkt_id, "hDAO_amount": 5} for objkt_id in objkt_ids]
+    with pytest.raises(MichelsonFailure):
+        d.call(d.curation, "curate_batch", votes, curator)
+    d.add_operator(d.hdao, curator, d.curation.address, 0)
+    receipt = d.call(d.curation, "curate_batch", votes, curator)
+    assert receipt.operations == 1
+    assert d.balance(d.hdao, curator, 0) == 85
+    curations = storage_field(d.curation, "curations")
+    # the issuer recorded by the v1 curation is kept
+    assert to_fields(curations.value_type, curations.get(objkt_ids[1])) == {"hDAO_balance": 15, "issuer": artist}
+
+
+def test_curate_batch_rejects_uncurated_objkts(d, curated):
+    requires(d.curation, "curate_batch")
+    _, objkt_ids = curated
+    curator = account("voter")
+    d.give_hdao(curator, 100)
+    d.add_operator(d.hdao, curator, d.curation.address, 0)
+    uncurated = d.mint(account("other"), 1)
+    with pytest.raises(MichelsonFailure):
+        d.call(d.curation, "curate_batch", [{"objkt_id": objkt_ids[0], "hDAO_amount": 5},
+                                            {"objkt_id": uncurated, "hDAO_amount": 5}], curator)
+    assert d.balance(d.hdao, curator, 0) == 100
+    assert curation_balance(d, objkt_ids[0]) == 10
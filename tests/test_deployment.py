@@ -0,0 +1,40 @@
+import shutil
+
+import pytest
+
+from objkt_tools.deployment import ARTIFACTS, MANAGER, OBJKTS, Deployment, storage_field
+from objkt_tools.michelson import InterpreterError, Lambda, parse
+
+# objkt_swap_v2.tz as SmartPy compiles it with lazy entry points: their code
+# in a big_map without annotation, filled in the initial storage
+LAZY = "(big_map nat (lambda nat nat))"
+
+
+@pytest.fixture
+def artifacts(tmp_path):
+    for path in ARTIFACTS.glob("*.tz"):
+        shutil.copy(path, tmp_path)
+    path = tmp_path / "objkt_swap_v2.tz"
+    lines = path.read_text().splitlines(True)
+    assert lines[1].startswith("storage")
+    lines[1] = "storage   (pair %s %s);\n" % (lines[1][len("storage"):].strip().rstrip(";"), LAZY)
+    path.write_text("".join(lines))
+    return tmp_path
+
+
+def test_fields_without_annotation_need_the_compiled_storage(artifacts):
+    with pytest.raises(InterpreterError):
+        Deployment(artifacts)
+
+
+def test_fields_not_given_come_from_the_compiled_storage(artifacts):
+    (artifacts / "storage").mkdir()
+    (artifacts / "storage" / "objkt_swap_v2.tz").write_text(
+        'Pair (Pair (Pair 0 (Pair 0 "%s")) (Pair {} (Pair "%s" {}))) {Elt 3 {PUSH nat 1; ADD}}' % (MANAGER, OBJKTS))
+    d = Deployment(artifacts)
+    # given fields win over the compiled ones
+    assert storage_field(d.marketplace, "counter") == 500000
+    assert storage_field(d.marketplace, "fee") == 25
+    lazy = d.marketplace.storage[1]
+    assert [k for k, _ in lazy.items()] == [3]
+    assert lazy.get(3) == Lambda(parse("{PUSH nat 1; ADD}"))
@@ -0,0 +1,69 @@
+import pytest
+
+from objkt_tools.deployment import Deployment, storage_field
+from objkt_tools.fa2_keys import FA2_config, Ledger_key, Operator_set, Token_id_set
+from objkt_tools.michelson import Address, account, pack, script_expr_hash
+
+ALICE = "tz1VbvBX7ZzXSWxKwrNXVYW8PATiA6eT58XJ"
+BOB = "tz1UzNodwdCuy77GUUQqNzuSrt7nriFizv1R"
+
+## Reference hashes computed independently with pytezos
+LEDGER = [
+    (FA2_config(), 152, "expruoPqcwMqyK91YVb4h7Dquh7qHaJgidXZsaqpCtKVqyK9eP9KZN"),
+    (FA2_config(), 1000000, "exprvCs5rc6FnvqPcxZ3xjkopGHey5dhQH7bL5XqTQLaDxKzfLWZCt"),
+    (FA2_config(readable=False), 1000000, "exprtwWkBHBwKeWZhWWRdrsxaVpeybTfhdQex7cNHruABPkcFmkaSo"),
+    (FA2_config(single_asset=True), 0, "exprtXysnmkgmgeMCpv4oBF9sQVbtcWJLb3Lm2xne9qbeaZP5gQfCq"),
+    (FA2_config(single_asset=True, readable=False), 0, "expru6USjkVHguWrg8Qyv6buPQXrnTA1ys2jayFTwkR83JeAUxQ2uB"),
+]
+
+
+@pytest.mark.parametrize("config, token_id, expr", LEDGER)
+def test_ledger_key_hash(config, token_id, expr):
+    keys = Ledger_key(config)
+    assert keys.hash(ALICE, token_id) == expr
+    assert keys.hash_many([(ALICE, token_id)]) == [expr]
+    # the fast encoding agrees with PACK of the key the contract builds
+    assert keys.packed(ALICE, token_id) == pack(keys.make(ALICE, token_id))
+    assert script_expr_hash(pack(keys.make(ALICE, token_id))) == expr
+
+
+def test_single_asset_rejects_other_tokens():
+    with pytest.raises(ValueError):
+        Ledger_key(FA2_config(single_asset=True)).packed(ALICE, 1)
+
+
+@pytest.mark.parametrize("readable, expr", [
+    (True, "expruDj3GmvMC5G5dF6zmoDLfZsKRmwk2LmRd7wWkspufzWWnJxDGQ"),
+    (False, "exprurryErkXoHwSoCaGk4DhLL2wBv9apTL4D4Vy3HgdhqsZXecFMY"),
+])
+def test_operator_key_hash(readable, expr):
+    keys = Operator_set(FA2_config(readable=readable))
+    assert keys.hash(ALICE, BOB, 7) == expr
+    assert keys.hash_many([(ALICE, BOB, 7), (BOB, ALICE, 7)])[0] == expr
+    assert keys.packed(ALICE, BOB, 7) == pack(keys.make_key(ALICE, BOB, 7))
+
+
+def test_hash_many_matches_hash():
+    keys = Ledger_key()
+    pairs = [(str(account(i % 7)), i) for i in range(200)]
+    assert keys.hash_many(pairs) == [keys.hash(user, token_id) for user, token_id in pairs]
+
+
+def test_token_id_set():
+    consecutive = Token_id_set()
+    assert consecutive.make([0, 1, 2]) == 3
+    assert consecutive.contains(3, 2) and not consecutive.contains(3, 3)
+    sparse = Token_id_set(FA2_config(assume_consecutive_token_ids=False))
+    assert sparse.contains(sparse.make([5, 9]), 9) and not sparse.contains(sparse.make([5, 9]), 6)
+    assert consecutive.packed([0, 1, 2]) == pack(3)
+
+
+def test_keys_of_the_deployed_ledger():
+    d = Deployment()
+    artist = account("artist")
+    objkt_id = d.mint(artist, 3)
+    ledger = storage_field(d.objkts, "ledger")
+    keys = Ledger_key()
+    hashes = {script_expr_hash(pack(key)) for key, _ in ledger.items()}
+    assert keys.hash(artist, objkt_id) in hashes
+    assert keys.make(artist, objkt_id) == (Address(artist), objkt_id)
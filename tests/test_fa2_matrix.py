@@ -0,0 +1,43 @@
+import pytest
+
+from objkt_tools import fa2_matrix
+from objkt_tools.fa2_matrix import DEFAULTS, FA2_config, cache_key, config_name, matrix
+
+
+def test_options_come_from_fa2_config():
+    assert list(DEFAULTS) == [
+        "debug_mode", "single_asset", "non_fungible", "add_mutez_transfer", "readable", "force_layouts",
+        "support_operator", "assume_consecutive_token_ids", "add_permissions_descriptor",
+        "lazy_entry_points", "lazy_entry_points_multiple"]
+    assert config_name(DEFAULTS) == FA2_config().name == "FA2"
+    with pytest.raises(Exception):
+        FA2_config(lazy_entry_points=True, lazy_entry_points_multiple=True)
+
+
+def test_full_matrix():
+    variants = matrix()
+    # 2 ** 11 combinations, less the 2 ** 9 with both kinds of lazy entry points
+    assert len(variants) == 2 ** 11 - 2 ** 9 == 1536
+    assert not any(v["lazy_entry_points"] and v["lazy_entry_points_multiple"] for v in variants)
+    assert len({config_name(v) for v in variants}) == 1536
+    assert config_name(dict(DEFAULTS, non_fungible=True, readable=False, lazy_entry_points=True)) == "FA2-nft-no_readable-lep"
+
+
+def test_fixed_options():
+    variants = matrix(["single_asset", "non_fungible"], {"debug_mode": True})
+    assert len(variants) == 4
+    assert all(v["debug_mode"] and not v["add_mutez_transfer"] for v in variants)
+
+
+def test_cache_key():
+    options = dict(DEFAULTS)
+    key = cache_key(b"source", options, "1.0")
+    assert key == cache_key(b"source", dict(reversed(list(options.items()))), "1.0")
+    assert key != cache_key(b"source", dict(options, readable=False), "1.0")
+    assert key != cache_key(b"source 2", options, "1.0")
+    assert key != cache_key(b"source", options, "1.1")
+
+
+def test_variants_without_cli_are_skipped(tmp_path):
+    result = fa2_matrix.run_variant((dict(DEFAULTS), "key", None, str(tmp_path)))
+    assert result["status"] == "skipped" and result["name"] == "FA2"
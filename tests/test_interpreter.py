@@ -0,0 +1,120 @@
+import random
+
+import pytest
+
+from objkt_tools.michelson import (
+    Chain, BigMapStore, InterpreterError, MichelsonFailure, account, parse_script,
+)
+
+
+def script(storage, code):
+    return parse_script("parameter unit; storage %s; code %s;" % (storage, code))
+
+
+def test_dip_zero_runs_on_the_whole_stack():
+    chain = Chain()
+    c = chain.originate(script("nat", "{ CDR; PUSH nat 7; DIP 0 { DROP }; PUSH nat 1; ADD; NIL operation; PAIR }"), 1)
+    chain.call(c.address, "default", "Unit", account("a"))
+    assert c.storage == 2
+
+
+def test_dip_n_protects_the_top():
+    chain = Chain()
+    c = chain.originate(script("nat", "{ CDR; PUSH nat 10; PUSH nat 3; DIP 2 { PUSH nat 5; ADD }; DROP 2; NIL operation; PAIR }"), 1)
+    chain.call(c.address, "default", "Unit", account("a"))
+    assert c.storage == 6
+
+
+SEND_BALANCE = """{ DROP; SENDER; CONTRACT unit; IF_NONE { UNIT; FAILWITH } {};
+  BALANCE; UNIT; TRANSFER_TOKENS; NIL operation; SWAP; CONS; BALANCE; SWAP; PAIR }"""
+
+
+def test_balance_is_debited_when_operations_are_applied():
+    chain = Chain()
+    sender = account("a")
+    c = chain.originate(script("mutez", SEND_BALANCE), 0, balance=100)
+    chain.call(c.address, "default", "Unit", sender, 5)
+    # BALANCE still reads the full balance after TRANSFER_TOKENS
+    assert c.storage == 105
+    assert c.balance == 0
+    assert chain.balances[sender] == 105
+
+
+def test_operations_above_the_balance_fail_atomically():
+    double = SEND_BALANCE.replace("CONS;", "CONS; SENDER; CONTRACT unit; IF_NONE { UNIT; FAILWITH } {}; BALANCE; UNIT; TRANSFER_TOKENS; CONS;")
+    chain = Chain()
+    c = chain.originate(script("mutez", double), 0, balance=100)
+    with pytest.raises(InterpreterError):
+        chain.call(c.address, "default", "Unit", account("a"))
+    assert c.balance == 100
+    assert c.storage == 0
+
+
+def test_failwith_leaves_the_contract_untouched():
+    chain = Chain()
+    c = chain.originate(script("nat", "{ CDR; PUSH nat 1; ADD; PUSH string \"no\"; FAILWITH }"), 1)
+    with pytest.raises(MichelsonFailure):
+        chain.call(c.address, "default", "Unit", account("a"))
+    assert c.storage == 1
+
+
+def test_big_map_versions_keep_value_semantics():
+    store = BigMapStore()
+    base = store.get(store.alloc(entries={0: "committed"}))
+    a = base.update(1, "a")
+    b = a.update(2, "b")
+    c = a.update(2, "c")
+    d = c.update(0, None)
+    assert b.get(2) == "b" and c.get(2) == "c" and a.get(2) is None
+    assert base.get(1) is None and b.get(1) == "a"
+    assert 0 not in d and d.get(0) is None and c.get(0) == "committed"
+    assert dict(b.items()) == {0: "committed", 1: "a", 2: "b"}
+    assert dict(d.items()) == {1: "a", 2: "c"}
+    # reading an old version does not disturb the newer ones
+    assert b.get(2) == "b" and d.get(2) == "c"
+
+
+def test_big_map_versions_match_copies():
+    rng = random.Random(0)
+    store = BigMapStore()
+    versions = [(store.get(store.alloc()), {})]
+    for _ in range(2000):
+        big_map, model = versions[rng.randrange(len(versions))]
+        key, value = rng.randrange(20), rng.choice([None, rng.randrange(100)])
+        model = dict(model)
+        if value is None:
+            model.pop(key, None)
+        else:
+            model[key] = value
+        versions.append((big_map.update(key, value), model))
+        probe, expected = versions[rng.randrange(len(versions))]
+        assert dict(probe.items()) == expected
+
+
+def test_commit_writes_the_latest_version():
+    store = BigMapStore()
+    big_map = store.get(store.alloc())
+    for i in range(20000):
+        big_map = big_map.update(i % 1000, i)
+    diff = store.commit(big_map)
+    assert len(diff) == 1000
+    assert store.maps[big_map.id][999] == 19999
+    assert len(big_map) == 1000
+
+
+def test_view_reads_the_storage_of_another_contract():
+    chain = Chain()
+    target = chain.originate(parse_script(
+        'parameter unit; storage nat; code { CDR; NIL operation; PAIR }; view "plus" nat nat { UNPAIR; ADD };'), 40)
+    caller = script("(option nat)", '{ CDR; DROP; PUSH address "%s"; PUSH nat 2; VIEW "plus" nat; '
+                    'NIL operation; PAIR }' % target.address)
+    c = chain.originate(caller, "None")
+    receipt = chain.call(c.address, "default", "Unit", account("a"))
+    assert c.storage.value == 42
+    # the view is charged to the caller
+    _, view_gas = target.view("plus", 2, c.address)
+    assert receipt.gas >= c.load_gas + view_gas
+    missing = chain.originate(script("(option nat)", '{ CDR; DROP; PUSH address "%s"; PUSH nat 2; VIEW "minus" nat; '
+                                     'NIL operation; PAIR }' % target.address), "None")
+    chain.call(missing.address, "default", "Unit", account("a"))
+    assert missing.storage is None
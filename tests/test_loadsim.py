@@ -0,0 +1,45 @@
+import json
+
+from objkt_tools.loadsim import Replayer, format_report, main, traffic
+
+
+def test_traffic_is_reproducible_and_refers_back():
+    events = list(traffic(2000, seed=1))
+    assert events == list(traffic(2000, seed=1))
+    assert events != list(traffic(2000, seed=2))
+    assert [e["id"] for e in events] == list(range(2000))
+    created = set()
+    for e in events:
+        for ref in ("objkt", "swap"):
+            if ref in e:
+                assert e[ref] in created
+        created.add(e["id"])
+
+
+def test_only_the_races_fail():
+    events = list(traffic(1500, seed=4))
+    expected = sum(1 for e in events if e.get("expect"))
+    assert expected
+    report = Replayer().run(events)
+    assert report["unexpected"] == 0
+    assert report["expected"] == report["failed"] == expected
+    assert all(f["expected"] == "sold out" for f in report["failures"])
+    assert "0 unexpected" in format_report(report)
+
+
+def test_replayed_streams_are_reported_the_same(tmp_path, capsys):
+    path = tmp_path / "drop.jsonl"
+    assert main(["--events", "300", "--seed", "4", "--save", str(path)]) == 0
+    assert len(path.read_text().splitlines()) == 300
+    assert main(["--replay", str(path), "--json"]) == 0
+    replayed = json.loads(capsys.readouterr().out)
+    direct = Replayer().run(traffic(300, seed=4))
+    for key in ("calls", "failed", "expected", "operations"):
+        assert replayed[key] == direct[key]
+
+
+def test_unexpected_failures_fail_the_run(tmp_path):
+    path = tmp_path / "bad.jsonl"
+    # a collect of a swap that was never made
+    path.write_text('{"kind": "collect", "id": 0, "market": "v2", "buyer": 1, "swap": 7, "editions": 1}\n')
+    assert main(["--replay", str(path)]) == 1
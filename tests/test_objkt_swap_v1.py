@@ -0,0 +1,50 @@
+import pytest
+
+from objkt_tools.deployment import Deployment, storage_field
+from objkt_tools.michelson import MichelsonFailure, account, to_fields
+
+from . import requires
+
+
+@pytest.fixture
+def d():
+    return Deployment()
+
+
+def mints(artist, n, royalties=100):
+    return [{"address": artist, "amount": 10 + i, "metadata": b"ipfs://%d" % i, "royalties": royalties} for i in range(n)]
+
+
+def test_mint_batch_mints_through_the_fa2_mint(d):
+    requires(d.minter, "mint_batch")
+    artist = account("artist")
+    first = d.next_objkt_id()
+    receipt = d.call(d.minter, "mint_batch", mints(artist, 3), artist)
+    # one FA2 mint per item, which the deployed OBJKT FA2 accepts
+    assert receipt.operations == 3
+    assert [(address, entrypoint) for address, entrypoint, _ in receipt.calls] == \
+        [(d.minter.address, "mint_batch")] + [(d.objkts.address, "mint")] * 3
+    assert d.next_objkt_id() == first + 3
+    royalties = storage_field(d.minter, "royalties")
+    for i in range(3):
+        assert d.balance(d.objkts, artist, first + i) == 10 + i
+        assert to_fields(royalties.value_type, royalties.get(first + i)) == {"issuer": artist, "royalties": 100}
+
+
+def test_mint_batch_is_checked_as_a_whole(d):
+    requires(d.minter, "mint_batch")
+    artist = account("artist")
+    first = d.next_objkt_id()
+    with pytest.raises(MichelsonFailure):
+        d.call(d.minter, "mint_batch", mints(artist, 2) + mints(artist, 1, royalties=251), artist)
+    assert d.next_objkt_id() == first
+    assert d.balance(d.objkts, artist, first) == 0
+
+
+def test_fa2_mint_batch_is_for_the_administrator(d):
+    requires(d.objkts, "mint_batch")
+    item = {"address": account("artist"), "amount": 1, "token_id": 7, "token_info": {"": b"ipfs://"}}
+    with pytest.raises(MichelsonFailure):
+        d.call(d.objkts, "mint_batch", [item], account("artist"))
+    d.call(d.objkts, "mint_batch", [item, dict(item, token_id=8)], d.minter.address)
+    assert d.balance(d.objkts, account("artist"), 8) == 1
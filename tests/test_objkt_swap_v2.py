@@ -0,0 +1,178 @@
+import pytest
+
+from objkt_tools.deployment import Deployment, storage_field
+from objkt_tools.michelson import MichelsonFailure, account, to_fields
+
+from . import requires
+
+
+@pytest.fixture
+def d():
+    return Deployment()
+
+
+@pytest.fixture
+def objkt(d):
+    artist = account("artist")
+    return artist, d.mint(artist, 5, royalties=100)
+
+
+def swap(d, issuer, objkt_id, price, amount=1, creator=None, royalties=100):
+    swap_id = storage_field(d.marketplace, "counter")
+    d.call(d.marketplace, "swap", {"creator": creator or issuer, "objkt_amount": amount, "objkt_id": objkt_id,
+                                   "royalties": royalties, "xtz_per_objkt": price}, issuer)
+    return swap_id
+
+
+def received(d, before, *accounts):
+    return {who: d.chain.balances.get(who, 0) - before.get(who, 0) for who in accounts}
+
+
+def test_collect_batch_pays_once_per_recipient(d, objkt):
+    requires(d.marketplace, "collect_batch")
+    artist, objkt_id = objkt
+    reseller, buyer = account("reseller"), account("buyer")
+    d.add_operator(d.objkts, artist, d.marketplace.address, objkt_id)
+    d.call(d.objkts, "transfer", [{"from_": artist, "txs": [{"to_": reseller, "token_id": objkt_id, "amount": 2}]}], artist)
+    d.add_operator(d.objkts, reseller, d.marketplace.address, objkt_id)
+    a = swap(d, artist, objkt_id, 1000000, 2)
+    b = swap(d, reseller, objkt_id, 2000000, 2, creator=artist)
+    before = dict(d.chain.balances)
+    receipt = d.call(d.marketplace, "collect_batch", [{"swap_id": a, "objkt_amount": 2}, {"swap_id": b, "objkt_amount": 1}],
+                     buyer, 4000000)
+    # one FA2 transfer and one payout to each of artist, reseller and manager
+    assert receipt.operations == 4
+    # 10% royalties and 2.5% fee of each 2 tez: the artist gets 1.75 + 0.2 + 0.2
+    assert received(d, before, artist, reseller, d.manager) == {artist: 2150000, reseller: 1750000, d.manager: 100000}
+    assert d.balance(d.objkts, buyer, objkt_id) == 3
+
+
+def test_collect_batch_checks_the_total(d, objkt):
+    requires(d.marketplace, "collect_batch")
+    artist, objkt_id = objkt
+    d.add_operator(d.objkts, artist, d.marketplace.address, objkt_id)
+    a = swap(d, artist, objkt_id, 1000000, 2)
+    for amount in (1000000, 3000000):
+        with pytest.raises(MichelsonFailure):
+            d.call(d.marketplace, "collect_batch", [{"swap_id": a, "objkt_amount": 2}], account("buyer"), amount)
+
+
+def test_sold_out_swaps_are_deleted(d, objkt):
+    requires(d.marketplace, "purge")
+    artist, objkt_id = objkt
+    buyer = account("buyer")
+    d.add_operator(d.objkts, artist, d.marketplace.address, objkt_id)
+    a = swap(d, artist, objkt_id, 1000000, 2)
+    b = swap(d, artist, objkt_id, 0, 1)
+    d.call(d.marketplace, "collect", {"swap_id": a, "objkt_amount": 1}, buyer, 1000000)
+    assert a in storage_field(d.marketplace, "swaps")
+    d.call(d.marketplace, "collect", {"swap_id": a, "objkt_amount": 1}, buyer, 1000000)
+    d.call(d.marketplace, "collect", {"swap_id": b, "objkt_amount": 1}, buyer)
+    assert len(storage_field(d.marketplace, "swaps")) == 0
+    assert d.balance(d.objkts, buyer, objkt_id) == 3
+
+
+def test_purge_removes_only_sold_out_swaps(d):
+    requires(d.marketplace, "purge")
+    # entries left at objkt_amount 0 by the deployed contract
+    issuer = account("issuer")
+    entry = {"creator": issuer, "issuer": issuer, "objkt_id": 1, "royalties": 100, "xtz_per_objkt": 1000000}
+    market = d.chain.originate(d.marketplace.script, {
+        "counter": 3, "fee": 25, "manager": d.manager, "metadata": {}, "objkt": d.objkts.address,
+        "minter": d.minter.address, "offers": {}, "offer_book": {}, "offer_counter": 0,
+        "swaps": {0: dict(entry, objkt_amount=0), 1: dict(entry, objkt_amount=0), 2: dict(entry, objkt_amount=1)}})
+    with pytest.raises(MichelsonFailure):
+        d.call(market, "purge", [0, 2], account("anyone"))
+    d.call(market, "purge", [0, 1], account("anyone"))
+    assert sorted(k for k, _ in storage_field(market, "swaps").items()) == [2]
+
+
+@pytest.fixture
+def offers(d):
+    requires(d.marketplace, "make_offer", "accept_offer", "cancel_offer")
+
+
+def make_offer(d, buyer, objkt_id, price, amount=1):
+    offer_id = storage_field(d.marketplace, "offer_counter")
+    d.call(d.marketplace, "make_offer", {"objkt_id": objkt_id, "objkt_amount": amount, "xtz_per_objkt": price},
+           buyer, price * amount)
+    return offer_id
+
+
+def accept(d, seller, objkt_id, amount=1, min_payout=0, creator=None, royalties=100):
+    return d.call(d.marketplace, "accept_offer", {"creator": creator or seller, "min_payout": min_payout, "objkt_amount": amount,
+                                                  "objkt_id": objkt_id, "royalties": royalties}, seller)
+
+
+def offer(d, offer_id):
+    offers = storage_field(d.marketplace, "offers")
+    value = offers.get(offer_id)
+    return None if value is None else to_fields(offers.value_type, value)
+
+
+def test_accept_pays_the_declared_royalties(d, offers, objkt):
+    artist, objkt_id = objkt
+    holder, buyer = account("holder"), account("buyer")
+    d.call(d.objkts, "transfer", [{"from_": artist, "txs": [{"to_": holder, "token_id": objkt_id, "amount": 2}]}], artist)
+    make_offer(d, buyer, objkt_id, 1000000)
+    d.add_operator(d.objkts, holder, d.marketplace.address, objkt_id)
+    before = dict(d.chain.balances)
+    accept(d, holder, objkt_id, min_payout=875000, creator=artist)
+    received = {who: d.chain.balances.get(who, 0) - before.get(who, 0) for who in (artist, holder, d.manager, buyer)}
+    # 10% royalties to the creator, 2.5% fee
+    assert received == {artist: 100000, holder: 875000, d.manager: 25000, buyer: 0}
+    assert d.balance(d.objkts, buyer, objkt_id) == 1
+    assert d.marketplace.balance == 0
+
+
+def test_min_payout_is_net_of_royalties_and_fee(d, offers, objkt):
+    artist, objkt_id = objkt
+    make_offer(d, account("buyer"), objkt_id, 1000000)
+    d.add_operator(d.objkts, artist, d.marketplace.address, objkt_id)
+    with pytest.raises(MichelsonFailure):
+        accept(d, artist, objkt_id, min_payout=1000000)
+    assert offer(d, 0)["objkt_amount"] == 1
+
+
+def test_accept_checks_the_royalties_as_swap_does(d, offers, objkt):
+    artist, objkt_id = objkt
+    make_offer(d, account("buyer"), objkt_id, 1000000)
+    d.add_operator(d.objkts, artist, d.marketplace.address, objkt_id)
+    with pytest.raises(MichelsonFailure):
+        accept(d, artist, objkt_id, royalties=251)
+    accept(d, artist, objkt_id, royalties=250)
+    assert offer(d, 0) is None
+
+
+def test_accept_needs_the_operator_approval(d, offers, objkt):
+    artist, objkt_id = objkt
+    make_offer(d, account("buyer"), objkt_id, 1000000)
+    with pytest.raises(MichelsonFailure):
+        accept(d, artist, objkt_id)
+    d.add_operator(d.objkts, artist, d.marketplace.address, objkt_id)
+    accept(d, artist, objkt_id)
+
+
+def test_best_offer_first_and_partial_accept(d, offers, objkt):
+    artist, objkt_id = objkt
+    low = make_offer(d, account("low"), objkt_id, 1000000, 2)
+    high = make_offer(d, account("high"), objkt_id, 2000000, 3)
+    d.add_operator(d.objkts, artist, d.marketplace.address, objkt_id)
+    accept(d, artist, objkt_id, 2)
+    assert offer(d, high)["objkt_amount"] == 1
+    accept(d, artist, objkt_id, 1)
+    assert offer(d, high) is None
+    assert offer(d, low)["objkt_amount"] == 2
+    assert d.balance(d.objkts, account("high"), objkt_id) == 3
+
+
+def test_cancel_refunds_the_escrow(d, offers, objkt):
+    _, objkt_id = objkt
+    buyer = account("buyer")
+    offer_id = make_offer(d, buyer, objkt_id, 1000000, 3)
+    with pytest.raises(MichelsonFailure):
+        d.call(d.marketplace, "cancel_offer", offer_id, account("someone"))
+    d.call(d.marketplace, "cancel_offer", offer_id, buyer)
+    assert d.chain.balances[buyer] == 3000000
+    assert d.marketplace.balance == 0
+    assert offer(d, offer_id) is None
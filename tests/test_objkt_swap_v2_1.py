@@ -0,0 +1,106 @@
+import pytest
+
+from objkt_tools.deployment import Deployment, storage_field
+from objkt_tools.michelson import MichelsonFailure, account, to_fields
+
+from . import requires
+
+
+@pytest.fixture
+def d():
+    d = Deployment()
+    requires(d.marketplace_v2_1, "collect_best")
+    return d
+
+
+@pytest.fixture
+def market(d):
+    artist, buyer = account("artist"), account("buyer")
+    objkt_id = d.mint(artist, 20)
+    d.add_operator(d.objkts, artist, d.marketplace_v2_1.address, objkt_id)
+    d.give_hdao(buyer, 10 ** 9)
+    d.add_operator(d.hdao, buyer, d.marketplace_v2_1.address, 0)
+    return artist, buyer, objkt_id
+
+
+def swap(d, artist, objkt_id, price, amount=1):
+    swap_id = storage_field(d.marketplace_v2_1, "counter")
+    d.call(d.marketplace_v2_1, "swap", {
+        "contract": d.hdao.address, "creator": artist, "objkt_amount": amount, "objkt_id": objkt_id,
+        "royalties": 100, "token_id": 0, "token_per_objkt": price}, artist)
+    return swap_id
+
+
+def collect_best(d, buyer, objkt_id, amount, max_price=10 ** 6):
+    return d.call(d.marketplace_v2_1, "collect_best", {
+        "objkt_id": objkt_id, "contract": d.hdao.address, "token_id": 0, "objkt_amount": amount,
+        "max_token_per_objkt": max_price}, buyer)
+
+
+def entries(instance, name):
+    big_map = storage_field(instance, name)
+    return {tuple(sorted(to_fields(big_map.key_type, k).items())): set(v) for k, v in big_map.items()}
+
+
+def book(d, objkt_id):
+    """swap ids by price, checked against the prices index"""
+    levels = {dict(k)["token_per_objkt"]: ids for k, ids in entries(d.marketplace_v2_1, "book").items()
+              if dict(k)["objkt_id"] == objkt_id}
+    prices = [p for k, p in entries(d.marketplace_v2_1, "prices").items() if dict(k)["objkt_id"] == objkt_id]
+    assert prices == ([set(levels)] if levels else [])
+    assert all(levels.values())
+    return levels
+
+
+def left(d, swap_id):
+    swaps = storage_field(d.marketplace_v2_1, "swaps")
+    return to_fields(swaps.value_type, swaps.get(swap_id))["objkt_amount"]
+
+
+def test_zero_amount_swaps_are_rejected(d, market):
+    artist, _, objkt_id = market
+    with pytest.raises(MichelsonFailure):
+        swap(d, artist, objkt_id, 100, amount=0)
+    assert book(d, objkt_id) == {}
+
+
+def test_collect_best_fills_the_cheapest_swaps_oldest_first(d, market):
+    artist, buyer, objkt_id = market
+    a = swap(d, artist, objkt_id, 300, 2)
+    b = swap(d, artist, objkt_id, 100, 1)
+    c = swap(d, artist, objkt_id, 200, 2)
+    e = swap(d, artist, objkt_id, 100, 2)
+    assert book(d, objkt_id) == {100: {b, e}, 200: {c}, 300: {a}}
+    collect_best(d, buyer, objkt_id, 4)
+    # b and e sold out, c partially
+    assert book(d, objkt_id) == {200: {c}, 300: {a}}
+    assert left(d, c) == 1
+    assert d.balance(d.objkts, buyer, objkt_id) == 4
+    assert d.balance(d.hdao, buyer, 0) == 10 ** 9 - 3 * 100 - 200
+
+
+def test_collect_best_respects_the_limits(d, market):
+    artist, buyer, objkt_id = market
+    swap(d, artist, objkt_id, 100, 1)
+    swap(d, artist, objkt_id, 500, 1)
+    with pytest.raises(MichelsonFailure):
+        collect_best(d, buyer, objkt_id, 2, max_price=400)
+    with pytest.raises(MichelsonFailure):
+        collect_best(d, buyer, objkt_id, 3)
+    assert set(book(d, objkt_id)) == {100, 500}
+
+
+def test_cancel_always_leaves_the_book(d, market):
+    artist, buyer, objkt_id = market
+    a = swap(d, artist, objkt_id, 100, 1)
+    b = swap(d, artist, objkt_id, 100, 1)
+    c = swap(d, artist, objkt_id, 200, 1)
+    d.call(d.marketplace_v2_1, "collect", {"objkt_amount": 1, "swap_id": a}, buyer)
+    assert book(d, objkt_id) == {100: {b}, 200: {c}}
+    # a sold out swap that is still stored can be cancelled
+    d.call(d.marketplace_v2_1, "cancel_swap", {"swap_id": a}, artist)
+    assert book(d, objkt_id) == {100: {b}, 200: {c}}
+    d.call(d.marketplace_v2_1, "cancel_swap_batch", [b, c], artist)
+    assert book(d, objkt_id) == {}
+    with pytest.raises(MichelsonFailure):
+        collect_best(d, buyer, objkt_id, 1)
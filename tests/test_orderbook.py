@@ -0,0 +1,103 @@
+from objkt_tools.deployment import Deployment, MARKETPLACE, MARKETPLACE_V2_1, storage_field
+from objkt_tools.michelson import account
+from objkt_tools.orderbook import OrderBook, ChainFeed, synthetic_history, read_blocks, write_blocks
+
+
+def v2(swap_id, objkt_id=1, amount=2, price=1000, issuer="tz1issuer"):
+    return {"contract": MARKETPLACE, "map": "swaps", "key": swap_id, "value": {
+        "creator": "tz1creator", "issuer": issuer, "objkt_amount": amount, "objkt_id": objkt_id,
+        "royalties": 100, "xtz_per_objkt": price}}
+
+
+def removed(swap_id):
+    return {"contract": MARKETPLACE, "map": "swaps", "key": swap_id, "value": None}
+
+
+def test_floor_follows_updates():
+    book = OrderBook()
+    book.apply({"level": 1, "diffs": [v2(0, price=3000), v2(1, price=1000), v2(2, price=2000)]})
+    assert book.floor(1).swap_id == 1
+    book.apply({"level": 2, "diffs": [removed(1)]})
+    assert book.floor(1).swap_id == 2
+    # a re-listed swap is found at its new price only
+    book.apply({"level": 3, "diffs": [v2(0, price=500)]})
+    assert book.floor(1).swap_id == 0
+    book.apply({"level": 4, "diffs": [v2(0, price=5000)]})
+    assert book.floor(1).swap_id == 2
+    assert [s.swap_id for s in book.listings(1)] == [2, 0]
+
+
+def test_partial_collect_keeps_the_swap():
+    book = OrderBook()
+    book.apply({"level": 1, "diffs": [v2(0, amount=3)]})
+    book.apply({"level": 2, "diffs": [v2(0, amount=1)]})
+    assert book.floor(1).amount == 1
+    assert len(book) == 1
+
+
+def test_zero_amount_is_a_removal():
+    book = OrderBook()
+    book.apply({"level": 1, "diffs": [v2(0, price=100), v2(1, price=200)]})
+    book.apply({"level": 2, "diffs": [v2(0, amount=0, price=100)]})
+    assert book.get("v2", 0) is None
+    assert book.floor(1).swap_id == 1
+    assert [s.swap_id for s in book.by_issuer("tz1issuer")] == [1]
+    book.apply({"level": 3, "diffs": [v2(1, amount=0, price=200)]})
+    assert book.floor(1) is None
+    assert len(book) == 0
+    # a sold out swap may be deleted afterwards
+    book.apply({"level": 4, "diffs": [removed(1)]})
+    assert len(book) == 0
+
+
+def test_old_blocks_are_skipped():
+    book = OrderBook()
+    assert book.apply({"level": 5, "diffs": [v2(0)]})
+    assert not book.apply({"level": 5, "diffs": [removed(0)]})
+    assert len(book) == 1
+
+
+def test_synthetic_history_matches_a_rebuild(tmp_path):
+    blocks = list(synthetic_history(3000, per_block=100))
+    assert any(d["value"] is not None and d["value"]["objkt_amount"] == 0 for b in blocks for d in b["diffs"])
+    path = tmp_path / "history.jsonl.gz"
+    write_blocks(path, blocks)
+    book = OrderBook()
+    for block in read_blocks(path):
+        book.apply(block)
+    # the floor of every objkt is the cheapest swap with editions left
+    latest = {}
+    for block in blocks:
+        for d in block["diffs"]:
+            latest[d["key"]] = d["value"]
+    open_swaps = {k: v for k, v in latest.items() if v is not None and v["objkt_amount"] > 0}
+    assert len(book) == len(open_swaps)
+    for objkt_id in {v["objkt_id"] for v in open_swaps.values()}:
+        cheapest = min(v["xtz_per_objkt"] for v in open_swaps.values() if v["objkt_id"] == objkt_id)
+        assert book.floor(objkt_id).price == cheapest
+
+
+def test_chain_feed_drops_sold_out_swaps():
+    d = Deployment()
+    artist, buyer = account("artist"), account("buyer")
+    objkt_id = d.mint(artist, 5)
+    d.add_operator(d.objkts, artist, d.marketplace.address, objkt_id)
+    feed = ChainFeed(d)
+    book = OrderBook()
+    swap_id = storage_field(d.marketplace, "counter")
+    book.apply(feed.block([d.call(d.marketplace, "swap", {
+        "creator": artist, "objkt_amount": 1, "objkt_id": objkt_id, "royalties": 100, "xtz_per_objkt": 1000000}, artist)]))
+    assert book.floor(objkt_id).swap_id == swap_id
+    assert book.floor(objkt_id).creator == artist
+    book.apply(feed.block([d.call(d.marketplace, "collect", swap_id, buyer, 1000000)]))
+    assert book.floor(objkt_id) is None
+    assert book.get("v2", swap_id) is None
+
+
+def test_v2_1_swaps_are_bucketed_by_currency():
+    book = OrderBook()
+    value = {"contract": "KT1token", "creator": "tz1c", "issuer": "tz1i", "objkt_amount": 1, "objkt_id": 1,
+             "royalties": 100, "token_id": 0, "token_per_objkt": 10}
+    book.apply({"level": 1, "diffs": [v2(0), {"contract": MARKETPLACE_V2_1, "map": "swaps", "key": 0, "value": value}]})
+    assert book.floor(1).market == "v2"
+    assert book.floor(1, ("KT1token", 0)).market == "v2.1"
@@ -0,0 +1,57 @@
+import pytest
+
+from objkt_tools.michelson import Address, InterpreterError, Left, Right, Some, Unit, pack, script_expr_hash
+from objkt_tools.michelson.pack import b58decode_check, b58encode_check, address_bytes, address_from_bytes, EXPR
+
+ALICE = "tz1VbvBX7ZzXSWxKwrNXVYW8PATiA6eT58XJ"
+BOB = "tz1UzNodwdCuy77GUUQqNzuSrt7nriFizv1R"
+OBJKTS = "KT1RJ6PbjHpwc3M5rw5s2Nbmefwbuwbdxton"
+
+## Reference PACK bytes and big_map key hashes, computed independently
+## with pytezos.
+VECTORS = [
+    (0, "050000", "exprtZBwZUeYYYfUs9B9Rg2ywHezVHnCCnmF9WsDQVrs582dSK63dC"),
+    (152, "05009802", "exprusBDEMffQGtgXrHHfUWWWvDGJvSRdt4WBNR5PRsZ5eWqC2nfJ7"),
+    (-5, "050045", "expru5vTov1tf9hr7toTmEtLGSEhxgRLSASAxZBuKj8Nt1wpDrVWZs"),
+    ("ipfs://", "050100000007697066733a2f2f", "expruRPJmXFLifeySxz1tusbMYryw7EuNfj15Eb2j9srV3YKyUdfmm"),
+    (b"\xca\xfe", "050a00000002cafe", "exprvHdyWykxxtpJWzcft5LLqpYAQGE3ZiMVpiSs2WJP1WCYmenzHv"),
+    (Address(ALICE), "050a0000001600006d4afdca0468b62847a15d99bccdae2dbaa2ff5c",
+     "exprtXysnmkgmgeMCpv4oBF9sQVbtcWJLb3Lm2xne9qbeaZP5gQfCq"),
+    (Address(OBJKTS), "050a0000001601b752c7f3de31759bce246416a6823e86b9756c6c00",
+     "exprv2wZTE3gpGANWLsUfYoWGQF3AC8C1RiDFsmRaj6ZFcYaLArMd1"),
+    ((Address(ALICE), 152), "0507070a0000001600006d4afdca0468b62847a15d99bccdae2dbaa2ff5c009802",
+     "expruoPqcwMqyK91YVb4h7Dquh7qHaJgidXZsaqpCtKVqyK9eP9KZN"),
+    ((Address(ALICE), (Address(BOB), 7)),
+     "0507070a0000001600006d4afdca0468b62847a15d99bccdae2dbaa2ff5c07070a00000016000066923d821aa0c4b98965ee7615e870a4f0a80c9f0007",
+     "expruDj3GmvMC5G5dF6zmoDLfZsKRmwk2LmRd7wWkspufzWWnJxDGQ"),
+    ((1, ("x", True)), "05070700010707010000000178030a", "exprujP8M21kW9ZVtcTQj46KEoCALzqkQfbQvK6h3d9r65qxXtLsys"),
+]
+
+
+@pytest.mark.parametrize("value, packed, expr", VECTORS)
+def test_pack_and_expr_hash(value, packed, expr):
+    assert pack(value).hex() == packed
+    assert script_expr_hash(pack(value)) == expr
+
+
+def test_pack_of_or_option_and_unit():
+    assert pack(Left(1)).hex() == "0505050001"
+    assert pack(Right(Unit)).hex() == "050508030b"
+    assert pack(Some(0)).hex() == "0505090000"
+    assert pack(None).hex() == "050306"
+
+
+@pytest.mark.parametrize("address", [ALICE, BOB, OBJKTS])
+def test_address_round_trip(address):
+    raw = address_bytes(address)
+    assert len(raw) == 22
+    assert address_from_bytes(raw) == address
+
+
+def test_base58check():
+    digest = bytes(range(32))
+    expr = b58encode_check(digest, EXPR)
+    assert expr.startswith("expr") and len(expr) == 54
+    assert b58decode_check(expr, EXPR) == digest
+    with pytest.raises(InterpreterError):
+        b58decode_check(expr[:-1] + ("1" if expr[-1] != "1" else "2"), EXPR)
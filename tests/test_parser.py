@@ -0,0 +1,45 @@
+import io
+
+import pytest
+
+from objkt_tools.deployment import ARTIFACTS
+from objkt_tools.michelson import (
+    Bytes, Int, ParseError, Prim, Seq, String, entrypoints, parse, parse_file, parse_script, tokenize,
+)
+
+TZ_FILES = sorted(ARTIFACTS.glob("*.tz"))
+
+
+@pytest.mark.parametrize("path", TZ_FILES, ids=lambda p: p.stem)
+def test_artifacts_round_trip(path):
+    script = parse_file(path)
+    assert parse_script(str(script)) == script
+
+
+@pytest.mark.parametrize("chunk_size", [1, 7, 4096])
+def test_streaming_matches_whole_input(chunk_size):
+    source = (ARTIFACTS / "objkt_swap_v2.tz").read_text()
+    whole = list(tokenize(source))
+    assert list(tokenize(io.StringIO(source), chunk_size)) == whole
+
+
+def test_atoms_and_annotations():
+    node = parse('Pair 0x00ff (Pair "a \\"b\\"\\n" -12) # comment\n')
+    assert node == Prim("Pair", (Bytes(b"\x00\xff"), Prim("Pair", (String('a "b"\n'), Int(-12)))))
+    ty = parse("(pair %swap (address %creator) /* block\ncomment */ (nat :amount %objkt_amount))")
+    assert ty.annot("%") == "swap"
+    assert ty.args[1].annot("%") == "objkt_amount"
+    assert ty.args[1].annot(":") == "amount"
+    assert parse("{ DUP ; { } ; DIP 2 { DROP } }") == Seq((Prim("DUP"), Seq(()), Prim("DIP", (Int(2), Seq((Prim("DROP"),))))))
+
+
+def test_entrypoints():
+    assert sorted(entrypoints(parse_file(ARTIFACTS / "objkt_swap_v2.tz").parameter)) == [
+        "cancel_swap", "collect", "swap", "update_fee", "update_manager"]
+    assert list(entrypoints(parse("unit"))) == ["default"]
+
+
+@pytest.mark.parametrize("source", ["{ DUP", "Pair (1", '"unterminated', "{ DUP ; } }", "$"])
+def test_errors(source):
+    with pytest.raises(ParseError):
+        parse(source)
@@ -0,0 +1,93 @@
+import importlib.util
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from objkt_tools.deployment import Deployment, storage_field
+from objkt_tools.michelson import account
+
+# `smart-py/` is not a package
+_spec = importlib.util.spec_from_file_location("payouts", Path(__file__).resolve().parents[1] / "smart-py" / "payouts.py")
+payouts = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(payouts)
+
+CASES = [
+    (1000000, 1, 100), (1000000, 3, 250), (123457, 7, 0), (1, 1, 100),
+    (0, 2, 100), (999999999, 2, 1), (3, 5, 250),
+]
+
+
+@pytest.mark.parametrize("version", ["v1", "v2", "v2.1"])
+def test_vectorized_split_matches_the_scalar_one(version):
+    price, amount, royalties = (list(c) for c in zip(*CASES))
+    many = payouts.split_many(version, price, amount, royalties, 25)
+    for i, case in enumerate(CASES):
+        assert tuple(int(column[i]) for column in many) == payouts.split(version, *case, fee=25)
+
+
+def test_overflow_raises():
+    with pytest.raises(OverflowError):
+        payouts.split_many("v2", [2 ** 40], [2 ** 30], [100], 25)
+    with pytest.raises(OverflowError):
+        payouts.split_many("v2", [2 ** 60], [1], [100], 25)
+    with pytest.raises(OverflowError):
+        payouts.split_many("v2.1", [2 ** 62], [1], [250], 25)
+    with pytest.raises(OverflowError):
+        payouts.split_many("v2", [2 ** 64], [1], [100], 25)
+    # the largest price that fits is still exact
+    price = (2 ** 64 - 1) // 350
+    assert int(payouts.split_many("v2", [price], [1], [325], 25).royalties[0]) == payouts.split_v2(price, 1, 325, 25).royalties
+
+
+def test_zero_denominator_raises():
+    with pytest.raises(ValueError):
+        payouts.split_many("v2", [100], [1], [0], 0)
+    assert tuple(int(c[0]) for c in payouts.split_many("v2", [0], [1], [0], 0)) == (0, 0, 0, 0)
+
+
+def _received(d, before, who):
+    return d.chain.balances.get(who, 0) - before.get(who, 0)
+
+
+@pytest.mark.parametrize("price,royalties", [(1000000, 100), (123457, 250), (999, 0), (7, 1)])
+def test_v2_collect_pays_the_split(price, royalties):
+    d = Deployment()
+    creator, issuer, buyer = account("creator"), account("issuer"), account("buyer")
+    objkt_id = d.mint(issuer, 2)
+    d.add_operator(d.objkts, issuer, d.marketplace.address, objkt_id)
+    swap_id = storage_field(d.marketplace, "counter")
+    d.call(d.marketplace, "swap", {
+        "creator": creator, "objkt_amount": 1, "objkt_id": objkt_id, "royalties": royalties, "xtz_per_objkt": price}, issuer)
+    before = dict(d.chain.balances)
+    d.call(d.marketplace, "collect", swap_id, buyer, price)
+    split = payouts.split_v2(price, 1, royalties, storage_field(d.marketplace, "fee"))
+    assert _received(d, before, creator) == split.royalties
+    assert _received(d, before, d.manager) == split.fee
+    assert _received(d, before, issuer) == split.seller
+
+
+@pytest.mark.parametrize("price,royalties", [(1000, 100), (12345, 250), (40, 0)])
+def test_v2_1_collect_pays_the_split(price, royalties):
+    d = Deployment()
+    creator, issuer, buyer = account("creator"), account("issuer"), account("buyer")
+    objkt_id = d.mint(issuer, 2)
+    d.add_operator(d.objkts, issuer, d.marketplace_v2_1.address, objkt_id)
+    d.give_hdao(buyer, price)
+    d.add_operator(d.hdao, buyer, d.marketplace_v2_1.address, 0)
+    swap_id = storage_field(d.marketplace_v2_1, "counter")
+    d.call(d.marketplace_v2_1, "swap", {
+        "contract": d.hdao.address, "creator": creator, "objkt_amount": 1, "objkt_id": objkt_id,
+        "royalties": royalties, "token_id": 0, "token_per_objkt": price}, issuer)
+    d.call(d.marketplace_v2_1, "collect", swap_id, buyer)
+    split = payouts.split_v2_1(price, 1, royalties, storage_field(d.marketplace_v2_1, "fee"))
+    assert d.balance(d.hdao, creator, 0) == split.royalties
+    assert d.balance(d.hdao, d.manager, 0) == split.fee
+    assert d.balance(d.hdao, issuer, 0) == split.seller
+    assert d.balance(d.hdao, buyer, 0) == 0
+
+
+def test_v2_1_fee_is_per_edition():
+    single = payouts.split_v2_1(1000, 1, 100, 25)
+    many = payouts.split_v2_1(1000, 20, 100, 25)
+    assert many.fee + many.royalties == 20 * (single.fee + single.royalties)
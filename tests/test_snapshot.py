@@ -0,0 +1,83 @@
+import numpy as np
+import pytest
+
+from objkt_tools.deployment import Deployment, storage_field
+from objkt_tools.michelson import account
+from objkt_tools.snapshot import SCHEMAS, Snapshot, SnapshotError, Writer, export, ADDRESS
+
+
+def test_rows_round_trip(tmp_path):
+    rows = [{"objkt_id": i, "issuer": str(account(i % 3)), "royalties": 100 + i} for i in range(10)]
+    writer = Writer()
+    writer.add_rows("royalties", rows)
+    writer.add_rows("curations", [])
+    path = tmp_path / "state.snap"
+    writer.write(path)
+    with Snapshot(path) as snapshot:
+        table = snapshot["royalties"]
+        assert len(table) == 10
+        assert list(table.records()) == rows
+        assert table.kind("issuer") == ADDRESS
+        assert snapshot.address_count == 3
+        assert snapshot.address(snapshot.address_id(account(2))) == str(account(2))
+        assert snapshot.address_id(account("unknown")) is None
+        assert len(snapshot["curations"]) == 0
+
+
+def test_array_columns_and_alignment(tmp_path):
+    writer = Writer()
+    ids = [writer.address_id(account(i)) for i in range(4)]
+    n = 1000
+    writer.add_table("ledger_objkts", {
+        "owner": np.array(ids * (n // 4), dtype=np.uint32),
+        "token_id": np.arange(n, dtype=np.uint64),
+        "balance": np.full(n, 2 ** 64 - 1, dtype=np.uint64),
+    })
+    path = tmp_path / "ledger.snap"
+    writer.write(path)
+    with Snapshot(path) as snapshot:
+        table = snapshot["ledger_objkts"]
+        assert table["token_id"].dtype == np.uint64
+        assert int(table["balance"][-1]) == 2 ** 64 - 1
+        assert (table["token_id"] == np.arange(n)).all()
+        assert all(table._header[column]["offset"] % 64 == 0 for column in table.columns)
+        assert snapshot.address(int(table["owner"][5])) == str(account(1))
+
+
+def test_values_out_of_range(tmp_path):
+    writer = Writer()
+    with pytest.raises(SnapshotError):
+        writer.add_rows("royalties", [{"objkt_id": -1, "issuer": str(account(0)), "royalties": 0}])
+    with pytest.raises(SnapshotError):
+        writer.add_table("ledger_hdao", {"owner": [str(account(0))], "token_id": [0, 1], "balance": [1]})
+
+
+def test_not_a_snapshot(tmp_path):
+    path = tmp_path / "bad.snap"
+    path.write_bytes(b"NOTASNAP" + bytes(64))
+    with pytest.raises(SnapshotError):
+        Snapshot(path)
+    empty = tmp_path / "empty.snap"
+    empty.write_bytes(b"")
+    with pytest.raises(SnapshotError):
+        Snapshot(empty)
+
+
+def test_export_of_a_deployment(tmp_path):
+    d = Deployment()
+    artist = account("artist")
+    objkt_id = d.mint(artist, 5, royalties=150)
+    d.add_operator(d.objkts, artist, d.marketplace.address, objkt_id)
+    d.call(d.marketplace, "swap", {"creator": artist, "objkt_amount": 2, "objkt_id": objkt_id, "royalties": 150,
+                                   "xtz_per_objkt": 1000000}, artist)
+    path = tmp_path / "deployment.snap"
+    export(d, path)
+    with Snapshot(path) as snapshot:
+        assert set(snapshot.tables) == set(SCHEMAS)
+        swaps = list(snapshot["swaps_v2"].records())
+        assert swaps == [{"swap_id": storage_field(d.marketplace, "counter") - 1, "creator": artist, "issuer": artist,
+                          "objkt_id": objkt_id, "objkt_amount": 2, "royalties": 150, "xtz_per_objkt": 1000000}]
+        balances = {(r["owner"], r["token_id"]): r["balance"] for r in snapshot["ledger_objkts"].records()}
+        assert balances[(artist, objkt_id)] == 3
+        assert balances[(str(d.marketplace.address), objkt_id)] == 2
+        assert {"objkt_id": objkt_id, "issuer": artist, "royalties": 150} in list(snapshot["royalties"].records())